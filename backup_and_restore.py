@@ -1,59 +1,241 @@
-import sqlite3
+import argparse
+import base64
+import gzip
+import hashlib
 import json
+import os
+import sqlite3
 from datetime import datetime
 
-def backup_data():
-    # Connect to the database
-    conn = sqlite3.connect('compensation_rates.db')
+DB_PATH = 'compensation_rates.db'
+BACKUP_DIR = 'database_backup'
+MANIFEST = 'manifest.json'
+
+# Rows per compressed part file. Parts keep memory flat while dumping and
+# let a restore read tables in parallel.
+CHUNK_ROWS = 100000
+FETCH_ROWS = 5000
+
+
+def _json_value(value):
+    if isinstance(value, bytes):
+        return {'$bytes': base64.b64encode(value).decode()}
+    raise TypeError(f'Cannot serialize {type(value).__name__}')
+
+
+_encode_row = json.JSONEncoder(separators=(',', ':'), default=_json_value).encode
+
+
+def _user_tables(cursor):
+    cursor.execute(
+        "SELECT name, sql FROM sqlite_master "
+        "WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )
+    return cursor.fetchall()
+
+
+def _table_indexes(cursor, table_name):
+    # Automatic indexes (UNIQUE/PRIMARY KEY constraints) have no SQL and are
+    # recreated by the CREATE TABLE statement. Triggers (the data_release
+    # counters) go with the indexes so they are recreated after the rows.
+    cursor.execute(
+        "SELECT sql FROM sqlite_master "
+        "WHERE type IN ('index', 'trigger') AND tbl_name=? AND sql IS NOT NULL ORDER BY type",
+        (table_name,),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _dump_table(cursor, table_name, backup_dir, chunk_rows, compresslevel):
+    """Write one table as gzipped NDJSON parts; returns its manifest entry."""
+    cursor.execute(f'SELECT * FROM "{table_name}"')
+    columns = [description[0] for description in cursor.description]
+    table_hash = hashlib.sha256()
+    parts = []
+    part = None
+
+    def close_part():
+        part['file'].close()
+        parts.append({'file': part['name'], 'rows': part['rows'], 'sha256': part['hash'].hexdigest()})
+
+    while True:
+        rows = cursor.fetchmany(FETCH_ROWS)
+        if not rows:
+            break
+        lines = [_encode_row(row).encode() + b'\n' for row in rows]
+        start = 0
+        while start < len(lines):
+            if part is None:
+                name = f'{table_name}.{len(parts):04d}.ndjson.gz'
+                part = {
+                    'name': name,
+                    'file': gzip.open(os.path.join(backup_dir, name), 'wb', compresslevel=compresslevel),
+                    'rows': 0,
+                    'hash': hashlib.sha256(),
+                }
+            # Write whole fetches at once; a gzip write per line costs more
+            # than the encoding.
+            take = min(chunk_rows - part['rows'], len(lines) - start)
+            data = b''.join(lines[start:start + take])
+            part['file'].write(data)
+            part['hash'].update(data)
+            table_hash.update(data)
+            part['rows'] += take
+            start += take
+            if part['rows'] >= chunk_rows:
+                close_part()
+                part = None
+    if part is not None:
+        close_part()
+
+    return {
+        'columns': columns,
+        'rows': sum(p['rows'] for p in parts),
+        'sha256': table_hash.hexdigest(),
+        'parts': parts,
+    }
+
+
+def backup_data(db_path=DB_PATH, backup_dir=BACKUP_DIR, chunk_rows=CHUNK_ROWS, compresslevel=1):
+    """
+    Stream every table to ``backup_dir`` as gzipped NDJSON.
+
+    Each table is written in parts of ``chunk_rows`` rows, one JSON array per
+    line, with a SHA-256 of the uncompressed lines per part and per table.
+    ``manifest.json`` (written last) holds the columns, schema, indexes and
+    checksums. All tables are read in one read-only transaction, so the
+    backup is a consistent snapshot and live readers are never blocked.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
     cursor = conn.cursor()
-    
-    # Get list of all tables
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-    
-    # Dictionary to store all data
-    data = {}
-    
-    # For each table, get all data
-    for table in tables:
-        table_name = table[0]
-        if table_name != 'sqlite_sequence':  # Skip sqlite internal table
-            cursor.execute(f"SELECT * FROM {table_name}")
-            columns = [description[0] for description in cursor.description]
-            rows = cursor.fetchall()
-            data[table_name] = {
-                'columns': columns,
-                'rows': [list(row) for row in rows]
-            }
-    
-    # Save data to JSON file
-    with open('database_backup.json', 'w') as f:
-        json.dump(data, f, default=str)
-    
-    conn.close()
-    print("Backup completed to database_backup.json")
+    manifest = {
+        'format': 1,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'source': os.path.abspath(db_path),
+        'tables': {},
+    }
+    try:
+        cursor.execute('BEGIN')
+        for table_name, schema in _user_tables(cursor):
+            entry = _dump_table(cursor, table_name, backup_dir, chunk_rows, compresslevel)
+            entry['schema'] = schema
+            entry['indexes'] = _table_indexes(cursor, table_name)
+            manifest['tables'][table_name] = entry
+            print(f"Backed up {table_name}: {entry['rows']} rows in {len(entry['parts'])} parts")
+        conn.rollback()
+    finally:
+        conn.close()
+
+    manifest_path = os.path.join(backup_dir, MANIFEST)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    print(f"Backup completed to {backup_dir}")
+    return manifest
+
+
+def part_lines(backup_dir, part):
+    """
+    Yield the raw NDJSON lines of one part file, checking its checksum at the end.
+
+    Raises ValueError when the part does not match the manifest.
+    """
+    digest = hashlib.sha256()
+    count = 0
+    with gzip.open(os.path.join(backup_dir, part['file']), 'rb') as f:
+        for line in f:
+            digest.update(line)
+            count += 1
+            yield line
+    if count != part['rows'] or digest.hexdigest() != part['sha256']:
+        raise ValueError(f"{part['file']} does not match its checksum in the manifest")
+
+
+def decode_rows(lines):
+    """Decode a batch of NDJSON lines with one json.loads call."""
+    blob = b','.join(lines)
+    rows = json.loads(b'[' + blob + b']')
+    if b'{"$bytes"' in blob:
+        rows = [
+            [base64.b64decode(value['$bytes']) if isinstance(value, dict) else value for value in row]
+            for row in rows
+        ]
+    return rows
+
+
+def load_manifest(backup_dir=BACKUP_DIR):
+    with open(os.path.join(backup_dir, MANIFEST)) as f:
+        return json.load(f)
 
-def drop_tables():
-    conn = sqlite3.connect('compensation_rates.db')
+
+def verify_backup(backup_dir=BACKUP_DIR):
+    """Re-read every part and check row counts and checksums. Raises ValueError."""
+    manifest = load_manifest(backup_dir)
+    for table_name, entry in manifest['tables'].items():
+        table_hash = hashlib.sha256()
+        for part in entry['parts']:
+            for line in part_lines(backup_dir, part):
+                table_hash.update(line)
+        if table_hash.hexdigest() != entry['sha256']:
+            raise ValueError(f'{table_name} does not match its checksum in the manifest')
+    print(f"Backup in {backup_dir} verified")
+
+
+def snapshot_database(db_path=DB_PATH, dest_path='compensation_rates.backup.db', pages=1024):
+    """
+    Copy the database file with SQLite's online backup API.
+
+    The copy advances ``pages`` pages at a time and releases the source
+    between steps, so readers and writers keep going while it runs.
+    """
+    source = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    dest = sqlite3.connect(dest_path)
+    try:
+        source.backup(dest, pages=pages)
+    finally:
+        dest.close()
+        source.close()
+    print(f"Snapshot completed to {dest_path}")
+
+
+def drop_tables(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    
+
     # Get list of all tables
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
     tables = cursor.fetchall()
-    
+
     # Drop each table
     for table in tables:
         table_name = table[0]
         if table_name != 'sqlite_sequence':  # Skip sqlite internal table
             cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-    
+
     conn.commit()
     conn.close()
     print("All tables dropped successfully")
 
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Back up compensation_rates.db, then drop its tables.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--output', default=BACKUP_DIR, help='Backup directory')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--compresslevel', type=int, default=1, choices=range(1, 10),
+                        help='gzip level; 1 is fastest')
+    parser.add_argument('--keep-tables', action='store_true', help='Back up only; do not drop the tables')
+    parser.add_argument('--snapshot', metavar='PATH',
+                        help='Also copy the database file to PATH with the online backup API')
+    args = parser.parse_args()
+
     print("Starting backup process...")
-    backup_data()
-    print("Starting table drop process...")
-    drop_tables()
-    print("Process completed!") 
\ No newline at end of file
+    backup_data(args.db, args.output, args.chunk_rows, args.compresslevel)
+    verify_backup(args.output)
+    if args.snapshot:
+        snapshot_database(args.db, args.snapshot)
+    if not args.keep_tables:
+        print("Starting table drop process...")
+        drop_tables(args.db)
+    print("Process completed!")
@@ -2,4 +2,11 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bph_lookup.settings')
-application = get_asgi_application() 
\ No newline at end of file
+application = get_asgi_application()
+
+# Load the ZIP resolver, pricing tables and ZIP grid before the first request.
+from core.pricing import preload_pricing_tables  # noqa: E402
+from core.spatial import preload_zip_grid  # noqa: E402
+
+preload_pricing_tables()
+preload_zip_grid()
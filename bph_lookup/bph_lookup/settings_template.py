@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -21,6 +22,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Server-Timing and slow-query log; removes itself unless QUERY_TIMING_ENABLED.
+    'core.middleware.QueryTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,13 +54,36 @@ WSGI_APPLICATION = 'bph_lookup.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
+DB_PATH = BASE_DIR.parent / 'compensation_rates.db'
+
+# Lookup-only workers can open the rate database read-only and immutable
+# (BPH_DB_READONLY=1): SQLite then skips file locking and change checks.
+# Only use it when nothing writes the file while those workers run.
+DB_READONLY = os.environ.get('BPH_DB_READONLY') == '1'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR.parent / 'compensation_rates.db',
+        'NAME': f'file:{DB_PATH}?mode=ro&immutable=1' if DB_READONLY else DB_PATH,
+        # Reuse connections across requests instead of reopening the file.
+        'CONN_MAX_AGE': int(os.environ.get('BPH_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Applied to every new SQLite connection by core.db.apply_sqlite_pragmas.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',          # readers never block on a writer
+    'synchronous': 'NORMAL',        # safe with WAL, fewer fsyncs
+    'mmap_size': 1024 * 1024 * 1024,  # map up to 1 GB of the file
+    'cache_size': -64 * 1024,       # 64 MB page cache per connection
+    'temp_store': 'MEMORY',         # sorts and DISTINCTs in memory
+}
+
+if DB_READONLY:
+    # Sessions cannot be written to a read-only database.
+    SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [
@@ -65,4 +91,35 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField' 
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField' 
+# Lookup tuning
+# How often (seconds) to check zip_code_enriched for changes and rebuild the
+# in-memory grid behind radius searches; /api/nearby/ accepts a radius up to
+# NEARBY_MAX_MILES.
+ZIP_GRID_REFRESH_SECONDS = 300
+NEARBY_MAX_MILES = 100
+# How often (seconds) the procedure code typeahead (/api/procedures/search/)
+# checks procedure_code for newly loaded codes, and its largest ?limit=.
+PROCEDURE_SEARCH_REFRESH_SECONDS = 60
+PROCEDURE_SEARCH_MAX_RESULTS = 50
+# Lifetime of the cached list of fee schedule states; None keeps it until
+# fee schedule data changes.
+STATE_CATALOG_CACHE_SECONDS = None
+# Same for the cross-state workers' comp comparison of each procedure code.
+WORKERS_COMP_COMPARISON_CACHE_SECONDS = None
+# Same for the percent-of-Medicare distributions (/api/workcomp/percent-of-medicare/).
+PERCENT_OF_MEDICARE_CACHE_SECONDS = None
+# Most lines accepted by one POST /api/medicare/batch/ request.
+MEDICARE_BATCH_MAX_LINES = 10000
+# /api/rates/ page size (overridable per request with ?page_size= up to the max).
+RATES_API_PAGE_SIZE = 1000
+RATES_API_MAX_PAGE_SIZE = 10000
+# How often (seconds) to recompute the data-release version that ETags,
+# cache keys and the in-memory pricing tables and ZIP resolver are tied to.
+DATA_VERSION_CHECK_SECONDS = 60
+# Threads the async lookup views (core/async_views.py) use for database work.
+ASYNC_LOOKUP_THREADS = 8
+# Query instrumentation (core.middleware.QueryTimingMiddleware): Server-Timing
+# headers plus a log of queries slower than SLOW_QUERY_MS, with their plans.
+QUERY_TIMING_ENABLED = os.environ.get('BPH_QUERY_TIMING') == '1'
+SLOW_QUERY_MS = 100
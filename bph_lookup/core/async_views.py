@@ -0,0 +1,130 @@
+"""
+Async JSON lookups for the ASGI entry point (``bph_lookup/asgi.py``).
+
+Each view awaits its blocking database work on a bounded thread pool, so a
+single worker process can hold many lookups in flight while at most
+``ASYNC_LOOKUP_THREADS`` of them touch the database at once.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.views.decorators.http import require_GET
+
+from . import renderers
+from .forms import MedicareRateLookupForm
+from .pricing import price_for_date
+from .versioning import data_etag
+from .views import _page_size, next_page_link, rates_page, workers_comp_rates
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'ASYNC_LOOKUP_THREADS', 8),
+    thread_name_prefix='lookup',
+)
+
+
+def _with_connection(func, *args):
+    # Pool threads keep their own connections between jobs; drop any that
+    # are past CONN_MAX_AGE or broken, as a request boundary would.
+    close_old_connections()
+    return func(*args)
+
+
+async def run_blocking(func, *args):
+    """Run ``func(*args)`` on the lookup thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(_with_connection, func, *args))
+
+
+def _json(data, status=200):
+    return HttpResponse(renderers.dumps(data), status=status, content_type='application/json')
+
+
+def _price(zip_code, procedure_code, date_of_service, modifier):
+    return price_for_date(zip_code, procedure_code, date_of_service, modifier)
+
+
+@require_GET
+async def medicare_lookup_async(request):
+    """
+    Medicare allowed amount for ``zip_code``, ``procedure_code`` and optional
+    ``modifier`` and ``date_of_service``.
+    """
+    form = MedicareRateLookupForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    result = await run_blocking(
+        _price,
+        form.cleaned_data['zip_code'],
+        form.cleaned_data['procedure_code'],
+        form.cleaned_data.get('date_of_service'),
+        request.GET.get('modifier', ''),
+    )
+    if result is None:
+        return JsonResponse({'error': 'No results found for the given ZIP code and procedure code.'}, status=404)
+    return _json(result)
+
+
+@require_GET
+async def workers_comp_lookup_async(request):
+    """Workers' comp fee schedule rows for ``state`` and ``procedure_code``."""
+    state = request.GET.get('state')
+    procedure_code = request.GET.get('procedure_code', '')
+    if not state or not (len(procedure_code) == 5 and procedure_code.isdigit()):
+        return JsonResponse({'error': 'state and a 5-digit procedure_code are required.'}, status=400)
+    rates = await run_blocking(workers_comp_rates, procedure_code, state)
+    return _json(rates)
+
+
+async def _stream_rate_pages(state_code, procedure_code, cursor):
+    # Each keyset page is fetched as one pool job, so a long stream never
+    # holds a thread between pages.
+    while True:
+        rows, cursor = await run_blocking(rates_page, state_code, procedure_code, cursor, 2000)
+        yield b''.join(renderers.dumps(row) + b'\n' for row in rows)
+        if not cursor:
+            return
+
+
+@require_GET
+async def rate_lookup_api_async(request):
+    """Async /api/rates/: same filters, keyset pages and ``stream=1`` mode."""
+    # condition() would compute the ETag synchronously inside the event loop.
+    etag = await run_blocking(data_etag, request)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response = await _rate_lookup_api_async(request)
+    if response.status_code == 200:
+        response['ETag'] = etag
+    return response
+
+
+async def _rate_lookup_api_async(request):
+    state_code = request.GET.get('state')
+    procedure_code = request.GET.get('procedure_code')
+    cursor = request.GET.get('cursor')
+
+    try:
+        if request.GET.get('stream'):
+            if cursor:
+                # Validate before the response starts.
+                await run_blocking(rates_page, state_code, procedure_code, cursor, 1)
+            return StreamingHttpResponse(
+                _stream_rate_pages(state_code, procedure_code, cursor),
+                content_type='application/x-ndjson',
+            )
+        rows, next_cursor = await run_blocking(
+            rates_page, state_code, procedure_code, cursor, _page_size(request.GET)
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    response = _json(rows)
+    if next_cursor:
+        response['Link'] = next_page_link(request, request.GET, next_cursor)
+    return response
@@ -0,0 +1,173 @@
+"""
+Workers' comp fee schedules as a percent of Medicare.
+
+Each ``fee_schedule_rate`` line is set against the Medicare allowed amount
+for the same code and modifier in the same state. A state has many Medicare
+localities, so its benchmark is the statewide amount from
+``MedicarePricingEngine.state_allowed_amounts``: the mean over the state's
+ZIPs. Rates are read once into aligned arrays of (code, state, rate); the
+only per-line Python work is numbering each line's key and state as it is
+fetched. The Medicare amounts then come from one key x state matrix, and the
+ratios and their per-state distributions are array operations.
+"""
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .percentiles import PERCENTILES, group_percentiles
+from .pricing import PRICING_YEAR, get_pricing_engine
+from .versioning import get_data_version
+
+BENCHMARK_CACHE_KEY = 'core:percent_of_medicare'
+FETCH_ROWS = 100000
+
+# By-report lines have no fixed rate to compare.
+BENCHMARK_SQL = """
+    SELECT rate.state, rate.procedure_code, COALESCE(rate.modifier, ''),
+           rate.region_id, rate.place_of_service, CAST(rate.rate AS REAL)
+    FROM fee_schedule_rate rate
+    WHERE rate.is_by_report = 0 AND rate.rate > 0 AND rate.state IS NOT NULL
+"""
+
+STAT_COLUMNS = ('mean', 'min') + tuple(f'p{p}' for p in PERCENTILES) + ('max',)
+
+DETAIL_COLUMNS = (
+    'state', 'procedure_code', 'modifier', 'region_id', 'place_of_service',
+    'rate', 'medicare_allowed_amount', 'percent_of_medicare',
+)
+
+
+class RateArrays:
+    """
+    ``fee_schedule_rate`` lines as aligned arrays.
+
+    ``keys`` and ``states`` are the distinct (procedure_code, modifier)
+    pairs and states; ``key_ids``, ``state_ids`` and ``rates`` hold one
+    entry per line. With ``details``, ``lines`` keeps each line's region
+    and place of service for the detail report.
+
+    Ids are handed out with a dict while the rows are fetched. That is
+    faster than collecting the columns and factorizing them with
+    ``np.unique``, which has to sort millions of strings.
+    """
+
+    def __init__(self, states=None, details=False):
+        sql = BENCHMARK_SQL
+        params = []
+        if states:
+            sql += f" AND rate.state IN ({', '.join(['%s'] * len(states))})"
+            params = list(states)
+        key_ids = {}
+        state_ids = {}
+        line_keys = []
+        line_states = []
+        rates = []
+        lines = []
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(FETCH_ROWS)
+                if not rows:
+                    break
+                for state, procedure_code, modifier, _, _, rate in rows:
+                    line_keys.append(key_ids.setdefault((procedure_code, modifier), len(key_ids)))
+                    line_states.append(state_ids.setdefault(state, len(state_ids)))
+                    rates.append(rate)
+                if details:
+                    lines.extend((row[3], row[4]) for row in rows)
+        self.keys = list(key_ids)
+        self.states = list(state_ids)
+        self.key_ids = np.array(line_keys, dtype=np.intp)
+        self.state_ids = np.array(line_states, dtype=np.intp)
+        self.rates = np.array(rates, dtype=np.float64)
+        self.lines = lines
+
+
+def percent_of_medicare(arrays, engine):
+    """
+    Medicare amounts and percents aligned with ``arrays``' lines.
+
+    Returns ``(medicare, percents)``; both are NaN for lines whose code or
+    state has no Medicare price.
+    """
+    amounts = engine.state_allowed_amounts(arrays.keys)
+    columns = {state: i for i, state in enumerate(engine.resolver.states)}
+    # Fee schedule states with no ZIPs in the Medicare map get a NaN column.
+    state_columns = np.array([columns.get(state, -1) for state in arrays.states], dtype=np.intp)
+    amounts = np.hstack([amounts, np.full((len(arrays.keys), 1), np.nan)])
+    medicare = amounts[arrays.key_ids, state_columns[arrays.state_ids]]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percents = arrays.rates / medicare * 100
+    percents[~np.isfinite(percents) | (medicare <= 0)] = np.nan
+    return medicare, percents
+
+
+def state_distributions(arrays, percents):
+    """
+    Per-state summary of ``percents``: line counts, how many lines could be
+    benchmarked, and the mean, min, percentiles and max of those that could.
+    """
+    rate_counts = np.bincount(arrays.state_ids, minlength=len(arrays.states)).tolist()
+    summaries = [
+        {'state': state, 'rate_count': count, 'benchmarked_count': 0, **dict.fromkeys(STAT_COLUMNS)}
+        for state, count in zip(arrays.states, rate_counts)
+    ]
+
+    priced = ~np.isnan(percents)
+    if priced.any():
+        group_ids = arrays.state_ids[priced]
+        values = percents[priced]
+        # group_percentiles wants dense group ids; states with nothing priced
+        # are left out and mapped back afterwards.
+        present, dense_ids = np.unique(group_ids, return_inverse=True)
+        counts, table = group_percentiles(dense_ids, values)
+        sums = np.bincount(dense_ids, weights=values)
+        lows = np.full(len(present), np.inf)
+        highs = np.full(len(present), -np.inf)
+        np.minimum.at(lows, dense_ids, values)
+        np.maximum.at(highs, dense_ids, values)
+        for i, state_id in enumerate(present.tolist()):
+            summary = summaries[state_id]
+            summary['benchmarked_count'] = int(counts[i])
+            summary['mean'] = round(float(sums[i] / counts[i]), 2)
+            summary['min'] = round(float(lows[i]), 2)
+            summary['max'] = round(float(highs[i]), 2)
+            for p, value in zip(PERCENTILES, table[i].tolist()):
+                summary[f'p{p}'] = round(value, 2)
+    return sorted(summaries, key=lambda summary: summary['state'])
+
+
+def detail_rows(arrays, medicare, percents):
+    """One tuple per line in DETAIL_COLUMNS order; None where not benchmarked."""
+    for i, (region_id, place_of_service) in enumerate(arrays.lines):
+        procedure_code, modifier = arrays.keys[arrays.key_ids[i]]
+        amount = medicare[i]
+        percent = percents[i]
+        yield (
+            arrays.states[arrays.state_ids[i]], procedure_code, modifier, region_id, place_of_service,
+            float(arrays.rates[i]),
+            None if np.isnan(amount) else round(float(amount), 2),
+            None if np.isnan(percent) else round(float(percent), 2),
+        )
+
+
+def benchmark_states(states=None, year=PRICING_YEAR):
+    """
+    Percent-of-Medicare distribution for each state's fee schedule, or for
+    ``states`` only, cached per (data version, year, states).
+    """
+    states = sorted(set(states or ()))
+    key = f"{BENCHMARK_CACHE_KEY}:{get_data_version()}:{year}:{','.join(states)}"
+    result = cache.get(key)
+    if result is None:
+        engine = get_pricing_engine(year)
+        arrays = RateArrays(states)
+        _, percents = percent_of_medicare(arrays, engine)
+        result = {
+            'year': year,
+            'conversion_factor': engine.conversion_factor,
+            'states': state_distributions(arrays, percents),
+        }
+        cache.set(key, result, getattr(settings, 'PERCENT_OF_MEDICARE_CACHE_SECONDS', None))
+    return result
@@ -0,0 +1,50 @@
+"""
+Cached reference lists used to build lookup forms and API responses.
+
+The list of states with fee schedule rates only changes when fee schedule
+data is reloaded, so it is computed once and kept in the Django cache.
+Even a cold cache never reads fee_schedule_rate: the list comes from the
+indexed fee_schedule.state_code, probing the rate table's unique index once
+per schedule to keep only schedules that have rates. Cache keys include the
+data version, so any change to the data, through the ORM, a loader or raw
+SQL, takes effect once the version is next checked.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .versioning import get_data_version, invalidate_data_version
+
+STATE_CATALOG_CACHE_KEY = 'core:state_catalog'
+
+STATE_CHOICES_SQL = """
+    SELECT DISTINCT fs.state_code
+    FROM fee_schedule fs
+    WHERE EXISTS (SELECT 1 FROM fee_schedule_rate r WHERE r.fee_schedule_id = fs.id)
+    ORDER BY fs.state_code
+"""
+
+
+def state_catalog_key():
+    return f'{STATE_CATALOG_CACHE_KEY}:{get_data_version()}'
+
+
+def get_fee_schedule_states():
+    """Sorted state codes that have fee schedule rates."""
+    key = state_catalog_key()
+    states = cache.get(key)
+    if states is None:
+        with connection.cursor() as cursor:
+            cursor.execute(STATE_CHOICES_SQL)
+            states = [row[0] for row in cursor.fetchall()]
+        cache.set(key, states, getattr(settings, 'STATE_CATALOG_CACHE_SECONDS', None))
+    return states
+
+
+def invalidate_state_catalog():
+    """
+    Stop using the cached state list now rather than at the next version
+    check; call once after changing fee schedule data. The old entry is
+    keyed on the old version and simply ages out.
+    """
+    invalidate_data_version()
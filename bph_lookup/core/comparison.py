@@ -0,0 +1,72 @@
+"""
+Cross-state workers' comp comparison for one procedure code.
+
+Every state's fee schedule rows for a code are read in one pass over the
+(procedure_code, state, modifier) index and pivoted into a matrix: per
+state, one row per region and place of service with a rate per modifier.
+The matrix only changes with a new release, so it is cached per
+(procedure code, data version).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .versioning import get_data_version
+
+COMPARISON_CACHE_KEY = 'core:workers_comp_comparison'
+
+COMPARISON_SQL = """
+    SELECT rate.state, COALESCE(rate.modifier, ''), rate.region_id, region.region_name,
+           rate.place_of_service, rate.rate_unit, rate.rate
+    FROM fee_schedule_rate rate
+    LEFT JOIN region ON region.region_id = rate.region_id
+    WHERE rate.procedure_code = %s
+    ORDER BY rate.state, rate.region_id, rate.place_of_service, rate.modifier
+"""
+
+
+def comparison_key(procedure_code):
+    return f'{COMPARISON_CACHE_KEY}:{get_data_version()}:{procedure_code}'
+
+
+def pivot_rates(rows):
+    """
+    Pivot ``(state, modifier, region_id, region_name, place_of_service,
+    rate_unit, rate)`` rows, sorted by state, region and place of service,
+    into the comparison matrix.
+    """
+    modifiers = sorted({row[1] for row in rows})
+    states = []
+    for state, modifier, region_id, region_name, place_of_service, rate_unit, rate in rows:
+        if not states or states[-1]['state'] != state:
+            states.append({'state': state, 'rows': [], 'min_rate': None, 'max_rate': None})
+        entry = states[-1]
+        line = entry['rows'][-1] if entry['rows'] else None
+        if line is None or (line['region_id'], line['place_of_service']) != (region_id, place_of_service):
+            line = {
+                'region_id': region_id,
+                'region_name': region_name,
+                'place_of_service': place_of_service,
+                'rate_unit': rate_unit,
+                'rates': {},
+            }
+            entry['rows'].append(line)
+        rate = float(rate)
+        # First row wins when a modifier repeats, as in the state lookup.
+        line['rates'].setdefault(modifier, rate)
+        entry['min_rate'] = rate if entry['min_rate'] is None else min(entry['min_rate'], rate)
+        entry['max_rate'] = rate if entry['max_rate'] is None else max(entry['max_rate'], rate)
+    return {'modifiers': modifiers, 'states': states}
+
+
+def compare_states(procedure_code):
+    """The comparison matrix for one procedure code, from the cache when possible."""
+    key = comparison_key(procedure_code)
+    matrix = cache.get(key)
+    if matrix is None:
+        with connection.cursor() as cursor:
+            cursor.execute(COMPARISON_SQL, [procedure_code])
+            rows = cursor.fetchall()
+        matrix = {'procedure_code': procedure_code, **pivot_rates(rows)}
+        cache.set(key, matrix, getattr(settings, 'WORKERS_COMP_COMPARISON_CACHE_SECONDS', None))
+    return matrix
@@ -0,0 +1,88 @@
+"""
+SQLite connection tuning and lookup index management.
+
+``SQLITE_PRAGMAS`` from settings are applied to every new SQLite
+connection. With persistent connections (``CONN_MAX_AGE``) this happens
+once per worker thread instead of once per request.
+
+``create_indexes`` is shared by the index migrations and
+``generate_dataset``, which creates columns and tables the migrations had
+to skip.
+"""
+import re
+
+from django.conf import settings
+
+# Every lookup index as (index name, table, columns). The first columns match
+# how each table is filtered; trailing columns let the lookup read the index
+# without touching the table rows. Migrations keep their own copy of the
+# entries they add.
+LOOKUP_INDEXES = [
+    ("fee_schedule_rate_code_state_idx", "fee_schedule_rate",
+     ["procedure_code", "state", "modifier"]),
+    ("cms_rvu_code_year_modifier_idx", "cms_rvu",
+     ["procedure_code", "year", "modifier", "work_rvu", "practice_expense_rvu", "malpractice_rvu"]),
+    ("cms_gpci_locality_year_idx", "cms_gpci",
+     ["locality_code", "year", "locality_name", "work_gpci", "pe_gpci", "mp_gpci"]),
+    ("medicare_locality_meta_mac_locality_idx", "medicare_locality_meta",
+     ["mac_code", "locality_code"]),
+    # /api/rates/ filters rates on the state's fee schedule ids.
+    ("fee_schedule_state_idx", "fee_schedule", ["state_code"]),
+    # Radius searches (core.spatial) read one procedure code's commercial
+    # rates for a list of nearby ZIPs, matching ZIP+4 rows on their first
+    # five digits.
+    ("commercial_rate_code_zip5_idx", "commercial_rate", ["procedure_code", "SUBSTR(zip_code, 1, 5)"]),
+]
+
+# The column an index entry reads: the entry itself, or the first argument of
+# an expression such as SUBSTR(zip_code, 1, 5).
+INDEX_COLUMN_RE = re.compile(r'^(?:\w+\()?(\w+)')
+
+
+def is_read_only(connection):
+    return 'mode=ro' in str(connection.settings_dict['NAME'])
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """``connection_created`` handler that applies ``SQLITE_PRAGMAS``."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    read_only = is_read_only(connection)
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            # The journal mode is stored in the database file and cannot be
+            # changed through a read-only connection.
+            if read_only and name == 'journal_mode':
+                continue
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def create_indexes(connection, indexes=LOOKUP_INDEXES):
+    """
+    Create ``(name, table, columns)`` indexes. A column may be an
+    expression over one column, such as ``SUBSTR(zip_code, 1, 5)``.
+
+    The rate tables predate the migrations and some columns (such as
+    fee_schedule_rate.state) exist only in the loaded database, so an index
+    is skipped when its table or columns are missing.
+    """
+    with connection.cursor() as cursor:
+        tables = set(connection.introspection.table_names(cursor))
+        for name, table, columns in indexes:
+            if table not in tables:
+                continue
+            existing = {
+                col.name for col in connection.introspection.get_table_description(cursor, table)
+            }
+            if not {INDEX_COLUMN_RE.match(column).group(1) for column in columns} <= existing:
+                continue
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({", ".join(columns)})'
+            )
+
+
+def drop_indexes(connection, indexes=LOOKUP_INDEXES):
+    with connection.cursor() as cursor:
+        for name, _, _ in indexes:
+            cursor.execute(f'DROP INDEX IF EXISTS "{name}"')
@@ -1,7 +1,6 @@
 from django import forms
 from django.core.validators import RegexValidator
-from django.db import connection
-from .models import State
+from .catalog import get_fee_schedule_states
 
 class MedicareRateLookupForm(forms.Form):
     zip_code = forms.CharField(
@@ -40,6 +39,15 @@ class MedicareRateLookupForm(forms.Form):
         })
     )
 
+    date_of_service = forms.DateField(
+        required=False,
+        help_text='Prices with that year\'s fee schedule; defaults to the current one.',
+        widget=forms.DateInput(attrs={
+            'class': 'form-control',
+            'type': 'date',
+        })
+    )
+
     def clean_zip_code(self):
         zip_code = self.cleaned_data['zip_code']
         if not zip_code.isdigit():
@@ -82,13 +90,32 @@ class WorkersCompRateLookupForm(forms.Form):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        with connection.cursor() as cursor:
-            cursor.execute("SELECT DISTINCT state FROM fee_schedule_rate ORDER BY state")
-            states = cursor.fetchall()
-            self.fields['state'].choices = [(state[0], state[0]) for state in states]
+        self.fields['state'].choices = [(state, state) for state in get_fee_schedule_states()]
 
     def clean_procedure_code(self):
         procedure_code = self.cleaned_data['procedure_code']
         if not procedure_code.isdigit():
             raise forms.ValidationError('CPT code must contain only numbers')
         return procedure_code
+
+
+class WorkersCompComparisonForm(forms.Form):
+    """Compare one CPT code's workers' compensation rates across states."""
+
+    procedure_code = forms.CharField(
+        max_length=5,
+        min_length=5,
+        required=True,
+        validators=[
+            RegexValidator(
+                regex='^[0-9]{5}$',
+                message='CPT code must be exactly 5 digits',
+                code='invalid_cpt',
+            )
+        ],
+        widget=forms.TextInput(attrs={
+            'class': 'form-control',
+            'placeholder': 'Enter 5-digit CPT code',
+            'pattern': '[0-9]{5}'
+        })
+    )
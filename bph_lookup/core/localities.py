@@ -0,0 +1,144 @@
+"""
+ZIP code to Medicare locality resolution.
+
+The ZIP space has only 100,000 values, so the ``medicare_locality_map`` is
+held as dense arrays indexed by the integer ZIP. Each slot holds a small id
+into the table of distinct (carrier, locality) pairs, which pricing code
+uses to index its per-locality GPCI rows.
+"""
+import threading
+
+import numpy as np
+from django.db import connection
+
+from .versioning import get_data_version
+
+ZIP_SPACE = 100000
+NO_LOCALITY = -1
+
+
+def zip_index(zip_code):
+    """Integer slot for a 5-digit ZIP string, or -1 if it is not one."""
+    if isinstance(zip_code, str) and len(zip_code) == 5 and zip_code.isdigit():
+        return int(zip_code)
+    return -1
+
+
+class ZipLocalityResolver:
+    """
+    Array-backed ``medicare_locality_map``.
+
+    ``localities`` lists the distinct (carrier_code, locality_code) pairs and
+    ``states`` the distinct state codes; per-ZIP arrays point into both.
+    """
+
+    def __init__(self):
+        self.year_qtr = None
+        self.data_version = None
+        self.localities = []
+        self.states = []
+        self._locality_ids = np.full(ZIP_SPACE, NO_LOCALITY, dtype=np.int16)
+        self._state_ids = np.full(ZIP_SPACE, NO_LOCALITY, dtype=np.int16)
+
+    def load(self):
+        """Read the ZIP map into the arrays."""
+        localities = []
+        locality_ids = {}
+        states = []
+        state_ids = {}
+        zip_locality_ids = np.full(ZIP_SPACE, NO_LOCALITY, dtype=np.int16)
+        zip_state_ids = np.full(ZIP_SPACE, NO_LOCALITY, dtype=np.int16)
+        year_qtr = None
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT zip_code, state_code, carrier_code, locality_code, year_qtr "
+                "FROM medicare_locality_map"
+            )
+            for zip_code, state_code, carrier_code, locality_code, row_year_qtr in cursor.fetchall():
+                index = zip_index(zip_code)
+                if index < 0:
+                    continue
+                key = (carrier_code, locality_code)
+                if key not in locality_ids:
+                    locality_ids[key] = len(localities)
+                    localities.append(key)
+                if state_code not in state_ids:
+                    state_ids[state_code] = len(states)
+                    states.append(state_code)
+                zip_locality_ids[index] = locality_ids[key]
+                zip_state_ids[index] = state_ids[state_code]
+                if row_year_qtr is not None and (year_qtr is None or str(row_year_qtr) > year_qtr):
+                    year_qtr = str(row_year_qtr)
+
+        self.year_qtr = year_qtr
+        self.localities = localities
+        self.states = states
+        self._locality_ids = zip_locality_ids
+        self._state_ids = zip_state_ids
+        return self
+
+    def resolve(self, zip_code):
+        """Return ``(state_code, locality_id)`` for a ZIP, or None if unmapped."""
+        index = zip_index(zip_code)
+        if index < 0:
+            return None
+        locality_id = int(self._locality_ids[index])
+        if locality_id == NO_LOCALITY:
+            return None
+        return self.states[self._state_ids[index]], locality_id
+
+    def resolve_many(self, zip_codes):
+        """
+        Resolve a sequence of ZIPs at once.
+
+        Returns ``(locality_ids, state_ids)`` arrays aligned with the input,
+        with -1 for ZIPs that are malformed or unmapped.
+        """
+        indexes = np.fromiter((zip_index(z) for z in zip_codes), dtype=np.intp, count=len(zip_codes))
+        locality_ids = np.full(len(indexes), NO_LOCALITY, dtype=np.intp)
+        state_ids = np.full(len(indexes), NO_LOCALITY, dtype=np.intp)
+        valid = indexes >= 0
+        locality_ids[valid] = self._locality_ids[indexes[valid]]
+        state_ids[valid] = self._state_ids[indexes[valid]]
+        return locality_ids, state_ids
+
+    def locality_state_counts(self):
+        """Number of ZIPs per (locality id, state id), as a float array."""
+        mapped = self._locality_ids >= 0
+        counts = np.zeros((len(self.localities), len(self.states)))
+        np.add.at(counts, (self._locality_ids[mapped], self._state_ids[mapped]), 1)
+        return counts
+
+
+_resolver = None
+_resolver_lock = threading.Lock()
+
+
+def get_zip_resolver():
+    """
+    Return the process-wide resolver, loading it on first use.
+
+    Like the pricing engines, the resolver is rebuilt when the data version
+    changes, so a reloaded or remapped ZIP map takes effect even within the
+    same ``year_qtr``.
+    """
+    global _resolver
+    version = get_data_version()
+    resolver = _resolver
+    if resolver is not None and resolver.data_version == version:
+        return resolver
+
+    with _resolver_lock:
+        if _resolver is None or _resolver.data_version != version:
+            resolver = ZipLocalityResolver().load()
+            resolver.data_version = version
+            _resolver = resolver
+        return _resolver
+
+
+def reset_zip_resolver():
+    """Drop the loaded resolver so the next lookup reads the map again."""
+    global _resolver
+    with _resolver_lock:
+        _resolver = None
@@ -0,0 +1,93 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+
+def _summary(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return (
+        f'{label:<40} {len(latencies) / elapsed:>9,.0f} req/s  '
+        f'p50 {statistics.median(latencies) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms'
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares concurrent lookup throughput through the WSGI handler (threads) and the '
+        'ASGI handler (one event loop), in process. Each view is timed under both '
+        'handlers with the same request'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--zip-code', default='90210')
+        parser.add_argument('--procedure-code', default='99213')
+
+    def handle(self, *args, **options):
+        zip_code = options['zip_code']
+        procedure_code = options['procedure_code']
+        rates_query = f'?procedure_code={procedure_code}&page_size=50'
+        # (label, method, path, client kwargs). The WSGI handler runs async
+        # views through async_to_sync and the ASGI handler runs sync views in
+        # a thread, so every view can go through both.
+        requests = [
+            ('Medicare lookup (async view)', 'get', '/async/medicare/', {
+                'data': {'zip_code': zip_code, 'procedure_code': procedure_code},
+            }),
+            ('/api/rates/ (sync view)', 'get', f'/api/rates/{rates_query}', {}),
+            ('/api/rates/ (async view)', 'get', f'/async/api/rates/{rates_query}', {}),
+        ]
+
+        self.stdout.write(
+            f"{options['requests']:,} requests per run, concurrency {options['concurrency']}\n"
+        )
+        # The test clients send Host: testserver.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            for label, *request in requests:
+                self.stdout.write(self._run_wsgi(f'{label}, WSGI', request, options))
+                self.stdout.write(asyncio.run(self._run_asgi(f'{label}, ASGI', request, options)))
+
+    def _run_wsgi(self, label, request, options):
+        method, path, kwargs = request
+
+        def worker(count):
+            client = Client()
+            latencies = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = getattr(client, method)(path, **kwargs)
+                latencies.append(time.perf_counter() - started)
+                assert response.status_code == 200, response.status_code
+            return latencies
+
+        concurrency = options['concurrency']
+        per_worker = [options['requests'] // concurrency] * concurrency
+        per_worker[0] += options['requests'] % concurrency
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = [lat for batch in pool.map(worker, per_worker) for lat in batch]
+        return _summary(label, latencies, time.perf_counter() - started)
+
+    async def _run_asgi(self, label, request, options):
+        method, path, kwargs = request
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def one():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await getattr(client, method)(path, **kwargs)
+                assert response.status_code == 200, response.status_code
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(one() for _ in range(options['requests'])))
+        return _summary(label, latencies, time.perf_counter() - started)
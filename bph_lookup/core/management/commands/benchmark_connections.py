@@ -0,0 +1,85 @@
+import random
+import sqlite3
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.views import WORKERS_COMP_RATES_SQL
+
+def _percentile(latencies, fraction):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures per-lookup latency against the rate database with stock SQLite '
+        'connections, the tuned PRAGMA profile, persistent connections and '
+        'read-only immutable mode'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=2000)
+        parser.add_argument('--state', default='CA')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('This benchmark only applies to SQLite databases.')
+        # NAME may already be a read-only URI; benchmark the file behind it.
+        path = str(connection.settings_dict['NAME']).removeprefix('file:').split('?')[0]
+        pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT DISTINCT procedure_code FROM fee_schedule_rate WHERE state = %s LIMIT 5000',
+                [options['state']],
+            )
+            codes = [row[0] for row in cursor.fetchall()]
+        if not codes:
+            raise CommandError(f"No fee schedule rates for state {options['state']}.")
+        rng = random.Random(0)
+        params = [(rng.choice(codes), options['state']) for _ in range(options['lookups'])]
+        sql = WORKERS_COMP_RATES_SQL.replace('%s', '?')
+
+        profiles = [
+            ('stock, connect per request', f'file:{path}', {}, False),
+            ('tuned, connect per request', f'file:{path}', pragmas, False),
+            ('tuned, persistent connection', f'file:{path}', pragmas, True),
+            ('read-only immutable, persistent', f'file:{path}?mode=ro&immutable=1', pragmas, True),
+        ]
+        self.stdout.write(f"{options['lookups']:,} workers' comp lookups per profile\n")
+        for label, uri, profile_pragmas, persistent in profiles:
+            latencies = self._run(uri, profile_pragmas, persistent, sql, params)
+            self.stdout.write(
+                f'{label:<34} mean {statistics.fmean(latencies) * 1000:7.3f} ms  '
+                f'p50 {statistics.median(latencies) * 1000:7.3f} ms  '
+                f'p95 {_percentile(latencies, 0.95) * 1000:7.3f} ms'
+            )
+
+    @staticmethod
+    def _connect(uri, pragmas):
+        conn = sqlite3.connect(uri, uri=True)
+        for name, value in pragmas.items():
+            if name == 'journal_mode' and 'mode=ro' in uri:
+                continue
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _run(self, uri, pragmas, persistent, sql, params):
+        latencies = []
+        conn = self._connect(uri, pragmas) if persistent else None
+        try:
+            for lookup_params in params:
+                started = time.perf_counter()
+                if not persistent:
+                    conn = self._connect(uri, pragmas)
+                conn.execute(sql, lookup_params).fetchall()
+                if not persistent:
+                    conn.close()
+                latencies.append(time.perf_counter() - started)
+        finally:
+            if conn is not None:
+                conn.close()
+        return sorted(latencies)
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from core.renderers import FastJSONRenderer
+from core.serializers import FeeScheduleRateSerializer, serialize_rates
+from core.views import _rates_queryset
+
+
+class Command(BaseCommand):
+    help = 'Compares /api/rates/ serialization throughput: DRF serializer vs the values_list fast path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--state', help='Filter like /api/rates/?state=')
+        parser.add_argument('--procedure-code', help='Filter like /api/rates/?procedure_code=')
+        parser.add_argument('--limit', type=int, default=100000, help='Rows to serialize')
+
+    def handle(self, *args, **options):
+        rates = _rates_queryset(options['state'], options['procedure_code'])[:options['limit']]
+
+        def drf_path():
+            data = FeeScheduleRateSerializer(rates.all(), many=True).data
+            return len(data), JSONRenderer().render(data)
+
+        def fast_path():
+            data = serialize_rates(rates.all())
+            return len(data), FastJSONRenderer().render(data)
+
+        results = {}
+        for label, run in [('DRF ModelSerializer', drf_path), ('values_list fast path', fast_path)]:
+            started = time.perf_counter()
+            count, body = run()
+            elapsed = time.perf_counter() - started
+            results[label] = count / elapsed if elapsed else 0
+            self.stdout.write(
+                f'{label:<24} {count:>9,} rows  {elapsed:7.3f}s  '
+                f'{results[label]:>12,.0f} rows/s  {len(body):>12,} bytes'
+            )
+
+        drf, fast = results.values()
+        if drf:
+            self.stdout.write(self.style.SUCCESS(f'Fast path speedup: {fast / drf:.1f}x'))
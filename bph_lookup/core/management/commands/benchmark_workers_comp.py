@@ -0,0 +1,53 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.benchmarking import (
+    DETAIL_COLUMNS, STAT_COLUMNS, RateArrays, detail_rows, percent_of_medicare, state_distributions,
+)
+from core.pricing import PRICING_YEAR, get_pricing_engine
+
+
+class Command(BaseCommand):
+    help = (
+        "Expresses workers' comp fee schedule rates as a percent of the statewide Medicare "
+        'allowed amount and prints the distribution per state'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--state', nargs='+', help='Only these states (default: every state)')
+        parser.add_argument('--year', type=int, default=PRICING_YEAR, help='Medicare fee schedule year')
+        parser.add_argument('--output', help='Also write every rate line with its Medicare amount to this CSV')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        states = [state.upper() for state in options['state'] or ()]
+        engine = get_pricing_engine(options['year'])
+        arrays = RateArrays(states, details=bool(options['output']))
+        medicare, percents = percent_of_medicare(arrays, engine)
+        summaries = state_distributions(arrays, percents)
+
+        self.stdout.write(
+            f"{'state':<6}{'rates':>10}{'priced':>10}" + ''.join(f'{column:>9}' for column in STAT_COLUMNS)
+        )
+        for summary in summaries:
+            stats = ''.join(
+                f'{"-" if summary[column] is None else format(summary[column], ".1f"):>9}'
+                for column in STAT_COLUMNS
+            )
+            self.stdout.write(
+                f"{summary['state']:<6}{summary['rate_count']:>10,}{summary['benchmarked_count']:>10,}{stats}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w', newline='') as handle:
+                writer = csv.writer(handle)
+                writer.writerow(DETAIL_COLUMNS)
+                writer.writerows(detail_rows(arrays, medicare, percents))
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(arrays.rates):,} rates in {len(summaries)} states benchmarked against '
+            f"{options['year']} Medicare in {elapsed:.1f}s"
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.percentiles import build_percentiles
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuilds commercial_rate_percentile: rate count and p10/p25/p50/p75/p90 per '
+        'procedure code and modifier in each 3-digit ZIP and county'
+    )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            built = build_percentiles()
+        elapsed = time.monotonic() - started
+        summary = ', '.join(f'{count:,} {geography_type}' for geography_type, count in built.items())
+        self.stdout.write(self.style.SUCCESS(
+            f'commercial_rate_percentile: {summary} summaries in {elapsed:.1f}s'
+        ))
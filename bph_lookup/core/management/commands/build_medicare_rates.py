@@ -0,0 +1,132 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.pricing import PRICING_YEAR, medicare_rate_key
+
+# Every (procedure_code, modifier, carrier/locality) allowed amount for a
+# year in one statement. The locality and RVU rows picked are the first
+# matches in table order, the same rows MedicarePricingEngine uses.
+# {locality_filter} and {rvu_filter} narrow the rebuild for incremental
+# refreshes.
+BUILD_SQL = """
+    INSERT INTO medicare_rate
+        (procedure_code, modifier, locality_code, rate, effective_date, expiration_date, last_updated)
+    WITH localities AS (
+        SELECT carrier_code, locality_code, work_gpci, pe_gpci, mp_gpci
+        FROM (
+            SELECT loc.carrier_code, loc.locality_code,
+                   gpci.work_gpci, gpci.pe_gpci, gpci.mp_gpci,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY loc.carrier_code, loc.locality_code
+                       ORDER BY meta.rowid, gpci.rowid
+                   ) AS rn
+            FROM (SELECT DISTINCT carrier_code, locality_code FROM medicare_locality_map) loc
+            JOIN medicare_locality_meta meta
+              ON loc.carrier_code = meta.mac_code AND loc.locality_code = meta.locality_code
+            JOIN cms_gpci gpci
+              ON TRIM(meta.fee_schedule_area) = TRIM(gpci.locality_name)
+             AND loc.locality_code = gpci.locality_code
+            WHERE gpci.year = %(year)s {locality_filter}
+        )
+        WHERE rn = 1
+    ),
+    rvus AS (
+        SELECT procedure_code, modifier, work_rvu, practice_expense_rvu, malpractice_rvu
+        FROM (
+            SELECT procedure_code, COALESCE(modifier, '') AS modifier,
+                   work_rvu, practice_expense_rvu, malpractice_rvu,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY procedure_code, COALESCE(modifier, '')
+                       ORDER BY rowid
+                   ) AS rn
+            FROM cms_rvu
+            WHERE year = %(year)s {rvu_filter}
+        )
+        WHERE rn = 1
+    )
+    SELECT rvus.procedure_code, rvus.modifier,
+           localities.carrier_code || '-' || localities.locality_code,
+           ((COALESCE(rvus.work_rvu, 0) * COALESCE(localities.work_gpci, 0) +
+             COALESCE(rvus.practice_expense_rvu, 0) * COALESCE(localities.pe_gpci, 0) +
+             COALESCE(rvus.malpractice_rvu, 0) * COALESCE(localities.mp_gpci, 0))
+            * COALESCE(cf.conversion_factor, 0)),
+           %(start)s, NULL, CURRENT_TIMESTAMP
+    FROM localities
+    CROSS JOIN rvus
+    JOIN cms_conversion_factor cf ON cf.year = %(year)s
+"""
+
+
+class Command(BaseCommand):
+    help = 'Builds or refreshes the materialized medicare_rate table for a year'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, default=PRICING_YEAR)
+        parser.add_argument(
+            '--procedure-code',
+            help='Only recompute rows for this procedure code (after an RVU change)',
+        )
+        parser.add_argument(
+            '--modifier',
+            help='With --procedure-code, only recompute this modifier',
+        )
+        parser.add_argument(
+            '--locality-code',
+            help='Only recompute rows for this locality (after a GPCI change)',
+        )
+
+    def handle(self, *args, **options):
+        year = options['year']
+        procedure_code = options['procedure_code']
+        modifier = options['modifier']
+        locality_code = options['locality_code']
+        if modifier is not None and not procedure_code:
+            raise CommandError('--modifier requires --procedure-code')
+
+        params = {'year': year}
+        delete_where = ['effective_date >= %(start)s', 'effective_date < %(end)s']
+        params['start'] = f'{year}-01-01'
+        params['end'] = f'{year + 1}-01-01'
+        rvu_filter = locality_filter = ''
+
+        if procedure_code:
+            rvu_filter = 'AND procedure_code = %(procedure_code)s'
+            delete_where.append('procedure_code = %(procedure_code)s')
+            params['procedure_code'] = procedure_code
+            if modifier is not None:
+                rvu_filter += " AND COALESCE(modifier, '') = %(modifier)s"
+                delete_where.append('modifier = %(modifier)s')
+                params['modifier'] = modifier
+        if locality_code:
+            locality_filter = 'AND loc.locality_code = %(locality_code)s'
+            params['locality_code'] = locality_code
+
+        started = time.monotonic()
+        with transaction.atomic(), connection.cursor() as cursor:
+            if locality_code:
+                cursor.execute(
+                    "SELECT DISTINCT carrier_code, locality_code FROM medicare_locality_map "
+                    "WHERE locality_code = %s",
+                    [locality_code],
+                )
+                keys = [medicare_rate_key(*row) for row in cursor.fetchall()]
+                if not keys:
+                    raise CommandError(f'Locality {locality_code} is not in medicare_locality_map')
+                placeholders = ', '.join(f'%(key{i})s' for i in range(len(keys)))
+                delete_where.append(f'locality_code IN ({placeholders})')
+                params.update({f'key{i}': key for i, key in enumerate(keys)})
+
+            cursor.execute(f"DELETE FROM medicare_rate WHERE {' AND '.join(delete_where)}", params)
+            deleted = cursor.rowcount
+            cursor.execute(
+                BUILD_SQL.format(locality_filter=locality_filter, rvu_filter=rvu_filter),
+                params,
+            )
+            inserted = cursor.rowcount
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'medicare_rate {year}: replaced {deleted:,} rows with {inserted:,} in {elapsed:.1f}s'
+        ))
@@ -1,43 +1,248 @@
+import os
+import time
+
 from django.core.management.base import BaseCommand
-from django.db import connection
-from django.db.models import Count
-from core.models import (
-    MedicareLocalityMap,
-    MedicareLocalityMeta,
-    CmsGpci,
-    CmsRvu,
-    CmsConversionFactor
-)
+from django.db import DatabaseError, connection
+
+from core.versioning import ANALYZE_RELEASE, record_analyze
+
+# Columns that point at another table by value. Lookups filter and join on
+# them, so each should lead an index.
+FOREIGN_KEY_COLUMNS = ('fee_schedule_id', 'region_id', 'state_code')
+
+# Without a recorded ANALYZE time, statistics are called possibly stale when
+# the table's rowid range is more than this fraction above their row count.
+# Deleted rows also leave such gaps, so this is only a hint.
+STALE_STATS_RATIO = 0.1
+
+
+def file_stats(cursor):
+    """Page size, page and freelist counts, and the database and WAL file sizes."""
+    stats = {}
+    for pragma in ('page_size', 'page_count', 'freelist_count'):
+        cursor.execute(f'PRAGMA {pragma}')
+        stats[pragma] = cursor.fetchone()[0]
+    path = connection.settings_dict['NAME']
+    stats['path'] = str(path)
+    stats['file_size'] = stats['page_size'] * stats['page_count']
+    stats['wal_size'] = os.path.getsize(f'{path}-wal') if os.path.exists(f'{path}-wal') else 0
+    stats['free_percent'] = 100 * stats['freelist_count'] / stats['page_count'] if stats['page_count'] else 0
+    return stats
+
+
+def user_tables(cursor):
+    cursor.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def analyzed_row_counts(cursor):
+    """
+    Row counts recorded by the last ANALYZE, from ``sqlite_stat1``.
+
+    Each table's entries start with its row count; tables that were empty
+    when ANALYZE ran have none.
+    """
+    try:
+        cursor.execute('SELECT tbl, stat FROM sqlite_stat1')
+    except DatabaseError:
+        return {}  # ANALYZE has never run
+    counts = {}
+    for table, stat in cursor.fetchall():
+        if stat:
+            counts.setdefault(table, int(stat.split()[0]))
+    return counts
+
+
+def release_times(cursor):
+    """
+    ``{table: updated_at}`` from ``data_release``, including the
+    ANALYZE_RELEASE row written by ``record_analyze()``.
+    """
+    try:
+        cursor.execute('SELECT table_name, updated_at FROM data_release')
+    except DatabaseError:
+        return {}  # not migrated yet
+    return dict(cursor.fetchall())
+
+
+def rowid_span(cursor, table):
+    """
+    ``MAX(rowid) - MIN(rowid) + 1``: an upper bound on the row count read
+    from both ends of the table's b-tree, or None for WITHOUT ROWID tables.
+    """
+    quoted = connection.ops.quote_name(table)
+    # Separate subqueries: SQLite only seeks an end of the b-tree for a lone
+    # MIN() or MAX(); together they scan the table.
+    try:
+        cursor.execute(f'SELECT (SELECT MIN(rowid) FROM {quoted}), (SELECT MAX(rowid) FROM {quoted})')
+    except DatabaseError:
+        return None
+    low, high = cursor.fetchone()
+    return 0 if low is None else high - low + 1
+
+
+def statistics_status(analyzed_rows, span, changed_at=None, analyzed_at=None):
+    """
+    'ok', 'missing', 'stale' or 'possibly stale' for a table's ANALYZE row count.
+
+    When both the table's last write (``changed_at``) and the last recorded
+    ANALYZE (``analyzed_at``) are known, they decide. Otherwise a rowid range
+    shorter than the row count proves rows were deleted since, and one well
+    above it may mean rows were added, or only that some rowids are unused.
+    """
+    if analyzed_rows is None:
+        return 'ok' if span == 0 else 'missing'
+    # CURRENT_TIMESTAMP has one-second resolution; a write in the same second
+    # as ANALYZE counts as after it.
+    if changed_at is not None and analyzed_at is not None:
+        return 'stale' if changed_at >= analyzed_at else 'ok'
+    if span is None:
+        return 'ok'
+    if span < analyzed_rows:
+        return 'stale'
+    if span > analyzed_rows * (1 + STALE_STATS_RATIO):
+        return 'possibly stale'
+    return 'ok'
+
+
+def unindexed_columns(cursor, tables):
+    """
+    ``(table, column)`` for each FOREIGN_KEY_COLUMNS column that is neither
+    the primary key nor the first column of an index.
+    """
+    missing = []
+    for table in tables:
+        quoted = connection.ops.quote_name(table)
+        cursor.execute(f'PRAGMA table_info({quoted})')
+        columns = {row[1]: row[5] for row in cursor.fetchall()}
+        wanted = [column for column in FOREIGN_KEY_COLUMNS if column in columns and columns[column] != 1]
+        if not wanted:
+            continue
+        cursor.execute(f'PRAGMA index_list({quoted})')
+        leading = set()
+        for index in cursor.fetchall():
+            cursor.execute(f'PRAGMA index_info({connection.ops.quote_name(index[1])})')
+            leading.update(row[2] for row in cursor.fetchall() if row[0] == 0)
+        missing.extend((table, column) for column in wanted if column not in leading)
+    return missing
+
+
+def table_pages(cursor):
+    """
+    ``{table or index: (pages, used bytes, page bytes)}`` from ``dbstat``.
+
+    This walks every page of the database, so it takes seconds on a large
+    file, and needs SQLite built with SQLITE_ENABLE_DBSTAT_VTAB.
+    """
+    cursor.execute("SELECT name, pageno, pgsize - unused, pgsize FROM dbstat('main', 1)")
+    return {name: (pages, used, size) for name, pages, used, size in cursor.fetchall()}
+
+
+def megabytes(size):
+    return f'{size / 1024 / 1024:,.1f} MB'
+
 
 class Command(BaseCommand):
-    help = 'Verifies database connection and shows row counts for each table'
+    help = (
+        'Reports database health without scanning tables: file size and free pages, '
+        'row counts from ANALYZE statistics, stale or missing statistics, and '
+        'unindexed foreign-key-like columns'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--analyze', action='store_true',
+            help='Run ANALYZE first and record when, so later reports can tell which tables changed since',
+        )
+        parser.add_argument(
+            '--pages', action='store_true',
+            help='Also list pages and fill per table and index (reads every page; slow on large files)',
+        )
 
     def handle(self, *args, **options):
+        started = time.monotonic()
         try:
-            # Test database connection
             with connection.cursor() as cursor:
                 cursor.execute("SELECT 1")
                 self.stdout.write(self.style.SUCCESS('Database connection successful!'))
-            
-            # Get counts for each model
-            models = [
-                MedicareLocalityMap,
-                MedicareLocalityMeta,
-                CmsGpci,
-                CmsRvu,
-                CmsConversionFactor
-            ]
-            
-            self.stdout.write('\nTable Row Counts:')
-            self.stdout.write('-' * 30)
-            
-            for model in models:
-                count = model.objects.count()
-                self.stdout.write(f'{model._meta.db_table}: {count:,} rows')
-            
-            self.stdout.write(self.style.SUCCESS('\nDatabase check completed successfully!'))
-            
+
+                if options['analyze']:
+                    record_analyze()
+                    self.stdout.write('ANALYZE completed')
+
+                stats = file_stats(cursor)
+                tables = user_tables(cursor)
+                analyzed = analyzed_row_counts(cursor)
+                changed = release_times(cursor)
+                analyzed_at = changed.get(ANALYZE_RELEASE)
+                statuses = {
+                    table: statistics_status(
+                        analyzed.get(table), rowid_span(cursor, table), changed.get(table), analyzed_at,
+                    )
+                    for table in tables
+                }
+                unindexed = unindexed_columns(cursor, tables)
+                pages = table_pages(cursor) if options['pages'] else None
         except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error checking database: {str(e)}'))
+            return
+
+        self.stdout.write(f"\n{stats['path']}")
+        wal = f" (+ {megabytes(stats['wal_size'])} WAL)" if stats['wal_size'] else ''
+        self.stdout.write(
+            f"  {megabytes(stats['file_size'])}{wal}: {stats['page_count']:,} pages of "
+            f"{stats['page_size']:,} bytes, {stats['freelist_count']:,} free "
+            f"({stats['free_percent']:.1f}%)"
+        )
+        if stats['free_percent'] >= 10:
+            self.stdout.write(self.style.WARNING('  Over 10% of pages are free; VACUUM would shrink the file'))
+
+        self.stdout.write('\nTable rows (from the last ANALYZE):')
+        self.stdout.write('-' * 30)
+        width = max((len(table) for table in tables), default=0)
+        for table in tables:
+            rows = analyzed.get(table)
+            line = f"  {table:<{width}}  {'-' if rows is None else format(rows, ','):>12}"
+            if pages is not None and table in pages:
+                count, used, size = pages[table]
+                line += f'  {count:>10,} pages  {100 * used / size if size else 0:5.1f}% full'
+            status = statuses[table]
+            if status == 'ok':
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.WARNING(f'{line}  {status} statistics'))
+
+        if pages is not None:
+            indexes = sorted(
+                name for name in pages
+                if name not in statuses
+                and not name.startswith(('sqlite_master', 'sqlite_schema', 'sqlite_sequence', 'sqlite_stat'))
+            )
+            index_width = max((len(name) for name in indexes), default=0)
+            self.stdout.write('\nIndexes:')
+            for name in indexes:
+                count, used, size = pages[name]
+                self.stdout.write(
+                    f'  {name:<{index_width}}  {count:>10,} pages  {100 * used / size if size else 0:5.1f}% full'
+                )
+
+        stale = [table for table, status in statuses.items() if status in ('missing', 'stale')]
+        if stale:
+            self.stdout.write(self.style.WARNING(
+                f'\nMissing or stale statistics on {len(stale)} of {len(tables)} tables; '
+                'run check_db --analyze'
+            ))
+        if analyzed_at is None and 'possibly stale' in statuses.values():
             self.stdout.write(
-                self.style.ERROR(f'Error checking database: {str(e)}')
-            ) 
\ No newline at end of file
+                '\nNo ANALYZE time is recorded, so tables with unused rowids may be listed as possibly '
+                'stale; check_db --analyze records one'
+            )
+        if unindexed:
+            self.stdout.write(self.style.WARNING('\nUnindexed foreign-key-like columns:'))
+            for table, column in unindexed:
+                self.stdout.write(f'  {table}.{column}')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f'\nDatabase check completed in {elapsed:.2f}s'))
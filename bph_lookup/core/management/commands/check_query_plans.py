@@ -0,0 +1,153 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+
+from core.benchmarking import BENCHMARK_SQL
+from core.catalog import STATE_CHOICES_SQL
+from core.comparison import COMPARISON_SQL
+from core.pagination import encode_cursor
+from core.percentiles import rate_percentiles
+from core.pricing import PRICING_YEAR, RATE_LOOKUP_SQL
+from core.spatial import get_zip_grid, nearby_commercial_rates
+from core.views import WORKERS_COMP_RATES_SQL, rates_page
+
+# Every "SCAN t" row reads all of t, including "SCAN t USING INDEX ..." and
+# "SCAN t USING COVERING INDEX ...", which walk an index end to end. A
+# constant row or a subquery SQLite materialized is not a table.
+FULL_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(?!CONSTANT ROW$|SUBQUERY \d)(\w+)')
+DERIVED_RE = re.compile(r'^(?:MATERIALIZE|CO-ROUTINE) (\w+)')
+TABLE_REF_RE = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?"?(\w+)"?)?', re.IGNORECASE)
+NOT_ALIASES = {'on', 'where', 'join', 'left', 'inner', 'cross', 'group', 'order', 'limit', 'using'}
+
+# The one exception to "no full scans": a query may scan the tables listed
+# for it here, and no others. Each entry is a table that is
+# small by nature or a query that reads everything by design:
+# - cms_conversion_factor has one row per year; once ANALYZE has counted it,
+#   SQLite makes it the outer loop of the reference Medicare lookup.
+# - fee_schedule has one row per state schedule; the state catalog lists them.
+# - percent_of_medicare prices every rate line.
+EXPECTED_SCANS = {
+    'rate_lookup (reference SQL)': {'cms_conversion_factor'},
+    'state catalog (WorkersCompRateLookupForm)': {'fee_schedule'},
+    'percent_of_medicare (every rate line)': {'fee_schedule_rate'},
+}
+
+
+def lookup_queries():
+    """(label, sql, params) for every lookup query the views and forms run."""
+    return [
+        ('rate_lookup (reference SQL)', RATE_LOOKUP_SQL,
+         ['90210', PRICING_YEAR, PRICING_YEAR, '99213']),
+        ('workers_comp_lookup', WORKERS_COMP_RATES_SQL, ['99213', 'CA']),
+        ('state catalog (WorkersCompRateLookupForm)', STATE_CHOICES_SQL, []),
+        ('workers_comp_comparison', COMPARISON_SQL, ['99213']),
+        ('percent_of_medicare (every rate line)', BENCHMARK_SQL, []),
+    ]
+
+
+def table_aliases(sql):
+    """Map each table name and alias in ``sql`` to its table."""
+    aliases = {}
+    for table, alias in TABLE_REF_RE.findall(sql):
+        aliases[table] = table
+        if alias and alias.lower() not in NOT_ALIASES:
+            aliases[alias] = table
+    return aliases
+
+
+def sample_zip_code():
+    """A ZIP with coordinates, so the radius search has ZIPs to query."""
+    try:
+        zip_codes = get_zip_grid().zip_codes
+    except DatabaseError:
+        return '90210'
+    return str(zip_codes[0]) if len(zip_codes) else '90210'
+
+
+def runtime_lookups():
+    """
+    (label, function, args) for lookups whose SQL is built at run time: the
+    ORM querysets behind /api/rates/, including a keyset page after a
+    cursor, and the percentile and radius searches. Each is run once and the
+    queries it sends are planned.
+    """
+    zip_code = sample_zip_code()
+    after = encode_cursor([0, '99213', '', 0, 0])
+    return [
+        ('rate_lookup_api first page', rates_page, ('CA', '99213', None, 1)),
+        ('rate_lookup_api keyset page', rates_page, ('CA', '99213', after, 1)),
+        ('rate_lookup_api keyset page, every state', rates_page, (None, '99213', after, 1)),
+        ('commercial_percentiles_api', rate_percentiles, ('99213', '', zip_code)),
+        ('nearby_api commercial rates', nearby_commercial_rates, (zip_code, 25, '99213')),
+    ]
+
+
+def captured_queries(function, args):
+    """The SQL ``function(*args)`` sends, with its parameters inlined."""
+    with CaptureQueriesContext(connection) as captured:
+        function(*args)
+    return [query['sql'] for query in captured.captured_queries]
+
+
+def full_table_scans(plan):
+    """Return the tables (or aliases) a query plan reads in full."""
+    derived = {match.group(1) for row in plan if (match := DERIVED_RE.match(row[-1]))}
+    scans = []
+    for row in plan:
+        match = FULL_SCAN_RE.match(row[-1])
+        if match and match.group(1) not in derived:
+            scans.append(match.group(1))
+    return scans
+
+
+class Command(BaseCommand):
+    help = 'Runs EXPLAIN QUERY PLAN on the lookup queries and fails on full table scans'
+
+    def handle(self, *args, **options):
+        failures = 0
+        queries = list(lookup_queries())
+        for label, function, function_args in runtime_lookups():
+            try:
+                sent = captured_queries(function, function_args)
+            except Exception as e:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f'\n{label}\n  Could not run lookup: {e}'))
+                continue
+            if not sent:
+                self.stdout.write(self.style.WARNING(f'\n{label}\n  Sent no queries for the sample input'))
+            # Captured SQL has its parameters inlined, so it is run without
+            # params and any % in it is left alone.
+            queries.extend(
+                (f'{label} ({i} of {len(sent)})' if len(sent) > 1 else label, sql, None)
+                for i, sql in enumerate(sent, 1)
+            )
+
+        with connection.cursor() as cursor:
+            for label, sql, params in queries:
+                self.stdout.write(f'\n{label}')
+                try:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                    plan = cursor.fetchall()
+                except Exception as e:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f'  Could not plan query: {e}'))
+                    continue
+
+                for row in plan:
+                    self.stdout.write(f'  {row[-1]}')
+                aliases = table_aliases(sql)
+                scans = [
+                    scan for scan in full_table_scans(plan)
+                    if aliases.get(scan, scan) not in EXPECTED_SCANS.get(label, ())
+                ]
+                if scans:
+                    failures += 1
+                    self.stdout.write(self.style.ERROR(f'  Full table scan of {", ".join(scans)}'))
+                else:
+                    self.stdout.write(self.style.SUCCESS('  OK'))
+
+        if failures:
+            raise CommandError(f'{failures} lookup queries do full table scans or could not be planned')
+        self.stdout.write(self.style.SUCCESS('\nAll lookup queries use indexes.'))
@@ -0,0 +1,438 @@
+import math
+import random
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.db import create_indexes
+from core.pricing import PRICING_YEAR, reset_pricing_engines
+from core.versioning import record_data_version
+
+# (code, name, 3-digit ZIP prefix ranges, centroid latitude, centroid longitude)
+STATES = [
+    ('AL', 'Alabama', [(350, 369)], 32.8, -86.8),
+    ('AK', 'Alaska', [(995, 999)], 61.4, -150.0),
+    ('AZ', 'Arizona', [(850, 865)], 34.2, -111.7),
+    ('AR', 'Arkansas', [(716, 729)], 34.9, -92.4),
+    ('CA', 'California', [(900, 961)], 36.8, -119.4),
+    ('CO', 'Colorado', [(800, 816)], 39.0, -105.5),
+    ('CT', 'Connecticut', [(60, 69)], 41.6, -72.7),
+    ('DE', 'Delaware', [(197, 199)], 39.0, -75.5),
+    ('DC', 'District of Columbia', [(200, 205)], 38.9, -77.0),
+    ('FL', 'Florida', [(320, 349)], 28.6, -82.4),
+    ('GA', 'Georgia', [(300, 319)], 32.7, -83.4),
+    ('HI', 'Hawaii', [(967, 968)], 20.8, -156.3),
+    ('ID', 'Idaho', [(832, 838)], 44.4, -114.6),
+    ('IL', 'Illinois', [(600, 629)], 40.0, -89.2),
+    ('IN', 'Indiana', [(460, 479)], 39.9, -86.3),
+    ('IA', 'Iowa', [(500, 528)], 42.1, -93.5),
+    ('KS', 'Kansas', [(660, 679)], 38.5, -98.4),
+    ('KY', 'Kentucky', [(400, 427)], 37.5, -85.3),
+    ('LA', 'Louisiana', [(700, 714)], 31.1, -92.0),
+    ('ME', 'Maine', [(39, 49)], 45.4, -69.2),
+    ('MD', 'Maryland', [(206, 219)], 39.0, -76.8),
+    ('MA', 'Massachusetts', [(10, 27)], 42.3, -71.8),
+    ('MI', 'Michigan', [(480, 499)], 44.3, -85.4),
+    ('MN', 'Minnesota', [(550, 567)], 46.3, -94.3),
+    ('MS', 'Mississippi', [(386, 397)], 32.7, -89.7),
+    ('MO', 'Missouri', [(630, 658)], 38.4, -92.5),
+    ('MT', 'Montana', [(590, 599)], 47.0, -109.6),
+    ('NE', 'Nebraska', [(680, 693)], 41.5, -99.8),
+    ('NV', 'Nevada', [(889, 898)], 39.3, -116.6),
+    ('NH', 'New Hampshire', [(30, 38)], 43.7, -71.6),
+    ('NJ', 'New Jersey', [(70, 89)], 40.2, -74.7),
+    ('NM', 'New Mexico', [(870, 884)], 34.4, -106.1),
+    ('NY', 'New York', [(100, 149)], 42.9, -75.5),
+    ('NC', 'North Carolina', [(270, 289)], 35.6, -79.4),
+    ('ND', 'North Dakota', [(580, 588)], 47.5, -100.5),
+    ('OH', 'Ohio', [(430, 458)], 40.3, -82.8),
+    ('OK', 'Oklahoma', [(730, 749)], 35.6, -97.5),
+    ('OR', 'Oregon', [(970, 979)], 43.9, -120.6),
+    ('PA', 'Pennsylvania', [(150, 196)], 40.9, -77.8),
+    ('RI', 'Rhode Island', [(28, 29)], 41.7, -71.5),
+    ('SC', 'South Carolina', [(290, 299)], 33.9, -80.9),
+    ('SD', 'South Dakota', [(570, 577)], 44.4, -100.2),
+    ('TN', 'Tennessee', [(370, 385)], 35.9, -86.4),
+    ('TX', 'Texas', [(750, 799)], 31.5, -99.3),
+    ('UT', 'Utah', [(840, 847)], 39.3, -111.7),
+    ('VT', 'Vermont', [(50, 59)], 44.1, -72.7),
+    ('VA', 'Virginia', [(220, 246)], 37.5, -78.9),
+    ('WA', 'Washington', [(980, 994)], 47.4, -120.5),
+    ('WV', 'West Virginia', [(247, 268)], 38.6, -80.6),
+    ('WI', 'Wisconsin', [(530, 549)], 44.6, -89.9),
+    ('WY', 'Wyoming', [(820, 831)], 43.0, -107.6),
+]
+
+# Tables the generator fills, in the order they are cleared.
+TABLES = [
+    'commercial_rate', 'zip_code_enriched', 'fee_schedule_rate', 'region', 'fee_schedule',
+    'state', 'procedure_code', 'cms_rvu', 'cms_gpci', 'cms_conversion_factor',
+    'medicare_locality_meta', 'medicare_locality_map',
+]
+
+# Unmanaged tables that exist only in the loaded database.
+CREATE_EXTRA_TABLES_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS zip_code_enriched (
+        zip_code varchar(5) NOT NULL PRIMARY KEY,
+        city varchar(100) NULL,
+        county varchar(100) NULL,
+        state varchar(2) NULL,
+        latitude real NULL,
+        longitude real NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS commercial_rate (
+        id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+        procedure_code varchar(20) NOT NULL,
+        modifier varchar(5) NULL,
+        zip_code varchar(10) NOT NULL,
+        provider varchar(200) NOT NULL,
+        payer varchar(200) NOT NULL,
+        rate decimal NOT NULL,
+        effective_date date NOT NULL,
+        data_source varchar(100) NOT NULL,
+        last_updated datetime NOT NULL
+    )
+    """,
+]
+
+CATEGORIES = [
+    (10000, 69999, 'Surgery'),
+    (70000, 79999, 'Radiology'),
+    (80000, 89999, 'Pathology and Laboratory'),
+    (90000, 99199, 'Medicine'),
+    (99200, 99499, 'Evaluation and Management'),
+]
+
+PAYERS = ['Aetna', 'Anthem', 'Cigna', 'Humana', 'Kaiser', 'UnitedHealthcare', 'BCBS', 'Molina']
+
+# Codes and ZIPs the benchmarks and docs use as examples.
+ANCHOR_PROCEDURE = 99213
+ANCHOR_ZIP = 90210
+
+BATCH_SIZE = 50000
+
+
+def _category(code):
+    for low, high, name in CATEGORIES:
+        if low <= code <= high:
+            return name
+    return 'Medicine'
+
+
+def _insert(cursor, table, columns, rows):
+    """executemany ``rows`` into ``table`` in batches; returns the row count."""
+    sql = f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join(["%s"] * len(columns))})'
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills the configured database with a synthetic, CMS-scale dataset (RVUs, GPCIs, '
+        "the ZIP locality map, workers' comp fee schedules and commercial rates) for benchmarks"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procedures', type=int, default=20000,
+                            help='Number of distinct procedure codes')
+        parser.add_argument('--zip-codes', type=int, default=42000,
+                            help='Number of ZIP codes in medicare_locality_map')
+        parser.add_argument('--modifier-share', type=float, default=0.25,
+                            help='Share of procedure codes priced with 26/TC modifiers too')
+        parser.add_argument('--regional-states', type=int, default=10,
+                            help='States whose fee schedules are split into regions')
+        parser.add_argument('--regions', type=int, default=4,
+                            help='Regions per regional state')
+        parser.add_argument('--commercial-rates', type=int, default=200000)
+        parser.add_argument('--year', type=int, default=PRICING_YEAR,
+                            help='Latest CMS year to generate')
+        parser.add_argument('--years', type=int, default=1,
+                            help='Number of CMS years to generate, ending with --year')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--replace', action='store_true',
+                            help='Delete existing rows from the generated tables first')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rng = random.Random(options['seed'])
+        years = list(range(options['year'] - options['years'] + 1, options['year'] + 1))
+        self.now = datetime.now().isoformat(sep=' ', timespec='seconds')
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._prepare_schema(cursor, options['replace'])
+            codes = self._procedure_codes(rng, options['procedures'])
+            rvus = self._rvus(rng, codes, options['modifier_share'])
+            zips = self._zip_codes(rng, options['zip_codes'])
+            localities = self._localities(rng)
+
+            counts = {}
+            counts['procedure_code'] = _insert(
+                cursor, 'procedure_code',
+                ['procedure_code', 'description', 'code_type', 'category'],
+                ((f'{code:05d}', f'Synthetic procedure {code:05d}', 'CPT', _category(code))
+                 for code in codes),
+            )
+            counts['cms_conversion_factor'] = _insert(
+                cursor, 'cms_conversion_factor',
+                ['year', 'conversion_factor', 'effective_date', 'last_updated'],
+                ((year, self._conversion_factor(year, options['year']), f'{year}-01-01', self.now)
+                 for year in years),
+            )
+            counts['cms_rvu'] = _insert(
+                cursor, 'cms_rvu',
+                ['procedure_code', 'modifier', 'work_rvu', 'practice_expense_rvu',
+                 'malpractice_rvu', 'total_rvu', 'year'],
+                self._rvu_rows(rvus, years, options['year']),
+            )
+            counts['medicare_locality_map'] = _insert(
+                cursor, 'medicare_locality_map',
+                ['zip_code', 'state_code', 'carrier_code', 'locality_code', 'year_qtr'],
+                ((f'{zip_code:05d}', state, carrier, locality, f"{options['year']}1")
+                 for zip_code, (state, carrier, locality) in self._zip_localities(zips, localities)),
+            )
+            counts['medicare_locality_meta'] = _insert(
+                cursor, 'medicare_locality_meta',
+                ['mac_code', 'locality_code', 'state_name', 'fee_schedule_area', 'counties'],
+                ((loc.carrier, loc.code, loc.state_name, loc.name, None) for loc in localities),
+            )
+            counts['cms_gpci'] = _insert(
+                cursor, 'cms_gpci',
+                ['locality_code', 'year', 'work_gpci', 'pe_gpci', 'mp_gpci', 'locality_name'],
+                ((loc.code, year,
+                  round(loc.work_gpci * (1 + 0.005 * (year - options['year'])), 3),
+                  round(loc.pe_gpci * (1 + 0.01 * (year - options['year'])), 3),
+                  round(loc.mp_gpci, 3), loc.name)
+                 for year in years for loc in localities),
+            )
+            counts['zip_code_enriched'] = _insert(
+                cursor, 'zip_code_enriched',
+                ['zip_code', 'city', 'county', 'state', 'latitude', 'longitude'],
+                self._zip_rows(rng, zips),
+            )
+            counts.update(self._fee_schedules(cursor, rng, rvus, options))
+            counts['commercial_rate'] = _insert(
+                cursor, 'commercial_rate',
+                ['procedure_code', 'modifier', 'zip_code', 'provider', 'payer', 'rate',
+                 'effective_date', 'data_source', 'last_updated'],
+                self._commercial_rows(rng, rvus, zips, options),
+            )
+
+            self._create_lookup_indexes()
+
+        record_data_version()
+        reset_pricing_engines()
+        for table, count in counts.items():
+            self.stdout.write(f'{table:<24} {count:>12,}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated the dataset in {time.perf_counter() - started:.1f}s'
+        ))
+
+    def _prepare_schema(self, cursor, replace):
+        for sql in CREATE_EXTRA_TABLES_SQL:
+            cursor.execute(sql)
+        columns = {
+            col.name for col in connection.introspection.get_table_description(cursor, 'fee_schedule_rate')
+        }
+        if 'state' not in columns:
+            # The loaded database carries the state on each rate row.
+            cursor.execute('ALTER TABLE fee_schedule_rate ADD COLUMN state TEXT')
+
+        if replace:
+            for table in TABLES:
+                cursor.execute(f'DELETE FROM {table}')
+            return
+        for table in TABLES:
+            cursor.execute(f'SELECT 1 FROM {table} LIMIT 1')
+            if cursor.fetchone():
+                raise CommandError(f'{table} already holds data; pass --replace to overwrite it.')
+
+    def _create_lookup_indexes(self):
+        # The state column and commercial_rate may have been created above,
+        # after the index migrations skipped them.
+        create_indexes(connection)
+
+    @staticmethod
+    def _conversion_factor(year, latest):
+        return round(32.35 * (1 + 0.012 * (year - latest)), 4)
+
+    @staticmethod
+    def _procedure_codes(rng, count):
+        population = [code for low, high, _ in CATEGORIES for code in range(low, high + 1)]
+        if count > len(population):
+            raise CommandError(f'At most {len(population):,} procedure codes can be generated.')
+        codes = set(rng.sample(population, count))
+        if ANCHOR_PROCEDURE not in codes:
+            codes.discard(next(iter(codes)))
+            codes.add(ANCHOR_PROCEDURE)
+        return sorted(codes)
+
+    @staticmethod
+    def _rvus(rng, codes, modifier_share):
+        """{(code, modifier): (work, pe, mp)} for the latest year; '' is the global service."""
+        rvus = {}
+        for code in codes:
+            work = round(rng.lognormvariate(math.log(1.5), 0.9), 2)
+            pe = round(work * rng.uniform(0.5, 1.5), 2)
+            mp = round(work * rng.uniform(0.03, 0.12), 2)
+            rvus[(code, '')] = (work, pe, mp)
+            if _category(code) != 'Evaluation and Management' and rng.random() < modifier_share:
+                professional_pe = round(pe * rng.uniform(0.1, 0.3), 2)
+                rvus[(code, '26')] = (work, professional_pe, mp)
+                rvus[(code, 'TC')] = (0.0, round(pe - professional_pe, 2), 0.01)
+        return rvus
+
+    @staticmethod
+    def _rvu_rows(rvus, years, latest):
+        for year in years:
+            drift = 1 + 0.01 * (year - latest)
+            for (code, modifier), (work, pe, mp) in rvus.items():
+                year_rvus = [round(value * drift, 2) for value in (work, pe, mp)]
+                yield (f'{code:05d}', modifier, *year_rvus, round(sum(year_rvus), 2), year)
+
+    @staticmethod
+    def _zip_codes(rng, count):
+        """{zip: state index} sampled from each state's real prefix ranges."""
+        population = [
+            (prefix * 100 + suffix, index)
+            for index, (_, _, ranges, _, _) in enumerate(STATES)
+            for low, high in ranges
+            for prefix in range(low, high + 1)
+            for suffix in range(100)
+        ]
+        if count > len(population):
+            raise CommandError(f'At most {len(population):,} ZIP codes can be generated.')
+        zips = dict(rng.sample(population, count))
+        if ANCHOR_ZIP not in zips:
+            zips.pop(next(iter(zips)))
+            zips[ANCHOR_ZIP] = next(i for i, state in enumerate(STATES) if state[0] == 'CA')
+        return zips
+
+    @staticmethod
+    def _localities(rng):
+        """
+        Medicare localities: a few metro areas per state, sized by its ZIP
+        prefixes, plus a "rest of state" locality.
+        """
+        localities = []
+        for index, (state, name, ranges, _, _) in enumerate(STATES):
+            prefixes = [p for low, high in ranges for p in range(low, high + 1)]
+            rng.shuffle(prefixes)
+            metros = min(len(prefixes) // 10, 5)
+            carrier = f'{index + 1:02d}'
+            groups = [prefixes[i::metros + 1] for i in range(metros + 1)]
+            for number, group in enumerate(groups):
+                rest = number == metros
+                localities.append(SimpleNamespace(
+                    state=state,
+                    state_name=name,
+                    carrier=carrier,
+                    code='99' if rest else f'{number + 1:02d}',
+                    name=f'REST OF {name.upper()}' if rest else f'{name.upper()} METRO {number + 1}',
+                    prefixes=set(group),
+                    work_gpci=1.0 if rest else rng.uniform(1.0, 1.08),
+                    pe_gpci=rng.uniform(0.85, 0.95) if rest else rng.uniform(0.95, 1.35),
+                    mp_gpci=rng.uniform(0.3, 2.0),
+                ))
+        return localities
+
+    @staticmethod
+    def _zip_localities(zips, localities):
+        """(zip, (state, carrier, locality code)) in ZIP order, assigned by ZIP prefix."""
+        by_prefix = {
+            prefix: (loc.state, loc.carrier, loc.code)
+            for loc in localities for prefix in loc.prefixes
+        }
+        return [(zip_code, by_prefix[zip_code // 100]) for zip_code in sorted(zips)]
+
+    @staticmethod
+    def _zip_rows(rng, zips):
+        for zip_code, index in sorted(zips.items()):
+            state, name, _, latitude, longitude = STATES[index]
+            prefix = zip_code // 100
+            # ZIPs sharing a prefix cluster around one point in the state.
+            prefix_rng = random.Random(prefix)
+            center_lat = latitude + prefix_rng.uniform(-1.5, 1.5)
+            center_lon = longitude + prefix_rng.uniform(-2.0, 2.0)
+            yield (
+                f'{zip_code:05d}', f'{name} City {prefix:03d}', f'{name} County {prefix % 20 + 1}',
+                state, round(center_lat + rng.gauss(0, 0.15), 5), round(center_lon + rng.gauss(0, 0.15), 5),
+            )
+
+    def _fee_schedules(self, cursor, rng, rvus, options):
+        counts = {'state': 0, 'fee_schedule': 0, 'region': 0, 'fee_schedule_rate': 0}
+        year = options['year']
+        cf = self._conversion_factor(year, year)
+        regional = set(rng.sample(range(len(STATES)), min(options['regional_states'], len(STATES))))
+
+        for index, (state, name, _, _, _) in enumerate(STATES):
+            has_regions = index in regional
+            counts['state'] += _insert(
+                cursor, 'state',
+                ['state_code', 'state_name', 'effective_date', 'has_regions', 'data_source'],
+                [(state, name, f'{year}-01-01', has_regions, 'synthetic')],
+            )
+            state_cf = round(cf * rng.uniform(1.0, 2.2), 4)
+            cursor.execute(
+                'INSERT INTO fee_schedule (state_code, schedule_type, effective_date, conversion_factor, notes) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [state, 'Physician', f'{year}-01-01', state_cf, 'Synthetic fee schedule'],
+            )
+            fee_schedule_id = cursor.lastrowid
+            counts['fee_schedule'] += 1
+
+            regions = [(None, 1.0)]
+            if has_regions:
+                regions = []
+                for number in range(1, options['regions'] + 1):
+                    cursor.execute(
+                        'INSERT INTO region (state_code, region_type, region_code, region_name) '
+                        'VALUES (%s, %s, %s, %s)',
+                        [state, 'Geographic', f'R{number}', f'{name} Region {number}'],
+                    )
+                    regions.append((cursor.lastrowid, rng.uniform(0.9, 1.15)))
+                    counts['region'] += 1
+
+            counts['fee_schedule_rate'] += _insert(
+                cursor, 'fee_schedule_rate',
+                ['fee_schedule_id', 'procedure_code', 'modifier', 'region_id', 'rate', 'rate_unit',
+                 'is_by_report', 'effective_date', 'last_updated', 'access_count', 'last_accessed',
+                 'service_type', 'code_type', 'state'],
+                (
+                    (fee_schedule_id, f'{code:05d}', modifier or None, region_id,
+                     round(sum(rvu) * state_cf * factor * rng.uniform(0.95, 1.05), 2), '1',
+                     False, f'{year}-01-01', self.now, 0, self.now, _category(code), 'CPT', state)
+                    for (code, modifier), rvu in rvus.items()
+                    for region_id, factor in regions
+                ),
+            )
+        return counts
+
+    def _commercial_rows(self, rng, rvus, zips, options):
+        cf = self._conversion_factor(options['year'], options['year'])
+        keys = list(rvus)
+        zip_codes = list(zips)
+        for _ in range(options['commercial_rates']):
+            code, modifier = rng.choice(keys)
+            rate = sum(rvus[(code, modifier)]) * cf * rng.lognormvariate(math.log(1.6), 0.35)
+            yield (
+                f'{code:05d}', modifier or None, f'{rng.choice(zip_codes):05d}',
+                f'Provider {rng.randrange(5000):04d}', rng.choice(PAYERS), round(rate, 2),
+                f"{options['year']}-01-01", 'synthetic', self.now,
+            )
+
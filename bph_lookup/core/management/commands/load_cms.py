@@ -0,0 +1,290 @@
+import csv
+import fnmatch
+import io
+import os
+import re
+import time
+import zipfile
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.pricing import reset_pricing_engines
+from core.versioning import record_data_version
+
+BATCH_SIZE = 10000
+
+# PPRRVU column positions. The CSV header is split over two rows ("WORK" /
+# "RVU"), so columns are read by position, which has been stable across
+# releases.
+PPRRVU_HCPCS = 0
+PPRRVU_MOD = 1
+PPRRVU_WORK_RVU = 5
+PPRRVU_NON_FAC_PE_RVU = 6
+PPRRVU_FAC_PE_RVU = 8
+PPRRVU_MP_RVU = 10
+PPRRVU_NON_FAC_TOTAL = 11
+PPRRVU_FAC_TOTAL = 12
+
+HCPCS_RE = re.compile(r'^[0-9A-Z]\d{3}[0-9A-Z]$')
+
+# GPCI columns are found by header text, which names them clearly but varies
+# in wording ("2025 PW GPCI (with 1.0 Floor)").
+GPCI_HEADERS = {
+    'locality_code': ('locality number',),
+    'locality_name': ('locality name',),
+    'work_gpci': ('pw gpci (with', 'pw gpci'),
+    'pe_gpci': ('pe gpci',),
+    'mp_gpci': ('mp gpci',),
+}
+
+
+def _number(value):
+    value = (value or '').strip()
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _header_index(header, candidates):
+    cells = [cell.strip().lower() for cell in header]
+    for candidate in candidates:
+        for i, cell in enumerate(cells):
+            if candidate in cell:
+                return i
+    return None
+
+
+def rvu_rows(reader, year, facility=False):
+    """
+    Yield cms_rvu rows from a PPRRVU CSV reader.
+
+    Title and header lines are skipped: data starts at the first row whose
+    first cell is a HCPCS code. Blank RVUs load as 0, as CMS publishes them.
+    """
+    pe_column = PPRRVU_FAC_PE_RVU if facility else PPRRVU_NON_FAC_PE_RVU
+    total_column = PPRRVU_FAC_TOTAL if facility else PPRRVU_NON_FAC_TOTAL
+    for row in reader:
+        if len(row) <= total_column or not HCPCS_RE.match(row[PPRRVU_HCPCS].strip()):
+            continue
+        yield (
+            row[PPRRVU_HCPCS].strip(),
+            row[PPRRVU_MOD].strip(),
+            _number(row[PPRRVU_WORK_RVU]) or 0,
+            _number(row[pe_column]) or 0,
+            _number(row[PPRRVU_MP_RVU]) or 0,
+            _number(row[total_column]),
+            year,
+        )
+
+
+def gpci_rows(reader, year):
+    """Yield cms_gpci rows from a GPCI CSV reader, locating columns from its header row."""
+    columns = None
+    for row in reader:
+        if columns is None:
+            if _header_index(row, GPCI_HEADERS['locality_name']) is None:
+                continue
+            columns = {field: _header_index(row, names) for field, names in GPCI_HEADERS.items()}
+            missing = [field for field, index in columns.items() if index is None]
+            if missing:
+                raise CommandError(f'GPCI file has no column for {", ".join(missing)}')
+            continue
+        locality_code = row[columns['locality_code']].strip() if len(row) > columns['mp_gpci'] else ''
+        work_gpci = _number(row[columns['work_gpci']]) if locality_code else None
+        if work_gpci is None:
+            continue  # footnotes and blank lines
+        yield (
+            locality_code.zfill(2),
+            year,
+            work_gpci,
+            _number(row[columns['pe_gpci']]),
+            _number(row[columns['mp_gpci']]),
+            # Names flagged "*" (localities served by two MACs) must still
+            # match medicare_locality_meta.fee_schedule_area.
+            row[columns['locality_name']].strip().rstrip('*').strip(),
+        )
+    if columns is None:
+        raise CommandError('GPCI file has no "Locality Name" header row')
+
+
+@contextmanager
+def open_csv(path, member_pattern=None):
+    """
+    Open a CSV for streaming, either a plain file or the member of a CMS
+    release zip matching ``member_pattern``.
+    """
+    if path.lower().endswith('.zip'):
+        with zipfile.ZipFile(path) as archive:
+            names = [n for n in archive.namelist() if fnmatch.fnmatch(os.path.basename(n).upper(), member_pattern)]
+            if not names:
+                raise CommandError(f'{path} has no file matching {member_pattern}')
+            with archive.open(names[0]) as raw:
+                yield csv.reader(io.TextIOWrapper(raw, encoding='latin-1', newline=''))
+    else:
+        with open(path, encoding='latin-1', newline='') as f:
+            yield csv.reader(f)
+
+
+def _insert(cursor, sql, rows):
+    count = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        cursor.executemany(sql, batch)
+        count += len(batch)
+    return count
+
+
+def _year_values(cursor, sql, year):
+    """{key: values} for one year; the first row per key wins, as in pricing."""
+    cursor.execute(sql, [year])
+    values = {}
+    for key_a, key_b, *rest in cursor.fetchall():
+        values.setdefault((key_a, key_b), tuple(rest))
+    return values
+
+
+RVU_VALUES_SQL = """
+    SELECT procedure_code, COALESCE(modifier, ''), work_rvu, practice_expense_rvu, malpractice_rvu
+    FROM cms_rvu WHERE year = %s ORDER BY rowid
+"""
+GPCI_VALUES_SQL = """
+    SELECT locality_code, TRIM(locality_name), work_gpci, pe_gpci, mp_gpci
+    FROM cms_gpci WHERE year = %s ORDER BY rowid
+"""
+
+
+def _numbers(values):
+    # Older years may hold NULL RVUs or GPCIs.
+    return tuple(None if value is None else float(value) for value in values)
+
+
+def diff_years(cursor, sql, old_year, new_year):
+    """
+    Compare one table's rows between two years.
+
+    Returns ``(added, changed, removed)`` lists of ``(key, old, new)``. A
+    value that is NULL in one year and set in the other counts as changed.
+    """
+    old = _year_values(cursor, sql, old_year)
+    new = _year_values(cursor, sql, new_year)
+    added = [(key, None, new[key]) for key in sorted(new.keys() - old.keys())]
+    removed = [(key, old[key], None) for key in sorted(old.keys() - new.keys())]
+    changed = [
+        (key, old[key], new[key])
+        for key in sorted(new.keys() & old.keys())
+        if _numbers(old[key]) != _numbers(new[key])
+    ]
+    return added, changed, removed
+
+
+class Command(BaseCommand):
+    help = (
+        'Loads a CMS physician fee schedule release (PPRRVU and GPCI files) into cms_rvu and '
+        'cms_gpci for one year, replacing that year, and reports changes against the prior year'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--year', type=int, required=True)
+        parser.add_argument('--release', help='CMS RVU release zip (e.g. RVU25A.zip) holding both files')
+        parser.add_argument('--rvu', help='PPRRVU CSV (overrides the one in --release)')
+        parser.add_argument('--gpci', help='GPCI CSV (overrides the one in --release)')
+        parser.add_argument('--facility', action='store_true',
+                            help='Load facility practice expense RVUs instead of non-facility')
+        parser.add_argument('--conversion-factor', type=float,
+                            help="Also set the year's conversion factor")
+        parser.add_argument('--compare-year', type=int,
+                            help='Year to diff against (default: the year before)')
+        parser.add_argument('--diff-report', help='Write every added, changed and removed row to this CSV')
+
+    def handle(self, *args, **options):
+        year = options['year']
+        rvu_source = options['rvu'] or options['release']
+        gpci_source = options['gpci'] or options['release']
+        if not (rvu_source or gpci_source):
+            raise CommandError('Give --release, or --rvu and/or --gpci')
+
+        started = time.perf_counter()
+        counts = {}
+        with transaction.atomic(), connection.cursor() as cursor:
+            if rvu_source:
+                with open_csv(rvu_source, 'PPRRVU*.CSV') as reader:
+                    cursor.execute('DELETE FROM cms_rvu WHERE year = %s', [year])
+                    counts['cms_rvu'] = _insert(
+                        cursor,
+                        'INSERT INTO cms_rvu (procedure_code, modifier, work_rvu, practice_expense_rvu, '
+                        'malpractice_rvu, total_rvu, year) VALUES (%s, %s, %s, %s, %s, %s, %s)',
+                        rvu_rows(reader, year, options['facility']),
+                    )
+            if gpci_source:
+                with open_csv(gpci_source, 'GPCI*.CSV') as reader:
+                    cursor.execute('DELETE FROM cms_gpci WHERE year = %s', [year])
+                    counts['cms_gpci'] = _insert(
+                        cursor,
+                        'INSERT INTO cms_gpci (locality_code, year, work_gpci, pe_gpci, mp_gpci, '
+                        'locality_name) VALUES (%s, %s, %s, %s, %s, %s)',
+                        gpci_rows(reader, year),
+                    )
+            if options['conversion_factor'] is not None:
+                cursor.execute(
+                    'INSERT INTO cms_conversion_factor (year, conversion_factor, effective_date, last_updated) '
+                    'VALUES (%s, %s, %s, CURRENT_TIMESTAMP) '
+                    'ON CONFLICT (year) DO UPDATE SET conversion_factor = excluded.conversion_factor, '
+                    'last_updated = excluded.last_updated',
+                    [year, options['conversion_factor'], f'{year}-01-01'],
+                )
+            if any(count == 0 for count in counts.values()):
+                empty = ', '.join(table for table, count in counts.items() if count == 0)
+                raise CommandError(f'No rows read for {empty}; is that the right file?')
+
+            compare_year = options['compare_year'] or year - 1
+            diffs = {
+                'cms_rvu': diff_years(cursor, RVU_VALUES_SQL, compare_year, year),
+                'cms_gpci': diff_years(cursor, GPCI_VALUES_SQL, compare_year, year),
+            }
+            cursor.execute('SELECT 1 FROM cms_conversion_factor WHERE year = %s', [year])
+            has_conversion_factor = cursor.fetchone() is not None
+
+        written = list(counts)
+        if options['conversion_factor'] is not None:
+            written.append('cms_conversion_factor')
+        record_data_version(written)
+        reset_pricing_engines()
+        for table, count in counts.items():
+            self.stdout.write(f'{table}: loaded {count:,} rows for {year}')
+        self.stdout.write(self.style.SUCCESS(f'Loaded in {time.perf_counter() - started:.1f}s'))
+        if not has_conversion_factor:
+            self.stdout.write(self.style.WARNING(
+                f'No conversion factor for {year}; pass --conversion-factor before pricing with it.'
+            ))
+
+        self.stdout.write(f'\nChanges against {compare_year}:')
+        for table in counts:
+            added, changed, removed = diffs[table]
+            self.stdout.write(
+                f'  {table}: {len(added):,} added, {len(changed):,} changed, {len(removed):,} removed'
+            )
+        if options['diff_report']:
+            self._write_report(options['diff_report'], {table: diffs[table] for table in counts})
+            self.stdout.write(f"Diff report written to {options['diff_report']}")
+
+    def _write_report(self, path, diffs):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['table', 'change', 'key', 'key2', 'old', 'new'])
+            for table, (added, changed, removed) in diffs.items():
+                for change, rows in (('added', added), ('changed', changed), ('removed', removed)):
+                    for key, old, new in rows:
+                        writer.writerow([
+                            table, change, *key,
+                            ' '.join(str(v) for v in old) if old else '',
+                            ' '.join(str(v) for v in new) if new else '',
+                        ])
@@ -0,0 +1,177 @@
+import http.client
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core.catalog import get_fee_schedule_states
+
+ENDPOINTS = ('medicare', 'workcomp', 'rates')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class HttpSession:
+    """One keep-alive connection with the cookies Django sets (csrftoken)."""
+
+    def __init__(self, base_url, timeout):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.base_url = base_url.rstrip('/')
+        self.host = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self._connect = lambda: connection_class(parts.netloc, timeout=timeout)
+        self.conn = self._connect()
+        self.cookies = SimpleCookie()
+
+    def request(self, method, path, body=None, headers=None):
+        """Send a request and return ``(status, body)``, reconnecting once on a dropped connection."""
+        headers = dict(headers or {})
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={m.value}' for k, m in self.cookies.items())
+        for attempt in range(2):
+            try:
+                self.conn.request(method, self.prefix + path, body=body, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = self._connect()
+                if attempt:
+                    raise
+        for header in response.headers.get_all('Set-Cookie') or []:
+            self.cookies.load(header)
+        return response.status, data
+
+    def post_form(self, path, fields):
+        token = self.cookies['csrftoken'].value if 'csrftoken' in self.cookies else ''
+        return self.request('POST', path, body=urlencode(fields), headers={
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'X-CSRFToken': token,
+            'Referer': self.base_url + path,
+        })
+
+
+class Command(BaseCommand):
+    help = (
+        'Load-tests /medicare/, /workcomp/ and /api/rates/ on a running server and reports '
+        'p50/p95/p99 latency and throughput per endpoint'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--warmup', type=int, default=100,
+                            help='Untimed requests per endpoint before measuring')
+        parser.add_argument('--page-size', type=int, default=100,
+                            help='page_size for /api/rates/ requests')
+        parser.add_argument('--samples', type=int, default=1000,
+                            help='ZIP and procedure codes drawn from the database for request inputs')
+        parser.add_argument('--timeout', type=float, default=30.0)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--max-p95-ms', type=float,
+                            help='Fail if any endpoint has a p95 latency above this')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        inputs = self._sample_inputs(options['samples'])
+        self.stdout.write(
+            f"{options['base_url']}: {options['requests']:,} requests per endpoint, "
+            f"concurrency {options['concurrency']}\n"
+        )
+        self.stdout.write(
+            f"{'endpoint':<12} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+        )
+
+        slow = []
+        for endpoint in options['endpoints']:
+            requests = [self._make_request(endpoint, rng, inputs, options) for _ in range(options['requests'])]
+            warmup = [self._make_request(endpoint, rng, inputs, options) for _ in range(options['warmup'])]
+            latencies, errors, elapsed = self._run(requests, warmup, options)
+            if not latencies:
+                raise CommandError(f'Every {endpoint} request failed; is the server at {options["base_url"]}?')
+            p95 = percentile(latencies, 0.95) * 1000
+            self.stdout.write(
+                f'{endpoint:<12} {len(requests) / elapsed:>9,.0f} '
+                f'{statistics.median(latencies) * 1000:>9.2f} {p95:>9.2f} '
+                f'{percentile(latencies, 0.99) * 1000:>9.2f} {errors:>7}'
+            )
+            if options['max_p95_ms'] is not None and p95 > options['max_p95_ms']:
+                slow.append(f'{endpoint} p95 {p95:.1f} ms')
+
+        if slow:
+            raise CommandError(f"Over the {options['max_p95_ms']} ms p95 budget: {', '.join(slow)}")
+
+    def _sample_inputs(self, samples):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT zip_code FROM medicare_locality_map ORDER BY RANDOM() LIMIT %s', [samples])
+            zip_codes = [row[0] for row in cursor.fetchall()]
+            cursor.execute(
+                "SELECT DISTINCT procedure_code FROM cms_rvu WHERE modifier IS NULL OR modifier = '' "
+                'ORDER BY RANDOM() LIMIT %s',
+                [samples],
+            )
+            procedure_codes = [row[0] for row in cursor.fetchall()]
+        states = get_fee_schedule_states()
+        if not (zip_codes and procedure_codes and states):
+            raise CommandError('The database has no ZIP map, RVUs or fee schedules to draw requests from.')
+        return {'zip_codes': zip_codes, 'procedure_codes': procedure_codes, 'states': states}
+
+    @staticmethod
+    def _make_request(endpoint, rng, inputs, options):
+        procedure_code = rng.choice(inputs['procedure_codes'])
+        if endpoint == 'medicare':
+            return 'POST', '/medicare/', {'zip_code': rng.choice(inputs['zip_codes']), 'procedure_code': procedure_code}
+        if endpoint == 'workcomp':
+            return 'POST', '/workcomp/', {'state': rng.choice(inputs['states']), 'procedure_code': procedure_code}
+        query = urlencode({
+            'state': rng.choice(inputs['states']),
+            'procedure_code': procedure_code,
+            'page_size': options['page_size'],
+        })
+        return 'GET', f'/api/rates/?{query}', None
+
+    @staticmethod
+    def _run(requests, warmup, options):
+        """Send ``requests`` from ``concurrency`` threads; returns sorted latencies, error count and wall time."""
+        local = threading.local()
+
+        def send(request):
+            method, path, fields = request
+            started = time.perf_counter()
+            try:
+                if not hasattr(local, 'session'):
+                    local.session = HttpSession(options['base_url'], options['timeout'])
+                if method == 'POST' and 'csrftoken' not in local.session.cookies:
+                    # Fetch the form once for its CSRF cookie, outside the timing.
+                    local.session.request('GET', path)
+                    started = time.perf_counter()
+                if method == 'POST':
+                    status, _ = local.session.post_form(path, fields)
+                else:
+                    status, _ = local.session.request(method, path)
+            except (OSError, http.client.HTTPException):
+                return None
+            return time.perf_counter() - started if status == 200 else None
+
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            # Untimed warm-up: opens the connections and fills the server's
+            # caches and in-memory tables so the numbers show steady state.
+            list(pool.map(send, warmup))
+            started = time.perf_counter()
+            results = list(pool.map(send, requests))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(r for r in results if r is not None)
+        return latencies, len(results) - len(latencies), elapsed
@@ -0,0 +1,215 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from core.pricing import load_pricing_engines, price_claims
+
+OUTPUT_FIELDS = ['medicare_allowed_amount', 'medicare_error', 'workers_comp_rate']
+
+# SQLite's default limit on bound parameters is 999; two per pair.
+FEE_SCHEDULE_PAIRS_PER_QUERY = 400
+
+
+def _init_worker():
+    """Give each pool process its own database connection."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+    connections.close_all()
+
+
+def _workers_comp_rates(pairs):
+    """Map (procedure_code, state, modifier) to the first matching fee_schedule_rate."""
+    rates = {}
+    pairs = list(pairs)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pairs), FEE_SCHEDULE_PAIRS_PER_QUERY):
+            batch = pairs[start:start + FEE_SCHEDULE_PAIRS_PER_QUERY]
+            clause = ' OR '.join(['(procedure_code = %s AND state = %s)'] * len(batch))
+            cursor.execute(
+                "SELECT procedure_code, state, COALESCE(modifier, ''), rate "
+                f"FROM fee_schedule_rate WHERE {clause} ORDER BY rowid",
+                [value for pair in batch for value in pair],
+            )
+            for procedure_code, state, modifier, rate in cursor.fetchall():
+                rates.setdefault((procedure_code, state, modifier), rate)
+    return rates
+
+
+def price_chunk(records):
+    """Price a chunk of claim lines against Medicare and the state fee schedules."""
+    lines = [
+        (
+            str(record.get('zip_code') or ''),
+            str(record.get('procedure_code') or ''),
+            str(record.get('modifier') or ''),
+            record.get('date_of_service') or None,
+        )
+        for record in records
+    ]
+    medicare = price_claims(lines)
+
+    pairs = {
+        (procedure_code, str(record['state']))
+        for record, (_, procedure_code, _, _) in zip(records, lines)
+        if record.get('state')
+    }
+    wc_rates = _workers_comp_rates(pairs) if pairs else {}
+
+    priced = []
+    for record, (_, procedure_code, modifier, _), result in zip(records, lines, medicare):
+        state = str(record.get('state') or '')
+        priced.append({
+            **record,
+            'medicare_allowed_amount': result.get('allowed_amount'),
+            'medicare_error': result['error'],
+            'workers_comp_rate': wc_rates.get((procedure_code, state, modifier)),
+        })
+    return priced
+
+
+class Command(BaseCommand):
+    help = 'Reprices CSV or JSONL claim lines against Medicare and workers\' comp fee schedules'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            nargs='?',
+            default='-',
+            help='Claim file with zip_code, procedure_code, modifier, date_of_service and state '
+                 'columns (default: stdin)',
+        )
+        parser.add_argument('--output', default='-', help='Output file (default: stdout)')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            help='Input and output format (default: from the input file extension, else csv)',
+        )
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Lines priced per task')
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Pricing processes; 1 prices in this process',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording the number of input lines written; an existing '
+                 'checkpoint resumes from that offset and appends to the output',
+        )
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or ('jsonl' if options['input'].endswith(('.jsonl', '.ndjson')) else 'csv')
+        chunk_size = options['chunk_size']
+        if chunk_size < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be positive')
+
+        offset = 0
+        checkpoint = options['checkpoint']
+        if checkpoint and os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                offset = int(f.read().strip() or 0)
+            self.stderr.write(f'Resuming from line {offset:,}')
+
+        # Load every year's pricing tables before forking so workers share them.
+        load_pricing_engines()
+        if options['workers'] > 1:
+            connections.close_all()
+
+        source = sys.stdin if options['input'] == '-' else open(options['input'], newline='')
+        if options['output'] == '-':
+            sink = self.stdout
+        else:
+            sink = open(options['output'], 'a' if offset else 'w', newline='')
+
+        try:
+            records = self._read(source, fmt)
+            chunks = self._chunks(itertools.islice(records, offset, None), chunk_size)
+            write = self._writer(sink, fmt, write_header=not offset)
+
+            written = 0
+            started = time.monotonic()
+            for priced in self._price(chunks, options['workers']):
+                for row in priced:
+                    write(row)
+                sink.flush()
+                written += len(priced)
+                if checkpoint:
+                    self._save_checkpoint(checkpoint, offset + written)
+                elapsed = max(time.monotonic() - started, 1e-9)
+                self.stderr.write(f'{offset + written:,} lines, {written / elapsed:,.0f} lines/s')
+        finally:
+            if source is not sys.stdin:
+                source.close()
+            if sink is not self.stdout:
+                sink.close()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        rate = written / elapsed
+        self.stderr.write(self.style.SUCCESS(
+            f'Repriced {written:,} lines in {elapsed:.1f}s ({rate:,.0f} lines/s)'
+        ))
+
+    def _read(self, source, fmt):
+        if fmt == 'csv':
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+    def _chunks(self, records, chunk_size):
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def _writer(self, sink, fmt, write_header):
+        if fmt == 'jsonl':
+            def write(row):
+                sink.write(json.dumps(row, default=str) + '\n')
+            return write
+
+        state = {}
+
+        def write(row):
+            if 'writer' not in state:
+                fields = list(row) + [f for f in OUTPUT_FIELDS if f not in row]
+                state['writer'] = csv.DictWriter(sink, fieldnames=fields, extrasaction='ignore')
+                if write_header:
+                    state['writer'].writeheader()
+            state['writer'].writerow(row)
+        return write
+
+    def _price(self, chunks, workers):
+        """Yield priced chunks in input order, keeping a bounded number in flight."""
+        if workers == 1:
+            for chunk in chunks:
+                yield price_chunk(chunk)
+            return
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(price_chunk, chunk))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def _save_checkpoint(self, path, offset):
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp, path)
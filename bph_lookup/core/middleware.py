@@ -0,0 +1,103 @@
+"""
+Per-request SQL and timing instrumentation.
+
+With ``QUERY_TIMING_ENABLED`` the middleware counts the queries a request
+runs and their total time, times the view and template rendering, and
+reports them in a ``Server-Timing`` header. Queries slower than
+``SLOW_QUERY_MS`` are logged to ``core.queries`` with their parameters and
+query plan. When the setting is off the middleware removes itself at startup.
+"""
+import logging
+from contextlib import ExitStack
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger('core.queries')
+
+
+class QueryTimer:
+    """``execute_wrapper`` that times every query run through a connection."""
+
+    def __init__(self, slow_seconds):
+        self.slow_seconds = slow_seconds
+        self.count = 0
+        self.duration = 0.0
+        self.slow_queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            if duration >= self.slow_seconds and not many:
+                self.slow_queries.append((context['connection'], sql, params, duration))
+
+
+def query_plan(connection, sql, params):
+    """EXPLAIN QUERY PLAN lines for a query, or None where it is unavailable."""
+    if connection.vendor != 'sqlite':
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+    except DatabaseError:
+        return None
+
+
+class QueryTimingMiddleware:
+    """
+    Adds ``Server-Timing: db, view, render, total`` to responses.
+
+    ``view`` runs from the view call until the response is returned or, for
+    template responses, handed to rendering; ``render`` is the rendering of
+    template and DRF responses. Place it first in ``MIDDLEWARE`` so ``total``
+    covers the other middleware too.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_TIMING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_seconds = getattr(settings, 'SLOW_QUERY_MS', 100) / 1000
+
+    def __call__(self, request):
+        timer = QueryTimer(self.slow_seconds)
+        request.query_timer = timer
+        request.view_started = request.view_finished = None
+        started = perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        finished = perf_counter()
+
+        metrics = [f'db;dur={timer.duration * 1000:.2f};desc="{timer.count} queries"']
+        if request.view_started is not None:
+            view_finished = request.view_finished or finished
+            metrics.append(f'view;dur={(view_finished - request.view_started) * 1000:.2f}')
+            if request.view_finished is not None:
+                metrics.append(f'render;dur={(finished - request.view_finished) * 1000:.2f}')
+        metrics.append(f'total;dur={(finished - started) * 1000:.2f}')
+        response['Server-Timing'] = ', '.join(metrics)
+
+        for connection, sql, params, duration in timer.slow_queries:
+            logger.warning(
+                'Slow query (%.1f ms) on %s %s\n%s\nparams: %r\nplan: %s',
+                duration * 1000, request.method, request.path, sql, params,
+                query_plan(connection, sql, params),
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_started = perf_counter()
+
+    def process_template_response(self, request, response):
+        request.view_finished = perf_counter()
+        return response
@@ -0,0 +1,35 @@
+from django.db import migrations
+
+from core.db import create_indexes, drop_indexes
+
+# (index name, table, columns). The first columns match how each table is
+# filtered; trailing columns let the lookup read the index without touching
+# the table rows.
+LOOKUP_INDEXES = [
+    ("fee_schedule_rate_code_state_idx", "fee_schedule_rate",
+     ["procedure_code", "state", "modifier"]),
+    ("cms_rvu_code_year_modifier_idx", "cms_rvu",
+     ["procedure_code", "year", "modifier", "work_rvu", "practice_expense_rvu", "malpractice_rvu"]),
+    ("cms_gpci_locality_year_idx", "cms_gpci",
+     ["locality_code", "year", "locality_name", "work_gpci", "pe_gpci", "mp_gpci"]),
+    ("medicare_locality_meta_mac_locality_idx", "medicare_locality_meta",
+     ["mac_code", "locality_code"]),
+]
+
+
+def add_lookup_indexes(apps, schema_editor):
+    create_indexes(schema_editor.connection, LOOKUP_INDEXES)
+
+
+def remove_lookup_indexes(apps, schema_editor):
+    drop_indexes(schema_editor.connection, LOOKUP_INDEXES)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_lookup_indexes, remove_lookup_indexes),
+    ]
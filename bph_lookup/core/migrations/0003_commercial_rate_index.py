@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from core.db import create_indexes, drop_indexes
+
+# Radius searches (core.spatial) read one procedure code's commercial rates
+# for a list of nearby ZIPs.
+COMMERCIAL_INDEXES = [
+    ("commercial_rate_code_zip_idx", "commercial_rate", ["procedure_code", "zip_code"]),
+]
+
+
+def add_commercial_indexes(apps, schema_editor):
+    create_indexes(schema_editor.connection, COMMERCIAL_INDEXES)
+
+
+def remove_commercial_indexes(apps, schema_editor):
+    drop_indexes(schema_editor.connection, COMMERCIAL_INDEXES)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0002_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_commercial_indexes, remove_commercial_indexes),
+    ]
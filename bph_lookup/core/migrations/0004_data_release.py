@@ -0,0 +1,39 @@
+from django.db import migrations, models
+
+from core.versioning import drop_release_triggers, install_release_triggers
+
+# Tables whose UPDATEs and DELETEs bump their data_release counter.
+RELEASE_TABLES = (
+    "state", "region", "fee_schedule", "fee_schedule_rate", "procedure_code",
+    "cms_rvu", "cms_gpci", "cms_conversion_factor",
+    "medicare_locality_map", "medicare_locality_meta",
+)
+
+
+def add_release_triggers(apps, schema_editor):
+    install_release_triggers(schema_editor.connection, RELEASE_TABLES)
+
+
+def remove_release_triggers(apps, schema_editor):
+    drop_release_triggers(schema_editor.connection, RELEASE_TABLES)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0003_commercial_rate_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataRelease",
+            fields=[
+                ("table_name", models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ("version", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField()),
+            ],
+            options={
+                "db_table": "data_release",
+            },
+        ),
+        migrations.RunPython(add_release_triggers, remove_release_triggers),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations, models
+
+# build_commercial_percentiles used to create the table itself, so it may
+# already exist; the SQL matches what CreateModel would run.
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS commercial_rate_percentile (
+        id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+        procedure_code varchar(20) NOT NULL,
+        modifier varchar(5) NOT NULL,
+        geography_type varchar(6) NOT NULL,
+        geography varchar(100) NOT NULL,
+        state varchar(2) NULL,
+        rate_count integer NOT NULL,
+        p10 real NOT NULL,
+        p25 real NOT NULL,
+        p50 real NOT NULL,
+        p75 real NOT NULL,
+        p90 real NOT NULL,
+        last_updated datetime NOT NULL
+    )
+"""
+
+CREATE_INDEX_SQL = """
+    CREATE UNIQUE INDEX IF NOT EXISTS commercial_rate_percentile_lookup_idx
+    ON commercial_rate_percentile (procedure_code, modifier, geography_type, geography, state)
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0004_data_release"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="CommercialRatePercentile",
+                    fields=[
+                        ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                        ("procedure_code", models.CharField(max_length=20)),
+                        ("modifier", models.CharField(max_length=5)),
+                        ("geography_type", models.CharField(max_length=6)),
+                        ("geography", models.CharField(max_length=100)),
+                        ("state", models.CharField(blank=True, max_length=2, null=True)),
+                        ("rate_count", models.IntegerField()),
+                        ("p10", models.FloatField()),
+                        ("p25", models.FloatField()),
+                        ("p50", models.FloatField()),
+                        ("p75", models.FloatField()),
+                        ("p90", models.FloatField()),
+                        ("last_updated", models.DateTimeField()),
+                    ],
+                    options={
+                        "db_table": "commercial_rate_percentile",
+                    },
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(CREATE_TABLE_SQL, "DROP TABLE IF EXISTS commercial_rate_percentile"),
+                migrations.RunSQL(
+                    CREATE_INDEX_SQL, "DROP INDEX IF EXISTS commercial_rate_percentile_lookup_idx",
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+from core.db import create_indexes, drop_indexes
+
+# /api/rates/ filters rates with fee_schedule_id IN (the state's fee
+# schedules), which otherwise scans fee_schedule.
+FEE_SCHEDULE_INDEXES = [
+    ("fee_schedule_state_idx", "fee_schedule", ["state_code"]),
+]
+
+
+def add_fee_schedule_indexes(apps, schema_editor):
+    create_indexes(schema_editor.connection, FEE_SCHEDULE_INDEXES)
+
+
+def remove_fee_schedule_indexes(apps, schema_editor):
+    drop_indexes(schema_editor.connection, FEE_SCHEDULE_INDEXES)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0005_commercial_rate_percentile"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fee_schedule_indexes, remove_fee_schedule_indexes),
+    ]
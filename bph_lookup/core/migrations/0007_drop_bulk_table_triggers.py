@@ -0,0 +1,26 @@
+from django.db import migrations
+
+from core.versioning import drop_release_triggers, install_release_triggers
+
+# Bulk-loaded tables whose per-row data_release triggers (0004) made every
+# large DELETE or UPDATE run one upsert per row. Their loaders bump the
+# counter once per load instead.
+BULK_TABLES = ("fee_schedule_rate", "cms_rvu", "medicare_locality_map")
+
+
+def remove_bulk_triggers(apps, schema_editor):
+    drop_release_triggers(schema_editor.connection, BULK_TABLES)
+
+
+def restore_bulk_triggers(apps, schema_editor):
+    install_release_triggers(schema_editor.connection, BULK_TABLES)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0006_fee_schedule_state_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_bulk_triggers, restore_bulk_triggers),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# MedicareRate is unmanaged and build_medicare_rates used to create the table
+# itself, so it may already exist. Reversing leaves it in place for the same
+# reason: it can hold data that predates this migration.
+CREATE_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS medicare_rate (
+        id integer NOT NULL PRIMARY KEY AUTOINCREMENT,
+        procedure_code varchar(20) NOT NULL,
+        modifier varchar(5) NULL,
+        locality_code varchar(10) NOT NULL,
+        rate decimal NOT NULL,
+        effective_date date NOT NULL,
+        expiration_date date NULL,
+        last_updated datetime NOT NULL
+    )
+"""
+
+CREATE_INDEX_SQL = """
+    CREATE UNIQUE INDEX IF NOT EXISTS medicare_rate_lookup_idx
+    ON medicare_rate (locality_code, procedure_code, modifier, effective_date)
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0007_drop_bulk_table_triggers"),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TABLE_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_INDEX_SQL, "DROP INDEX IF EXISTS medicare_rate_lookup_idx"),
+    ]
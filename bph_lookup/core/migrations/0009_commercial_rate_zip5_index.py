@@ -0,0 +1,32 @@
+from django.db import migrations
+
+from core.db import create_indexes, drop_indexes
+
+# Radius searches match commercial rates on SUBSTR(zip_code, 1, 5), so ZIP+4
+# rows are found; the expression index replaces the one on zip_code.
+OLD_COMMERCIAL_INDEXES = [
+    ("commercial_rate_code_zip_idx", "commercial_rate", ["procedure_code", "zip_code"]),
+]
+COMMERCIAL_INDEXES = [
+    ("commercial_rate_code_zip5_idx", "commercial_rate", ["procedure_code", "SUBSTR(zip_code, 1, 5)"]),
+]
+
+
+def add_commercial_indexes(apps, schema_editor):
+    create_indexes(schema_editor.connection, COMMERCIAL_INDEXES)
+    drop_indexes(schema_editor.connection, OLD_COMMERCIAL_INDEXES)
+
+
+def remove_commercial_indexes(apps, schema_editor):
+    create_indexes(schema_editor.connection, OLD_COMMERCIAL_INDEXES)
+    drop_indexes(schema_editor.connection, COMMERCIAL_INDEXES)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("core", "0008_medicare_rate_table"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_commercial_indexes, remove_commercial_indexes),
+    ]
@@ -189,6 +189,23 @@ class CmsConversionFactor(models.Model):
     def __str__(self):
         return f"CF {self.year}: {self.conversion_factor}"
 
+class DataRelease(models.Model):
+    """
+    Per-table change counter behind the data version (core.versioning).
+
+    Loaders bump it after writing a table and triggers on every UPDATE or
+    DELETE, so any change to the data moves the version.
+    """
+    table_name = models.CharField(max_length=100, primary_key=True)
+    version = models.IntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'data_release'
+
+    def __str__(self):
+        return f"{self.table_name} v{self.version}"
+
 # Additional models that exist in your database but not in Django models
 class ZipCodeEnriched(models.Model):
     """
@@ -224,6 +241,31 @@ class CommercialRate(models.Model):
         db_table = 'commercial_rate'
         managed = False  # Tell Django not to manage this table
 
+class CommercialRatePercentile(models.Model):
+    """
+    Commercial rate count and percentiles per procedure code and modifier in
+    a 3-digit ZIP or county, rebuilt by ``build_commercial_percentiles``.
+    Its unique lookup index is kept by core.percentiles, not declared here.
+    """
+    procedure_code = models.CharField(max_length=20)
+    modifier = models.CharField(max_length=5)
+    geography_type = models.CharField(max_length=6)  # 'zip3' or 'county'
+    geography = models.CharField(max_length=100)
+    state = models.CharField(max_length=2, null=True, blank=True)  # counties only
+    rate_count = models.IntegerField()
+    p10 = models.FloatField()
+    p25 = models.FloatField()
+    p50 = models.FloatField()
+    p75 = models.FloatField()
+    p90 = models.FloatField()
+    last_updated = models.DateTimeField()
+
+    class Meta:
+        db_table = 'commercial_rate_percentile'
+
+    def __str__(self):
+        return f"{self.procedure_code} {self.geography_type} {self.geography}"
+
 class MedicareRate(models.Model):
     """
     Medicare rates by locality.
@@ -0,0 +1,74 @@
+"""
+Keyset (cursor) pagination for the fee schedule rate API.
+
+Pages are ordered by the fee_schedule_rate unique key plus ``id`` as a tie
+breaker, and the cursor carries the key of the last row returned. The next
+page then starts with an index seek instead of an OFFSET that re-reads every
+earlier row.
+"""
+import base64
+import binascii
+import json
+
+from django.db.models import Q
+
+RATE_KEYSET = ('fee_schedule_id', 'procedure_code', 'modifier', 'region_id', 'id')
+# JSON types a cursor may carry for each RATE_KEYSET column, following the
+# model fields; modifier and region_id are nullable.
+RATE_KEYSET_TYPES = (int, str, (str, type(None)), (int, type(None)), int)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, types=RATE_KEYSET_TYPES):
+    """
+    The keyset values in ``cursor``. Raises InvalidCursor unless it holds one
+    value of the expected type per column.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor('Invalid cursor.')
+    if not isinstance(values, list) or len(values) != len(types):
+        raise InvalidCursor('Invalid cursor.')
+    for value, expected in zip(values, types):
+        # JSON true and false decode to bool, which is an int subclass.
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise InvalidCursor('Invalid cursor.')
+    return values
+
+
+def _after(field, value):
+    # SQLite sorts NULL before every other value in ascending order.
+    if value is None:
+        return Q(**{f'{field}__isnull': False})
+    return Q(**{f'{field}__gt': value})
+
+
+def _equal(field, value):
+    if value is None:
+        return Q(**{f'{field}__isnull': True})
+    return Q(**{field: value})
+
+
+def keyset_after(values, fields=RATE_KEYSET):
+    """
+    Q matching rows that sort after ``values`` in ``fields`` order.
+
+    Expands the tuple comparison column by column so NULL keys compare the
+    way ORDER BY sorts them.
+    """
+    condition = _after(fields[-1], values[-1])
+    for field, value in zip(reversed(fields[:-1]), reversed(values[:-1])):
+        condition = _after(field, value) | (_equal(field, value) & condition)
+    # Lets the planner seek to the first schedule instead of scanning from
+    # the start of the index.
+    return Q(**{f'{fields[0]}__gte': values[0]}) & condition
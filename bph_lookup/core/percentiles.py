@@ -0,0 +1,168 @@
+"""
+Commercial rate percentile summaries.
+
+``commercial_rate`` holds one row per provider, payer and ZIP, which is far
+too many to take percentiles over on request. ``build_percentiles()``
+summarises it once into ``commercial_rate_percentile``: the count and the
+10th, 25th, 50th, 75th and 90th percentile rate per (procedure code,
+modifier) in each 3-digit ZIP and each county. Lookups then read a handful
+of indexed rows.
+"""
+import numpy as np
+from django.db import connection
+
+PERCENTILES = (10, 25, 50, 75, 90)
+FETCH_ROWS = 100000
+
+# The table is created by migration 0005; build_percentiles() drops this
+# index while it refills the table.
+CREATE_INDEX_SQL = """
+    CREATE UNIQUE INDEX IF NOT EXISTS commercial_rate_percentile_lookup_idx
+    ON commercial_rate_percentile (procedure_code, modifier, geography_type, geography, state)
+"""
+
+# One query per geography level; each row is (group key parts..., rate).
+# Rates whose ZIP has no county are left out of the county summaries.
+GROUP_SQL = {
+    'zip3': """
+        SELECT procedure_code, COALESCE(modifier, ''), SUBSTR(zip_code, 1, 3), NULL,
+               CAST(rate AS REAL)
+        FROM commercial_rate
+        WHERE rate IS NOT NULL
+    """,
+    'county': """
+        SELECT cr.procedure_code, COALESCE(cr.modifier, ''), zce.county, zce.state,
+               CAST(cr.rate AS REAL)
+        FROM commercial_rate cr
+        JOIN zip_code_enriched zce ON zce.zip_code = SUBSTR(cr.zip_code, 1, 5)
+        WHERE cr.rate IS NOT NULL AND zce.county IS NOT NULL AND zce.county != ''
+    """,
+}
+
+INSERT_SQL = """
+    INSERT INTO commercial_rate_percentile
+        (procedure_code, modifier, geography_type, geography, state, rate_count,
+         p10, p25, p50, p75, p90, last_updated)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
+"""
+
+SUMMARY_COLUMNS = (
+    'procedure_code', 'modifier', 'geography_type', 'geography', 'state', 'rate_count',
+    'p10', 'p25', 'p50', 'p75', 'p90',
+)
+
+
+def group_percentiles(group_ids, values, percentiles=PERCENTILES):
+    """
+    Percentiles of ``values`` within each group, without a per-group loop.
+
+    ``group_ids`` are dense integers 0..n-1. Values are sorted once by
+    (group, value); each group's percentiles are then read off its slice by
+    linear interpolation between closest ranks, which is what
+    ``np.percentile`` does for a single group. Returns ``(counts, table)``
+    where ``table[g, i]`` is group ``g``'s ``percentiles[i]``.
+    """
+    order = np.lexsort((values, group_ids))
+    ordered = values[order]
+    counts = np.bincount(group_ids)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    fractions = np.asarray(percentiles, dtype=np.float64) / 100
+    positions = (counts - 1)[:, None] * fractions[None, :]
+    lower = np.floor(positions).astype(np.intp)
+    upper = np.minimum(lower + 1, (counts - 1)[:, None])
+    weight = positions - lower
+    low_values = ordered[starts[:, None] + lower]
+    high_values = ordered[starts[:, None] + upper]
+    return counts, low_values + (high_values - low_values) * weight
+
+
+def _grouped_rows(cursor, sql):
+    """
+    Read one level's rates into ``(keys, group_ids, rates)``.
+
+    ``keys`` are the distinct (procedure_code, modifier, geography, state)
+    tuples and ``group_ids`` index into them per rate.
+    """
+    cursor.execute(sql)
+    key_ids = {}
+    keys = []
+    group_ids = []
+    rates = []
+    while True:
+        rows = cursor.fetchmany(FETCH_ROWS)
+        if not rows:
+            break
+        for row in rows:
+            key = row[:4]
+            group_id = key_ids.get(key)
+            if group_id is None:
+                group_id = key_ids[key] = len(keys)
+                keys.append(key)
+            group_ids.append(group_id)
+        rates.extend(row[4] for row in rows)
+    return keys, np.array(group_ids, dtype=np.intp), np.array(rates, dtype=np.float64)
+
+
+def build_percentiles():
+    """
+    Rebuild ``commercial_rate_percentile`` from ``commercial_rate``.
+
+    Runs in the caller's transaction; returns the number of summary rows per
+    geography level.
+    """
+    built = {}
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM commercial_rate_percentile')
+        # Building the index once afterwards is cheaper than maintaining it
+        # through every insert.
+        cursor.execute('DROP INDEX IF EXISTS commercial_rate_percentile_lookup_idx')
+        for geography_type, sql in GROUP_SQL.items():
+            keys, group_ids, rates = _grouped_rows(cursor, sql)
+            if not keys:
+                built[geography_type] = 0
+                continue
+            counts, table = group_percentiles(group_ids, rates)
+            table = np.round(table, 2)
+            cursor.executemany(INSERT_SQL, [
+                (procedure_code, modifier, geography_type, geography, state, int(count), *values)
+                for (procedure_code, modifier, geography, state), count, values
+                in zip(keys, counts, table.tolist())
+            ])
+            built[geography_type] = len(keys)
+        cursor.execute(CREATE_INDEX_SQL)
+    return built
+
+
+def rate_percentiles(procedure_code, modifier='', zip_code=None, county=None, state=None):
+    """
+    Summary rows for one procedure code and modifier.
+
+    With ``zip_code``, returns its 3-digit ZIP's row and its county's row;
+    with ``county`` and ``state``, that county's row. Otherwise every
+    geography's rows. Returns a list of dicts.
+    """
+    geographies = []
+    with connection.cursor() as cursor:
+        if zip_code:
+            geographies.append(('zip3', zip_code[:3], None))
+            cursor.execute("SELECT county, state FROM zip_code_enriched WHERE zip_code = %s", [zip_code])
+            row = cursor.fetchone()
+            if row and row[0]:
+                geographies.append(('county', *row))
+        elif county:
+            geographies.append(('county', county, state))
+
+        sql = (
+            f"SELECT {', '.join(SUMMARY_COLUMNS)} FROM commercial_rate_percentile "
+            "WHERE procedure_code = %s AND modifier = %s"
+        )
+        params = [procedure_code, modifier or '']
+        if geographies:
+            # Full index keys, so each geography is a single index probe.
+            sql += ' AND (' + ' OR '.join(
+                '(geography_type = %s AND geography = %s AND state IS %s)' for _ in geographies
+            ) + ')'
+            params += [value for geography in geographies for value in geography]
+        cursor.execute(sql + ' ORDER BY geography_type DESC, state, geography', params)
+        return [dict(zip(SUMMARY_COLUMNS, row)) for row in cursor.fetchall()]
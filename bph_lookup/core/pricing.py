@@ -0,0 +1,455 @@
+"""
+In-memory Medicare physician fee schedule pricing.
+
+The CMS tables behind a Medicare lookup are small and only change when a new
+release is loaded, so they are read once per process and kept in indexed
+Python structures instead of being joined in SQL on every request.
+"""
+import threading
+from datetime import date
+
+import numpy as np
+from django.db import DatabaseError, connection, connections
+
+from .localities import get_zip_resolver, reset_zip_resolver
+from .versioning import get_data_version, invalidate_data_version
+
+PRICING_YEAR = 2025
+
+RESULT_COLUMNS = (
+    'zip_code', 'state_code', 'state_name', 'fee_schedule_area',
+    'locality_name', 'work_gpci', 'pe_gpci', 'mp_gpci',
+    'procedure_code', 'work_rvu', 'practice_expense_rvu', 'malpractice_rvu',
+    'conversion_factor', 'allowed_amount',
+)
+
+# Reference query the engine reproduces. Kept for verification against the
+# database; request handling goes through MedicarePricingEngine.
+RATE_LOOKUP_SQL = """
+    SELECT
+        mloc.zip_code, mloc.state_code, meta.state_name, meta.fee_schedule_area,
+        gpci.locality_name, gpci.work_gpci, gpci.pe_gpci, gpci.mp_gpci,
+        rvu.procedure_code, rvu.work_rvu, rvu.practice_expense_rvu, rvu.malpractice_rvu,
+        cf.conversion_factor,
+        ((COALESCE(rvu.work_rvu, 0) * COALESCE(gpci.work_gpci, 0) +
+          COALESCE(rvu.practice_expense_rvu, 0) * COALESCE(gpci.pe_gpci, 0) +
+          COALESCE(rvu.malpractice_rvu, 0) * COALESCE(gpci.mp_gpci, 0))
+         * COALESCE(cf.conversion_factor, 0)) AS allowed_amount
+    FROM medicare_locality_map mloc
+    JOIN medicare_locality_meta meta ON mloc.carrier_code = meta.mac_code AND mloc.locality_code = meta.locality_code
+    JOIN cms_gpci gpci ON TRIM(meta.fee_schedule_area) = TRIM(gpci.locality_name) AND mloc.locality_code = gpci.locality_code
+    JOIN cms_rvu rvu ON 1=1
+    JOIN cms_conversion_factor cf ON gpci.year = cf.year
+    WHERE mloc.zip_code = %s AND gpci.year = %s AND rvu.year = %s
+    AND rvu.procedure_code = %s AND (rvu.modifier IS NULL OR rvu.modifier = '')
+"""
+
+
+def lookup_rate_sql(zip_code, procedure_code, year=PRICING_YEAR):
+    """Price one line with RATE_LOOKUP_SQL. Returns a result dict or None."""
+    with connection.cursor() as cursor:
+        cursor.execute(RATE_LOOKUP_SQL, [zip_code, year, year, procedure_code])
+        columns = [col[0] for col in cursor.description]
+        row = cursor.fetchone()
+    return dict(zip(columns, row)) if row else None
+
+
+def medicare_rate_key(carrier_code, locality_code):
+    """
+    ``medicare_rate.locality_code`` value for a carrier/locality pair.
+
+    Locality codes repeat across Medicare carriers, so the materialized table
+    stores both, e.g. ``'01-18'``.
+    """
+    return f'{carrier_code}-{locality_code}'
+
+
+def lookup_materialized_rate(zip_code, procedure_code, modifier='', year=PRICING_YEAR):
+    """
+    Read one allowed amount from the materialized ``medicare_rate`` table.
+
+    The table is filled by ``manage.py build_medicare_rates``. Returns the
+    rate, or None when the ZIP or code has no row for ``year``.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT rate.rate
+            FROM medicare_locality_map mloc
+            JOIN medicare_rate rate
+              ON rate.locality_code = mloc.carrier_code || '-' || mloc.locality_code
+            WHERE mloc.zip_code = %s AND rate.procedure_code = %s AND rate.modifier = %s
+              AND rate.effective_date = %s
+        """, [zip_code, procedure_code, modifier or '', f'{year}-01-01'])
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _coalesce(value):
+    return 0 if value is None else value
+
+
+def _coalesced_array(rows):
+    """Build an (n, 3) float array from GPCI or RVU triples, NULL as 0."""
+    return np.array(
+        [[_coalesce(value) for value in row] for row in rows],
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+
+class MedicarePricingEngine:
+    """
+    Medicare allowed-amount calculator backed by preloaded CMS tables.
+
+    ZIP codes resolve through the shared ZipLocalityResolver to a locality
+    id; the engine keeps that locality's metadata and GPCI row for its year
+    at the same index. (procedure code, modifier) pairs resolve to their RVU
+    row. Pricing is then a couple of array and dict lookups and the
+    RVU x GPCI x CF formula, evaluated in the same order as the SQL so
+    results are identical.
+    """
+
+    def __init__(self, year=PRICING_YEAR, resolver=None):
+        self.year = year
+        self.resolver = resolver
+        self.data_version = None
+        self.conversion_factor = None
+        self.loaded = False
+        self._localities = []
+        self._rvu_ids = {}
+        self._rvus = []
+        self._priced_localities = np.zeros(0, dtype=bool)
+        self._gpci_array = _coalesced_array([])
+        self._rvu_array = _coalesced_array([])
+
+    def load(self):
+        """Read the locality, GPCI, RVU and conversion factor tables."""
+        resolver = self.resolver or get_zip_resolver()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT conversion_factor FROM cms_conversion_factor WHERE year = %s",
+                [self.year],
+            )
+            row = cursor.fetchone()
+            has_cf = row is not None
+            conversion_factor = row[0] if row else None
+
+            # GPCI rows keyed by (locality_code, trimmed locality_name); the
+            # first row in table order wins, as with fetchone() on the join.
+            cursor.execute("""
+                SELECT locality_code, TRIM(locality_name), locality_name,
+                       work_gpci, pe_gpci, mp_gpci
+                FROM cms_gpci
+                WHERE year = %s AND locality_name IS NOT NULL
+                ORDER BY rowid
+            """, [self.year])
+            gpcis = {}
+            for locality_code, trimmed_name, *gpci in cursor.fetchall():
+                gpcis.setdefault((locality_code, trimmed_name), tuple(gpci))
+
+            # Each (carrier, locality) takes the first metadata row that has
+            # a GPCI match.
+            cursor.execute("""
+                SELECT mac_code, locality_code, state_name, fee_schedule_area,
+                       TRIM(fee_schedule_area)
+                FROM medicare_locality_meta
+                ORDER BY rowid
+            """)
+            matched = {}
+            for mac_code, locality_code, state_name, area, trimmed_area in cursor.fetchall():
+                key = (mac_code, locality_code)
+                if key in matched:
+                    continue
+                gpci = gpcis.get((locality_code, trimmed_area))
+                if gpci is not None:
+                    matched[key] = (state_name, area) + gpci
+
+            # RVUs keyed by (procedure_code, modifier) with NULL and '' both
+            # treated as "no modifier".
+            cursor.execute("""
+                SELECT procedure_code, COALESCE(modifier, ''),
+                       work_rvu, practice_expense_rvu, malpractice_rvu
+                FROM cms_rvu
+                WHERE year = %s
+                ORDER BY rowid
+            """, [self.year])
+            rvu_ids = {}
+            rvus = []
+            for procedure_code, modifier, *rvu in cursor.fetchall():
+                key = (procedure_code, modifier)
+                if key not in rvu_ids:
+                    rvu_ids[key] = len(rvus)
+                    rvus.append(tuple(rvu))
+
+        if not has_cf:
+            rvu_ids, rvus = {}, []
+
+        # Locality slots are aligned with the resolver's locality ids.
+        localities = [matched.get(key) for key in resolver.localities]
+        self.resolver = resolver
+        self.conversion_factor = conversion_factor
+        self._localities = localities
+        self._priced_localities = np.array([loc is not None for loc in localities], dtype=bool)
+        self._gpci_array = _coalesced_array(
+            [loc[3:] if loc is not None else (0, 0, 0) for loc in localities]
+        )
+        self._rvu_ids = rvu_ids
+        self._rvus = rvus
+        self._rvu_array = _coalesced_array(rvus)
+        self.loaded = True
+        return self
+
+    def price(self, zip_code, procedure_code, modifier=''):
+        """
+        Price one ZIP/CPT pair, unmodified unless ``modifier`` is given.
+
+        Returns a dict with the same keys as RATE_LOOKUP_SQL, or None when the
+        ZIP, locality or procedure code has no match for the engine's year.
+        """
+        located = self.resolver.resolve(zip_code)
+        rvu_id = self._rvu_ids.get((procedure_code, modifier or ''))
+        if located is None or rvu_id is None:
+            return None
+        state_code, locality_id = located
+        locality = self._localities[locality_id]
+        if locality is None:
+            return None
+
+        state_name, area, locality_name, work_gpci, pe_gpci, mp_gpci = locality
+        work_rvu, pe_rvu, mp_rvu = self._rvus[rvu_id]
+        cf = self.conversion_factor
+        allowed_amount = (
+            (_coalesce(work_rvu) * _coalesce(work_gpci)
+             + _coalesce(pe_rvu) * _coalesce(pe_gpci)
+             + _coalesce(mp_rvu) * _coalesce(mp_gpci))
+            * _coalesce(cf)
+        )
+        return dict(zip(RESULT_COLUMNS, (
+            zip_code, state_code, state_name, area,
+            locality_name, work_gpci, pe_gpci, mp_gpci,
+            procedure_code, work_rvu, pe_rvu, mp_rvu,
+            cf, allowed_amount,
+        )))
+
+    def price_batch(self, lines):
+        """
+        Price many ``(zip_code, procedure_code, modifier)`` lines together.
+
+        ZIPs are resolved as one array operation and RVU slots through the
+        code index, then the allowed amounts are computed in one vectorized
+        pass over the GPCI and RVU arrays. Returns one ``line_result`` dict
+        per line, in order; lines that cannot be priced carry an ``error``
+        message instead of an ``allowed_amount``.
+        """
+        count = len(lines)
+        locality_ids, state_ids = self.resolver.resolve_many([line[0] for line in lines])
+        located = locality_ids >= 0
+        located[located] = self._priced_localities[locality_ids[located]]
+        rvu_ids = np.full(count, -1, dtype=np.intp)
+        states = self.resolver.states
+        results = []
+
+        for i, (zip_code, procedure_code, modifier) in enumerate(lines):
+            result = line_result(zip_code, procedure_code, modifier, self.year)
+            results.append(result)
+            if not located[i]:
+                result['error'] = 'ZIP code not found'
+                continue
+            rvu_id = self._rvu_ids.get((procedure_code, modifier or ''))
+            if rvu_id is None:
+                result['error'] = 'Procedure code not found'
+                continue
+            result['state_code'] = states[state_ids[i]]
+            rvu_ids[i] = rvu_id
+
+        priced = np.flatnonzero(rvu_ids >= 0)
+        if priced.size:
+            gpci = self._gpci_array[locality_ids[priced]]
+            rvu = self._rvu_array[rvu_ids[priced]]
+            amounts = (
+                rvu[:, 0] * gpci[:, 0] + rvu[:, 1] * gpci[:, 1] + rvu[:, 2] * gpci[:, 2]
+            ) * _coalesce(self.conversion_factor)
+            for i, amount in zip(priced.tolist(), amounts.tolist()):
+                results[i]['locality_name'] = self._localities[locality_ids[i]][2]
+                results[i]['conversion_factor'] = self.conversion_factor
+                results[i]['allowed_amount'] = amount
+
+        return results
+
+    def state_allowed_amounts(self, keys):
+        """
+        Statewide allowed amounts for ``(procedure_code, modifier)`` keys.
+
+        A state's amount is the mean over its ZIPs, which comes to the RVUs
+        priced with the ZIP-weighted mean GPCIs of its priced localities.
+        Those are computed once per state, then every key is priced against
+        every state in one matrix product. Returns a ``keys x
+        resolver.states`` array with NaN where the code or the state has no
+        Medicare price.
+        """
+        weights = self.resolver.locality_state_counts() * self._priced_localities[:, None]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            state_gpcis = (self._gpci_array.T @ weights) / weights.sum(axis=0)
+
+        rvu_ids = np.fromiter((self._rvu_ids.get(key, -1) for key in keys), dtype=np.intp, count=len(keys))
+        amounts = np.full((len(keys), len(self.resolver.states)), np.nan)
+        priced = rvu_ids >= 0
+        amounts[priced] = (self._rvu_array[rvu_ids[priced]] @ state_gpcis) * _coalesce(self.conversion_factor)
+        return amounts
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+_pricing_years = (None, ())
+
+
+def get_pricing_engine(year=PRICING_YEAR):
+    """
+    Return the process-wide engine for ``year``, loading it on first use.
+
+    Engines are rebuilt when the data version changes, and when the shared
+    ZIP resolver has been reloaded, since their locality slots are aligned
+    with its ids.
+    """
+    resolver = get_zip_resolver()
+    version = get_data_version()
+    engine = _engines.get(year)
+    if engine is None or engine.resolver is not resolver or engine.data_version != version:
+        with _engines_lock:
+            engine = _engines.get(year)
+            if engine is None or engine.resolver is not resolver or engine.data_version != version:
+                engine = MedicarePricingEngine(year, resolver).load()
+                engine.data_version = version
+                _engines[year] = engine
+    return engine
+
+
+def pricing_years():
+    """Years that have a conversion factor loaded, cached per data version."""
+    global _pricing_years
+    version = get_data_version()
+    if _pricing_years[0] != version:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT year FROM cms_conversion_factor ORDER BY year")
+            _pricing_years = (version, tuple(row[0] for row in cursor.fetchall()))
+    return _pricing_years[1]
+
+
+def pricing_year(date_of_service=None):
+    """
+    Fee schedule year for a date of service (a date or ISO string).
+
+    The physician fee schedule runs by calendar year; without a date the
+    current PRICING_YEAR applies. Raises ValueError for a malformed date.
+    """
+    if date_of_service is None or date_of_service == '':
+        return PRICING_YEAR
+    if isinstance(date_of_service, str):
+        date_of_service = date.fromisoformat(date_of_service)
+    if not isinstance(date_of_service, date):
+        raise ValueError(f'Invalid date of service: {date_of_service!r}')
+    return date_of_service.year
+
+
+def price_for_date(zip_code, procedure_code, date_of_service=None, modifier=''):
+    """
+    Price one line with the fee schedule in effect on ``date_of_service``.
+
+    Returns the engine's result dict, or None when the line cannot be priced
+    or no fee schedule is loaded for that year.
+    """
+    year = pricing_year(date_of_service)
+    if year not in pricing_years():
+        return None
+    return get_pricing_engine(year).price(zip_code, procedure_code, modifier)
+
+
+def price_claims(lines):
+    """
+    Price ``(zip_code, procedure_code, modifier, date_of_service)`` lines
+    that may span several years.
+
+    Lines are grouped by fee schedule year and each group is priced in one
+    ``price_batch`` call on that year's preloaded engine, so a mixed-year
+    batch costs about the same as a single-year one. Results are in input
+    order and carry the ``year`` used; lines with a bad date or a year
+    without a fee schedule get an ``error``.
+    """
+    results = [None] * len(lines)
+    by_year = {}
+    # Claim files repeat the same few dates of service many times.
+    years = {}
+    for i, line in enumerate(lines):
+        date_of_service = line[3]
+        try:
+            year = years[date_of_service]
+        except KeyError:
+            try:
+                year = years[date_of_service] = pricing_year(date_of_service)
+            except ValueError:
+                results[i] = line_result(*line[:3], error='Invalid date of service')
+                continue
+        except TypeError:  # unhashable
+            results[i] = line_result(*line[:3], error='Invalid date of service')
+            continue
+        by_year.setdefault(year, []).append(i)
+
+    loaded_years = pricing_years()
+    for year, indexes in by_year.items():
+        if year not in loaded_years:
+            for i in indexes:
+                results[i] = line_result(
+                    *lines[i][:3], year, error='No Medicare fee schedule for the date of service',
+                )
+            continue
+        priced = get_pricing_engine(year).price_batch([lines[i][:3] for i in indexes])
+        for i, result in zip(indexes, priced):
+            results[i] = result
+    return results
+
+
+def line_result(zip_code, procedure_code, modifier, year=None, error=None):
+    """
+    One batch-priced line. Every line has the same keys, priced or not;
+    ``price_batch`` fills in the locality and amount of the lines it prices.
+    """
+    return {
+        'zip_code': zip_code,
+        'procedure_code': procedure_code,
+        'modifier': modifier or '',
+        'year': year,
+        'state_code': None,
+        'locality_name': None,
+        'conversion_factor': None,
+        'allowed_amount': None,
+        'error': error,
+    }
+
+
+def load_pricing_engines():
+    """Load an engine for every year with a fee schedule (and PRICING_YEAR)."""
+    return [get_pricing_engine(year) for year in sorted({PRICING_YEAR, *pricing_years()})]
+
+
+def preload_pricing_tables():
+    """
+    Load the ZIP resolver and an engine for every loaded year at process start.
+
+    Database errors are left for the first lookup to report, and the
+    connection is closed so forked workers do not share it.
+    """
+    try:
+        load_pricing_engines()
+    except DatabaseError:
+        pass
+    finally:
+        connections.close_all()
+
+
+def reset_pricing_engines():
+    """Drop loaded engines and the ZIP resolver so the next lookup reads the tables again."""
+    global _pricing_years
+    with _engines_lock:
+        _engines.clear()
+        _pricing_years = (None, ())
+    reset_zip_resolver()
+    invalidate_data_version()
@@ -0,0 +1,227 @@
+"""
+Procedure code typeahead.
+
+``procedure_code`` holds a few tens of thousands of codes with short
+descriptions, so the search index lives in memory: a sorted list of codes
+and a sorted vocabulary of description words, each word pointing at the
+codes that use it. A prefix is a bisect into either list, so every query
+term is treated as a prefix and a query costs a few set operations.
+
+New codes are added to the loaded index without rereading the table. Edits
+and deletes bump ``procedure_code``'s ``data_release`` counter (see
+core.versioning), and a changed counter rebuilds the index.
+"""
+import bisect
+import heapq
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection
+
+TOKEN_RE = re.compile(r'[0-9a-z]+')
+
+SEARCH_COLUMNS = ('procedure_code', 'description', 'code_type')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def procedure_code_stamp():
+    """
+    ``(row count, highest rowid, edit counter)`` of ``procedure_code``; the
+    counter is its ``data_release`` version, 0 before any edit.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT COUNT(*), COALESCE(MAX(rowid), 0),
+                   COALESCE((SELECT version FROM data_release WHERE table_name = 'procedure_code'), 0)
+            FROM procedure_code
+        """)
+        return cursor.fetchone()
+
+
+class ProcedureSearchIndex:
+    """
+    In-memory prefix index over procedure codes and description words.
+
+    ``entries`` holds ``(procedure_code, description, code_type)`` rows.
+    ``_codes`` is the sorted list of ``(lowercased code, entry id)``;
+    ``_words`` the sorted description vocabulary, with ``_postings[word]``
+    the entry ids whose description contains it, and ``_first_words`` /
+    ``_first_postings`` the same for each description's first word.
+    ``_static_rank[entry id]`` orders entries by description length, then
+    code. Lists that searches bisect are replaced, not edited, so a search
+    running during an update sees either the old or the new list.
+    """
+
+    def __init__(self):
+        self.stamp = (0, 0, None)
+        self.entries = []
+        self._word_counts = []
+        self._static_rank = []
+        self._codes = []
+        self._words = []
+        self._postings = {}
+        self._first_words = []
+        self._first_postings = {}
+
+    def load(self):
+        """Read every procedure code into a new, empty index."""
+        return self.update()
+
+    def update(self):
+        """
+        Index the rows added since the last load or update.
+
+        Returns the index to use from now on: this one, or a freshly loaded
+        one when rows were edited or removed, which shows up as a new edit
+        counter or a row count that does not match the appended rows.
+        """
+        count, max_rowid, edits = procedure_code_stamp()
+        old_count, old_max, old_edits = self.stamp
+        if (count, max_rowid, edits) == self.stamp:
+            return self
+        if old_edits is not None and edits != old_edits:
+            return ProcedureSearchIndex().load()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {', '.join(SEARCH_COLUMNS)} FROM procedure_code WHERE rowid > %s ORDER BY rowid",
+                [old_max],
+            )
+            rows = cursor.fetchall()
+        if old_count + len(rows) != count:
+            return ProcedureSearchIndex().load()
+
+        first_id = len(self.entries)
+        words_per_row = [tokenize(row[1]) for row in rows]
+        # Entries and ranks first: searches only reach new ids through the
+        # postings and code list, which are updated last.
+        self.entries.extend(rows)
+        self._word_counts.extend(len(words) for words in words_per_row)
+        order = sorted(range(len(self.entries)), key=lambda i: (self._word_counts[i], self.entries[i][0]))
+        static_rank = [0] * len(order)
+        for rank, entry_id in enumerate(order):
+            static_rank[entry_id] = rank
+        self._static_rank = static_rank
+
+        new_words = set()
+        new_first_words = set()
+        for entry_id, words in enumerate(words_per_row, start=first_id):
+            for word in set(words):
+                if word not in self._postings:
+                    self._postings[word] = []
+                    new_words.add(word)
+                self._postings[word].append(entry_id)
+            if words:
+                if words[0] not in self._first_postings:
+                    self._first_postings[words[0]] = []
+                    new_first_words.add(words[0])
+                self._first_postings[words[0]].append(entry_id)
+        self._codes = sorted(self._codes + [
+            (row[0].lower(), entry_id) for entry_id, row in enumerate(rows, start=first_id)
+        ])
+        if new_words:
+            self._words = sorted(set(self._words) | new_words)
+        if new_first_words:
+            self._first_words = sorted(set(self._first_words) | new_first_words)
+        self.stamp = (count, max_rowid, edits)
+        return self
+
+    @staticmethod
+    def _prefixed(vocabulary, postings, term):
+        """Entry ids listed under any word in ``vocabulary`` starting with ``term``."""
+        start = bisect.bisect_left(vocabulary, term)
+        end = bisect.bisect_left(vocabulary, term + '\uffff', start)
+        matches = set()
+        for word in vocabulary[start:end]:
+            matches.update(postings[word])
+        return matches
+
+    def search(self, query, limit=10):
+        """
+        Codes matching ``query``, best first.
+
+        Every term must prefix either the code or a word of the description.
+        Codes the query prefixes come first (an exact code at the top), then
+        descriptions in tiers: every term a whole word and the first word
+        matching the first term; every term a whole word; the first word
+        matching; the rest. Within a tier shorter descriptions win, then
+        lower codes. Tiers are set operations and each is cut with a
+        precomputed rank, so short, broad queries stay fast.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        results = []
+        seen = set()
+        if len(terms) == 1:
+            codes = self._codes
+            start = bisect.bisect_left(codes, (terms[0],))
+            end = bisect.bisect_left(codes, (terms[0] + '\uffff',), start)
+            hits = codes[start:end]
+            hits.sort(key=lambda hit: hit[0] != terms[0])
+            results = [entry_id for _, entry_id in hits[:limit]]
+            seen = {entry_id for _, entry_id in hits}
+
+        matches = None
+        for term in terms:
+            term_matches = self._prefixed(self._words, self._postings, term)
+            matches = term_matches if matches is None else matches & term_matches
+            if not matches:
+                break
+        if matches and len(results) < limit:
+            matches -= seen
+            whole = set(matches)
+            for term in terms:
+                whole &= set(self._postings.get(term, ()))
+            first = self._prefixed(self._first_words, self._first_postings, terms[0]) & matches
+            for tier in (whole & first, whole - first, first - whole, matches - whole - first):
+                if len(results) >= limit:
+                    break
+                results += heapq.nsmallest(limit - len(results), tier, key=self._static_rank.__getitem__)
+        return [dict(zip(SEARCH_COLUMNS, self.entries[entry_id])) for entry_id in results]
+
+
+_index = None
+_checked_at = 0.0
+_index_lock = threading.Lock()
+
+
+def get_procedure_index():
+    """
+    Return the process-wide index, loading it on first use.
+
+    Every ``PROCEDURE_SEARCH_REFRESH_SECONDS`` the table's stamp is checked
+    and newly loaded codes are added.
+    """
+    global _index, _checked_at
+    interval = getattr(settings, 'PROCEDURE_SEARCH_REFRESH_SECONDS', 60)
+    index = _index
+    if index is not None and time.monotonic() - _checked_at < interval:
+        return index
+
+    with _index_lock:
+        if _index is None:
+            _index = ProcedureSearchIndex().load()
+            _checked_at = time.monotonic()
+        elif time.monotonic() - _checked_at >= interval:
+            _index = _index.update()
+            _checked_at = time.monotonic()
+        return _index
+
+
+def reset_procedure_index():
+    """Drop the loaded index so the next search reads the table again."""
+    global _index, _checked_at
+    with _index_lock:
+        _index = None
+        _checked_at = 0.0
+
+
+def search_procedures(query, limit=10):
+    """Best ``limit`` matches for a typeahead query, as dicts."""
+    return get_procedure_index().search(query, limit)
@@ -0,0 +1,35 @@
+"""
+JSON rendering for large API responses.
+
+orjson is used when it is installed; otherwise the standard library encoder
+is used with the same output.
+"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def dumps(data):
+    """Encode plain JSON data (dicts, lists, str, numbers, None) to bytes."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Renderer for responses that are already plain JSON types.
+
+    Skips DRF's encoder hooks, which only matter for Decimal, date and model
+    values that the fast serializer path has already converted.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return dumps(data)
@@ -2,11 +2,15 @@ from rest_framework import serializers
 from .models import FeeScheduleRate
 
 class FeeScheduleRateSerializer(serializers.ModelSerializer):
-    procedure_code = serializers.CharField(source='procedure_code.procedure_code')
-    description = serializers.CharField(source='procedure_code.description')
-    region = serializers.CharField(source='region.region_name', allow_null=True)
-    state = serializers.CharField(source='fee_schedule.state.state_code')
-    schedule_type = serializers.CharField(source='fee_schedule.schedule_type')
+    """
+    Fee schedule rate with its state, schedule type, code description and
+    region name, read from the annotations added by ``views._rates_queryset``.
+    """
+    procedure_code = serializers.CharField()
+    description = serializers.CharField(allow_null=True)
+    region = serializers.CharField(source='region_name', allow_null=True)
+    state = serializers.CharField(source='state_code', allow_null=True)
+    schedule_type = serializers.CharField(allow_null=True)
 
     class Meta:
         model = FeeScheduleRate
@@ -14,3 +18,38 @@ class FeeScheduleRateSerializer(serializers.ModelSerializer):
             'id', 'state', 'schedule_type', 'procedure_code', 'description',
             'modifier', 'region', 'rate', 'rate_unit'
         ]
+
+
+# Fast path for large result sets: rows are built straight from
+# values_list() tuples, skipping per-field serializer overhead. Produces the
+# same fields and formatting as FeeScheduleRateSerializer.
+RATE_FIELDS = (
+    'id', 'state', 'schedule_type', 'procedure_code', 'description',
+    'modifier', 'region', 'rate', 'rate_unit',
+)
+RATE_COLUMNS = (
+    'id', 'state_code', 'schedule_type', 'procedure_code', 'description',
+    'modifier', 'region_name', 'rate', 'rate_unit',
+)
+_RATE_INDEX = RATE_FIELDS.index('rate')
+
+
+def rate_rows(queryset, extra_columns=()):
+    """
+    Yield ``(row_dict, extra_values)`` for each rate in an annotated queryset.
+
+    ``extra_columns`` are fetched in the same query but kept out of the row,
+    e.g. the keyset columns needed to build a pagination cursor. Rows are
+    read from the database cursor in chunks, so memory stays flat.
+    """
+    width = len(RATE_COLUMNS)
+    for values in queryset.values_list(*RATE_COLUMNS, *extra_columns).iterator(chunk_size=2000):
+        row = list(values[:width])
+        if row[_RATE_INDEX] is not None:
+            row[_RATE_INDEX] = str(row[_RATE_INDEX])
+        yield dict(zip(RATE_FIELDS, row)), values[width:]
+
+
+def serialize_rates(queryset):
+    """List of rate dicts for an annotated queryset, without extra columns."""
+    return [row for row, _ in rate_rows(queryset)]
@@ -0,0 +1,255 @@
+"""
+Radius searches over ZIP code coordinates.
+
+``zip_code_enriched`` gives each ZIP a latitude and longitude. ZipGrid holds
+them in memory, sorted into cells of ``GRID_CELL_DEGREES`` on a side, so a
+"within N miles of ZIP X" search reads only the cells its bounding box
+overlaps and computes great-circle distances for those few hundred ZIPs
+with NumPy, instead of evaluating haversine over the whole table in SQL.
+The nearby ZIPs then drive indexed lookups of commercial rates and Medicare
+localities.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError, connection, connections
+
+from .pricing import PRICING_YEAR, get_pricing_engine
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = EARTH_RADIUS_MILES * math.pi / 180
+GRID_CELL_DEGREES = 0.5
+# Cell keys are row * CELL_KEY_STRIDE + column; columns span -360..360.
+CELL_KEY_STRIDE = 1000
+# SQLite's default limit on host parameters is 999 before 3.32.
+ZIP_QUERY_BATCH = 900
+
+
+def haversine_miles(lat, lon, lats, lons):
+    """Great-circle distance in miles from one point to arrays of points (degrees)."""
+    lat, lon, lats, lons = map(np.radians, (lat, lon, lats, lons))
+    a = (np.sin((lats - lat) / 2) ** 2
+         + np.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class ZipGrid:
+    """
+    Grid-bucketed ZIP coordinates.
+
+    ZIPs are stored sorted by cell, and ``_cells`` maps each cell key to its
+    ``(start, end)`` slice of the arrays.
+    """
+
+    def __init__(self):
+        self.stamp = None
+        self.zip_codes = np.zeros(0, dtype='U5')
+        self._lats = np.zeros(0)
+        self._lons = np.zeros(0)
+        self._positions = {}
+        self._cells = {}
+
+    def load(self):
+        """Read every ZIP with coordinates from ``zip_code_enriched``."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT zip_code, latitude, longitude FROM zip_code_enriched "
+                "WHERE latitude IS NOT NULL AND longitude IS NOT NULL"
+            )
+            rows = cursor.fetchall()
+        zip_codes = np.array([row[0] for row in rows], dtype='U5')
+        lats = np.array([row[1] for row in rows], dtype=np.float64)
+        lons = np.array([row[2] for row in rows], dtype=np.float64)
+
+        keys = self._cell_keys(lats, lons)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        cell_keys, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+
+        self.stamp = zip_grid_stamp()
+        self.zip_codes = zip_codes[order]
+        self._lats = lats[order]
+        self._lons = lons[order]
+        self._positions = {zip_code: i for i, zip_code in enumerate(self.zip_codes.tolist())}
+        self._cells = {
+            int(key): (int(start), int(start + count))
+            for key, start, count in zip(cell_keys, starts, counts)
+        }
+        return self
+
+    @staticmethod
+    def _cell_keys(lats, lons):
+        rows = np.floor(np.asarray(lats) / GRID_CELL_DEGREES).astype(np.int64)
+        cols = np.floor(np.asarray(lons) / GRID_CELL_DEGREES).astype(np.int64)
+        return rows * CELL_KEY_STRIDE + cols
+
+    def location(self, zip_code):
+        """``(latitude, longitude)`` of a ZIP, or None if it has no coordinates."""
+        i = self._positions.get(zip_code)
+        if i is None:
+            return None
+        return float(self._lats[i]), float(self._lons[i])
+
+    def within(self, lat, lon, miles):
+        """
+        ZIPs within ``miles`` of a point.
+
+        Returns ``(zip_codes, distances)`` arrays, nearest first. The search
+        box does not wrap at the antimeridian.
+        """
+        dlat = miles / MILES_PER_DEGREE
+        # Widen the longitude span for the box edge nearest the pole.
+        widest = min(abs(lat) + dlat, 89.0)
+        dlon = min(dlat / math.cos(math.radians(widest)), 180.0)
+        row_range = range(
+            math.floor((lat - dlat) / GRID_CELL_DEGREES), math.floor((lat + dlat) / GRID_CELL_DEGREES) + 1
+        )
+        col_range = range(
+            math.floor((lon - dlon) / GRID_CELL_DEGREES), math.floor((lon + dlon) / GRID_CELL_DEGREES) + 1
+        )
+        slices = [
+            self._cells[key]
+            for row in row_range for col in col_range
+            if (key := row * CELL_KEY_STRIDE + col) in self._cells
+        ]
+        if not slices:
+            return self.zip_codes[:0], np.zeros(0)
+
+        candidates = np.concatenate([np.arange(start, end) for start, end in slices])
+        distances = haversine_miles(lat, lon, self._lats[candidates], self._lons[candidates])
+        inside = distances <= miles
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return self.zip_codes[candidates[order]], distances[order]
+
+    def around_zip(self, zip_code, miles):
+        """Like ``within`` around a ZIP's coordinates; None when the ZIP has none."""
+        location = self.location(zip_code)
+        if location is None:
+            return None
+        return self.within(*location, miles)
+
+
+def zip_grid_stamp():
+    """Cheap change marker for ``zip_code_enriched``."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT COUNT(*), MAX(rowid) FROM zip_code_enriched")
+        return cursor.fetchone()
+
+
+_grid = None
+_checked_at = 0.0
+_grid_lock = threading.Lock()
+
+
+def get_zip_grid():
+    """
+    Return the process-wide grid, loading it on first use.
+
+    Every ``ZIP_GRID_REFRESH_SECONDS`` the table's stamp is compared with the
+    loaded one and the grid is rebuilt when ZIPs were added or replaced.
+    """
+    global _grid, _checked_at
+    interval = getattr(settings, 'ZIP_GRID_REFRESH_SECONDS', 300)
+    grid = _grid
+    if grid is not None and time.monotonic() - _checked_at < interval:
+        return grid
+
+    with _grid_lock:
+        if _grid is None or time.monotonic() - _checked_at >= interval:
+            if _grid is None or zip_grid_stamp() != _grid.stamp:
+                _grid = ZipGrid().load()
+            _checked_at = time.monotonic()
+        return _grid
+
+
+def reset_zip_grid():
+    """Drop the loaded grid so the next search reads the table again."""
+    global _grid, _checked_at
+    with _grid_lock:
+        _grid = None
+        _checked_at = 0.0
+
+
+def preload_zip_grid():
+    """Load the grid at process start; errors are left for the first search."""
+    try:
+        get_zip_grid()
+    except DatabaseError:
+        pass
+    finally:
+        connections.close_all()
+
+
+def nearby_commercial_rates(zip_code, miles, procedure_code, modifier=None, limit=500):
+    """
+    Commercial rates for a procedure code within ``miles`` of a ZIP.
+
+    ``modifier`` None matches any modifier, and ZIP+4 rows match on their
+    first five digits. Returns rows as dicts with a ``distance_miles``,
+    nearest first, or None when the ZIP has no coordinates.
+    """
+    found = get_zip_grid().around_zip(zip_code, miles)
+    if found is None:
+        return None
+    zip_codes, distances = found
+    distance_by_zip = dict(zip(zip_codes.tolist(), distances.tolist()))
+    columns = ('procedure_code', 'modifier', 'zip_code', 'provider', 'payer', 'rate', 'effective_date')
+    rows = []
+    with connection.cursor() as cursor:
+        zip_list = list(distance_by_zip)
+        for start in range(0, len(zip_list), ZIP_QUERY_BATCH):
+            batch = zip_list[start:start + ZIP_QUERY_BATCH]
+            sql = (
+                f"SELECT {', '.join(columns)} FROM commercial_rate "
+                f"WHERE procedure_code = %s AND SUBSTR(zip_code, 1, 5) IN ({', '.join(['%s'] * len(batch))})"
+            )
+            params = [procedure_code, *batch]
+            if modifier is not None:
+                sql += " AND COALESCE(modifier, '') = %s"
+                params.append(modifier)
+            cursor.execute(sql, params)
+            rows.extend(cursor.fetchall())
+
+    results = [dict(zip(columns, row), distance_miles=round(distance_by_zip[row[2][:5]], 2)) for row in rows]
+    results.sort(key=lambda row: (row['distance_miles'], row['zip_code']))
+    return results[:limit]
+
+
+def nearby_medicare_localities(zip_code, miles, procedure_code=None, modifier='', year=PRICING_YEAR):
+    """
+    Medicare localities with a ZIP within ``miles`` of a ZIP.
+
+    Each locality is listed once, with its nearest ZIP and distance and, when
+    ``procedure_code`` is given, that ZIP's allowed amount. Nearest first;
+    None when the ZIP has no coordinates.
+    """
+    found = get_zip_grid().around_zip(zip_code, miles)
+    if found is None:
+        return None
+    zip_codes, distances = found
+    engine = get_pricing_engine(year)
+    locality_ids, _ = engine.resolver.resolve_many(zip_codes.tolist())
+    mapped = locality_ids >= 0
+    # Distances are sorted, so each locality's first index is its nearest ZIP.
+    unique_ids, first = np.unique(locality_ids[mapped], return_index=True)
+    nearest = np.flatnonzero(mapped)[first]
+
+    results = []
+    for locality_id, i in sorted(zip(unique_ids.tolist(), nearest.tolist()), key=lambda pair: pair[1]):
+        carrier_code, locality_code = engine.resolver.localities[locality_id]
+        result = {
+            'carrier_code': carrier_code,
+            'locality_code': locality_code,
+            'nearest_zip_code': str(zip_codes[i]),
+            'distance_miles': round(float(distances[i]), 2),
+        }
+        if procedure_code:
+            priced = engine.price(result['nearest_zip_code'], procedure_code, modifier)
+            result['fee_schedule_area'] = priced['fee_schedule_area'] if priced else None
+            result['allowed_amount'] = priced['allowed_amount'] if priced else None
+        results.append(result)
+    return results
@@ -1,6 +1,48 @@
+import csv
+import io
+import json
+import os
+import tempfile
+import zipfile
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from asgiref.sync import sync_to_async
+from django.core.management.base import CommandError
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase
 from django.urls import reverse
 from rest_framework.test import APITestCase
-from .models import State, Region, ProcedureCode, FeeSchedule, FeeScheduleRate
+from .models import (
+    State, Region, ProcedureCode, FeeSchedule, FeeScheduleRate,
+    MedicareLocalityMap, MedicareLocalityMeta, CmsGpci, CmsRvu, CmsConversionFactor,
+)
+from .benchmarking import RateArrays, benchmark_states, percent_of_medicare
+from .catalog import get_fee_schedule_states, invalidate_state_catalog, state_catalog_key
+from .comparison import COMPARISON_SQL, compare_states
+from .db import is_read_only
+from .forms import WorkersCompRateLookupForm
+from .localities import ZipLocalityResolver, get_zip_resolver
+from .management.commands.check_db import analyzed_row_counts, statistics_status, unindexed_columns
+from .management.commands.check_query_plans import full_table_scans, table_aliases
+from .management.commands.generate_dataset import CREATE_EXTRA_TABLES_SQL
+from .management.commands.load_cms import RVU_VALUES_SQL, diff_years
+from .pagination import RATE_KEYSET, encode_cursor
+from .percentiles import PERCENTILES, group_percentiles, rate_percentiles
+from .pricing import (
+    PRICING_YEAR, RATE_LOOKUP_SQL, MedicarePricingEngine, _engines, get_pricing_engine,
+    lookup_materialized_rate, lookup_rate_sql, price_claims, price_for_date, reset_pricing_engines,
+)
+from .procedure_search import get_procedure_index, reset_procedure_index, search_procedures
+from .serializers import FeeScheduleRateSerializer, serialize_rates
+from .spatial import get_zip_grid, haversine_miles, reset_zip_grid
+from .versioning import compute_data_version, invalidate_data_version, record_data_version
+from .views import _rates_queryset, workers_comp_rates
 
 class RateLookupAPITest(APITestCase):
     def setUp(self):
@@ -85,3 +127,840 @@ class WorkersCompLookupViewTest(APITestCase):
         })
         self.assertEqual(response.status_code, 200)
 
+
+class MedicareDataMixin:
+    def setUp(self):
+        MedicareLocalityMap.objects.create(
+            zip_code="90210", state_code="CA", carrier_code="01",
+            locality_code="18", year_qtr="20251",
+        )
+        MedicareLocalityMeta.objects.create(
+            mac_code="01", locality_code="18", state_name="California",
+            fee_schedule_area=" LOS ANGELES ",
+        )
+        CmsGpci.objects.create(
+            locality_code="18", year=2025, locality_name="LOS ANGELES",
+            work_gpci="1.0370", pe_gpci="1.1910", mp_gpci="0.7620",
+        )
+        CmsRvu.objects.create(
+            procedure_code="99213", modifier="", year=2025,
+            work_rvu="1.30", practice_expense_rvu="1.21", malpractice_rvu="0.09",
+        )
+        CmsRvu.objects.create(
+            procedure_code="99213", modifier="26", year=2025,
+            work_rvu="9.99", practice_expense_rvu="9.99", malpractice_rvu="9.99",
+        )
+        CmsConversionFactor.objects.create(
+            year=2025, conversion_factor="32.35", effective_date="2025-01-01",
+        )
+        reset_pricing_engines()
+
+    def tearDown(self):
+        reset_pricing_engines()
+
+
+class MedicarePricingEngineTest(MedicareDataMixin, TestCase):
+    def test_matches_sql_lookup(self):
+        engine = MedicarePricingEngine().load()
+        expected = lookup_rate_sql("90210", "99213")
+        self.assertIsNotNone(expected)
+        self.assertEqual(engine.price("90210", "99213"), expected)
+
+    def test_unknown_zip_or_code(self):
+        engine = MedicarePricingEngine().load()
+        self.assertIsNone(engine.price("00000", "99213"))
+        self.assertIsNone(engine.price("90210", "00000"))
+
+    def test_rate_lookup_view_uses_engine(self):
+        response = self.client.post(reverse('rate_lookup'), {
+            'zip_code': '90210',
+            'procedure_code': '99213',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['result'], lookup_rate_sql("90210", "99213")
+        )
+
+    def test_batch_api_prices_lines_independently(self):
+        response = self.client.post(reverse('medicare_batch_api'), {
+            'lines': [
+                {'zip_code': '90210', 'procedure_code': '99213'},
+                {'zip_code': '00000', 'procedure_code': '99213'},
+                {'zip_code': '90210', 'procedure_code': '99213', 'modifier': '26'},
+                {'zip_code': 'abc', 'procedure_code': '99213'},
+                {'zip_code': '90210', 'procedure_code': '9921'},
+                {'zip_code': '90210', 'procedure_code': '99213; DROP'},
+                'not a line',
+            ],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(len(results), 7)
+        self.assertAlmostEqual(
+            results[0]['allowed_amount'],
+            lookup_rate_sql("90210", "99213")['allowed_amount'],
+        )
+        self.assertIsNone(results[0]['error'])
+        self.assertEqual(results[1]['error'], 'ZIP code not found')
+        self.assertIsNone(results[2]['error'])
+        self.assertGreater(results[2]['allowed_amount'], results[0]['allowed_amount'])
+        self.assertIn('5 digits', results[3]['error'])
+        self.assertEqual(results[4]['error'], 'CPT code must be exactly 5 digits')
+        self.assertEqual(results[5]['error'], 'CPT code must be exactly 5 digits')
+        self.assertEqual(results[6]['error'], 'Line must be an object.')
+        self.assertEqual({frozenset(result) for result in results}, {frozenset(results[0])})
+        self.assertEqual(results[0]['year'], PRICING_YEAR)
+        self.assertEqual([result['year'] for result in results[3:]], [None] * 4)
+
+    def test_batch_api_prices_only_valid_lines(self):
+        with patch('core.views.price_claims', wraps=price_claims) as priced:
+            self.client.post(reverse('medicare_batch_api'), {
+                'lines': [
+                    {'zip_code': 'abc', 'procedure_code': '99213'},
+                    {'zip_code': '90210', 'procedure_code': '99213'},
+                ],
+            }, content_type='application/json')
+        priced.assert_called_once_with([('90210', '99213', '', None)])
+
+
+class DateOfServicePricingTest(MedicareDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        CmsGpci.objects.create(
+            locality_code="18", year=2024, locality_name="LOS ANGELES",
+            work_gpci="1.0000", pe_gpci="1.0000", mp_gpci="1.0000",
+        )
+        CmsRvu.objects.create(
+            procedure_code="99213", modifier="", year=2024,
+            work_rvu="1.00", practice_expense_rvu="1.00", malpractice_rvu="0.10",
+        )
+        CmsConversionFactor.objects.create(
+            year=2024, conversion_factor="33.29", effective_date="2024-01-01",
+        )
+        reset_pricing_engines()
+
+    def test_mixed_year_batch(self):
+        results = price_claims([
+            ("90210", "99213", "", "2024-06-30"),
+            ("90210", "99213", "", "2025-01-02"),
+            ("90210", "99213", "", None),
+            ("90210", "99213", "", "2019-03-01"),
+            ("90210", "99213", "", "06/30/2024"),
+        ])
+        self.assertAlmostEqual(results[0]['allowed_amount'], 2.1 * 33.29)
+        self.assertEqual(results[0]['year'], 2024)
+        self.assertAlmostEqual(
+            results[1]['allowed_amount'], lookup_rate_sql("90210", "99213", 2025)['allowed_amount'],
+        )
+        self.assertEqual(results[2]['year'], PRICING_YEAR)
+        self.assertEqual(results[3]['error'], 'No Medicare fee schedule for the date of service')
+        self.assertEqual(results[4]['error'], 'Invalid date of service')
+        self.assertEqual(sorted(_engines), [2024, 2025])
+
+    def test_view_prices_by_date_of_service(self):
+        response = self.client.post(reverse('rate_lookup'), {
+            'zip_code': '90210', 'procedure_code': '99213', 'date_of_service': '2024-06-30',
+        })
+        self.assertEqual(response.context['result'], lookup_rate_sql("90210", "99213", 2024))
+        self.assertContains(response, '2024 Conversion Factor')
+
+
+class RepriceCommandTest(MedicareDataMixin, TestCase):
+    def test_reprice_csv_with_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'claims.csv')
+            output = os.path.join(tmp, 'priced.csv')
+            checkpoint = os.path.join(tmp, 'claims.checkpoint')
+            with open(source, 'w', newline='') as f:
+                f.write('claim_id,zip_code,procedure_code\n1,90210,99213\n2,00000,99213\n3,90210,99213\n')
+
+            call_command('reprice', source, output=output, checkpoint=checkpoint,
+                         workers=1, chunk_size=2, stderr=io.StringIO())
+            with open(checkpoint) as f:
+                self.assertEqual(f.read(), '3')
+            with open(output, newline='') as f:
+                rows = list(csv.DictReader(f))
+            self.assertEqual([row['claim_id'] for row in rows], ['1', '2', '3'])
+            self.assertEqual(rows[1]['medicare_error'], 'ZIP code not found')
+            self.assertAlmostEqual(
+                float(rows[0]['medicare_allowed_amount']),
+                lookup_rate_sql('90210', '99213')['allowed_amount'],
+            )
+
+            # A completed checkpoint makes a rerun a no-op.
+            call_command('reprice', source, output=output, checkpoint=checkpoint,
+                         workers=1, stderr=io.StringIO())
+            with open(output, newline='') as f:
+                self.assertEqual(len(list(csv.DictReader(f))), 3)
+
+
+class QueryPlanTest(TestCase):
+    def test_medicare_lookup_uses_indexes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'EXPLAIN QUERY PLAN {RATE_LOOKUP_SQL}', ['90210', 2025, 2025, '99213']
+            )
+            plan = cursor.fetchall()
+        self.assertEqual(full_table_scans(plan), [])
+        self.assertEqual(full_table_scans([(0, 0, 0, 'SCAN fee_schedule_rate')]), ['fee_schedule_rate'])
+        self.assertEqual(full_table_scans([
+            (0, 0, 0, 'SCAN fs USING COVERING INDEX fee_schedule_state_idx'),
+            (0, 0, 0, 'SCAN r USING INDEX fee_schedule_rate_code_idx'),
+            (0, 0, 0, 'SCAN CONSTANT ROW'),
+            (0, 0, 0, 'MATERIALIZE sub'),
+            (0, 0, 0, 'SCAN sub'),
+        ]), ['fs', 'r'])
+        aliases = table_aliases(RATE_LOOKUP_SQL)
+        self.assertEqual(aliases['cf'], 'cms_conversion_factor')
+        self.assertNotIn('ON', aliases)
+        self.assertEqual(table_aliases('SELECT U0."id" FROM "fee_schedule" U0')['U0'], 'fee_schedule')
+
+    def test_check_plans_runtime_queries(self):
+        call_command('generate_dataset', procedures=40, zip_codes=300, regional_states=2,
+                     regions=3, commercial_rates=50, stdout=io.StringIO())
+        reset_zip_grid()
+        self.addCleanup(reset_zip_grid)
+        out = io.StringIO()
+        call_command('check_query_plans', stdout=out)
+        for label in ('rate_lookup_api keyset page', 'commercial_percentiles_api', 'nearby_api commercial rates'):
+            self.assertIn(label, out.getvalue())
+        self.assertNotIn('Sent no queries', out.getvalue())
+
+
+class CheckDbTest(MedicareDataMixin, TestCase):
+    def test_health_report(self):
+        self.assertEqual(statistics_status(None, 0), 'ok')
+        self.assertEqual(statistics_status(None, 10), 'missing')
+        self.assertEqual(statistics_status(100, 105), 'ok')
+        self.assertEqual(statistics_status(100, 200), 'possibly stale')
+        self.assertEqual(statistics_status(100, 50), 'stale')
+        # A recorded ANALYZE time overrides the rowid range either way.
+        self.assertEqual(statistics_status(100, 200, '2026-01-01 00:00:00', '2026-01-02 00:00:00'), 'ok')
+        self.assertEqual(statistics_status(100, 100, '2026-01-03 00:00:00', '2026-01-02 00:00:00'), 'stale')
+
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            self.assertEqual(analyzed_row_counts(cursor)['cms_rvu'], CmsRvu.objects.count())
+            unindexed = unindexed_columns(cursor, ['fee_schedule_rate', 'region', 'state'])
+        # region_id is the primary key of region and state_code of state.
+        self.assertEqual(unindexed, [('fee_schedule_rate', 'region_id')])
+
+        out = io.StringIO()
+        call_command('check_db', stdout=out)
+        self.assertIn('fee_schedule_rate.region_id', out.getvalue())
+        self.assertIn('Database check completed', out.getvalue())
+
+    def test_stale_after_recorded_analyze(self):
+        # Leave a wide rowid gap, which alone must not make the statistics stale.
+        CmsRvu.objects.create(
+            id=CmsRvu.objects.latest('id').id + 1000, procedure_code="99214", modifier="", year=2025,
+            work_rvu="1.92", practice_expense_rvu="1.52", malpractice_rvu="0.13",
+        )
+        record_data_version(['cms_rvu'])
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE data_release SET updated_at = '2000-01-01 00:00:00'")
+        call_command('check_db', analyze=True, stdout=io.StringIO())
+
+        out = io.StringIO()
+        call_command('check_db', stdout=out)
+        self.assertNotRegex(out.getvalue(), r'cms_rvu .* stale statistics')
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE data_release SET updated_at = '2000-01-01 00:00:00' WHERE table_name = 'sqlite_stat1'"
+            )
+        CmsRvu.objects.filter(procedure_code='99213').update(work_rvu='2.00')
+        record_data_version(['cms_rvu'])
+        out = io.StringIO()
+        call_command('check_db', stdout=out)
+        self.assertRegex(out.getvalue(), r'cms_rvu .* stale statistics')
+
+class BuildMedicareRatesTest(MedicareDataMixin, TestCase):
+    def test_lookup_before_first_build(self):
+        self.assertIsNone(lookup_materialized_rate('90210', '99213'))
+
+    def test_build_and_incremental_refresh(self):
+        call_command('build_medicare_rates', stdout=io.StringIO())
+        expected = lookup_rate_sql('90210', '99213')['allowed_amount']
+        self.assertAlmostEqual(lookup_materialized_rate('90210', '99213'), expected)
+        self.assertIsNotNone(lookup_materialized_rate('90210', '99213', '26'))
+
+        CmsRvu.objects.filter(procedure_code='99213', modifier='').update(work_rvu='2.00')
+        call_command('build_medicare_rates', procedure_code='99213', modifier='', stdout=io.StringIO())
+        self.assertAlmostEqual(
+            lookup_materialized_rate('90210', '99213'),
+            lookup_rate_sql('90210', '99213')['allowed_amount'],
+        )
+        self.assertNotAlmostEqual(lookup_materialized_rate('90210', '99213'), expected)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM medicare_rate')
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+
+class ZipLocalityResolverTest(MedicareDataMixin, TestCase):
+    def test_resolves_by_integer_zip(self):
+        MedicareLocalityMap.objects.create(
+            zip_code="01001", state_code="MA", carrier_code="02",
+            locality_code="01", year_qtr="20251",
+        )
+        resolver = ZipLocalityResolver().load()
+        self.assertEqual(resolver.resolve("01001"), ("MA", resolver.localities.index(("02", "01"))))
+        self.assertIsNone(resolver.resolve("1001"))
+        self.assertIsNone(resolver.resolve("99999"))
+        locality_ids, _ = resolver.resolve_many(["90210", "abcde", "01001"])
+        self.assertEqual(locality_ids[1], -1)
+        self.assertNotEqual(locality_ids[0], locality_ids[2])
+
+    def test_rebuilds_when_data_version_changes(self):
+        first = get_zip_resolver()
+        self.assertIs(get_zip_resolver(), first)
+        # Remapped in place, same year_qtr: only the data version tells.
+        MedicareLocalityMap.objects.filter(zip_code="90210").update(locality_code="99")
+        record_data_version(['medicare_locality_map'])
+        second = get_zip_resolver()
+        self.assertIsNot(second, first)
+        self.assertEqual(second.localities[second.resolve("90210")[1]], ("01", "99"))
+        self.assertIs(get_pricing_engine().resolver, second)
+
+
+class DataVersionTest(MedicareDataMixin, TestCase):
+    def test_writes_move_the_version(self):
+        version = compute_data_version()
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE cms_gpci SET work_gpci = 1.1 WHERE locality_code = '18'")
+        updated = compute_data_version()
+        self.assertNotEqual(updated, version)
+
+        # The bulk-loaded tables have no triggers: a reload moves the version
+        # through record_data_version(), once.
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM medicare_locality_map")
+            cursor.execute(
+                "INSERT INTO medicare_locality_map (zip_code, state_code, carrier_code, locality_code, year_qtr) "
+                "VALUES ('90210', 'CA', '01', '18', '20251')"
+            )
+            cursor.execute("UPDATE cms_rvu SET work_rvu = 2.00 WHERE procedure_code = '99213'")
+            cursor.execute("SELECT table_name FROM data_release")
+            self.assertEqual([row[0] for row in cursor.fetchall()], ['cms_gpci'])
+        reloaded = record_data_version(['medicare_locality_map', 'cms_rvu'])
+        self.assertNotEqual(reloaded, updated)
+        self.assertEqual(compute_data_version(), record_data_version([]))
+
+
+class StateCatalogTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_data_version()
+
+    def test_form_uses_cached_states(self):
+        cache.set(state_catalog_key(), ["CA", "NY"])
+        with self.assertNumQueries(0):
+            form = WorkersCompRateLookupForm()
+        self.assertEqual(form.fields['state'].choices, [("CA", "CA"), ("NY", "NY")])
+        response = self.client.get(reverse('states_api'))
+        self.assertEqual(response.json(), ["CA", "NY"])
+
+    def test_cold_cache_lists_states_with_rates(self):
+        with_rates = FeeSchedule.objects.create(
+            state_code="CA", schedule_type="Physician", effective_date="2025-01-01",
+        )
+        FeeSchedule.objects.create(
+            state_code="NY", schedule_type="Physician", effective_date="2025-01-01",
+        )
+        FeeScheduleRate.objects.create(
+            fee_schedule_id=with_rates.id, procedure_code="99213", rate=100, effective_date="2025-01-01",
+        )
+        self.assertEqual(get_fee_schedule_states(), ["CA"])
+
+    def test_fee_schedule_change_invalidates(self):
+        key = state_catalog_key()
+        cache.set(key, ["CA"])
+        FeeSchedule.objects.create(
+            state_code="NY", schedule_type="Physician", effective_date="2025-01-01",
+        )
+        with self.assertNumQueries(0):
+            invalidate_state_catalog()
+        self.assertNotEqual(state_catalog_key(), key)
+
+    def test_conditional_get_returns_304(self):
+        cache.set(state_catalog_key(), ["CA"])
+        response = self.client.get(reverse('states_api'))
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('states_api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        FeeSchedule.objects.create(
+            state_code="NY", schedule_type="Physician", effective_date="2025-01-01",
+        )
+        invalidate_state_catalog()
+        cache.set(state_catalog_key(), ["CA", "NY"])
+        response = self.client.get(reverse('states_api'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class RatesApiPaginationTest(APITestCase):
+    def setUp(self):
+        ProcedureCode.objects.create(procedure_code="99213", description="Office visit", code_type="CPT")
+        schedule = FeeSchedule.objects.create(
+            state_code="CA", schedule_type="Physician", effective_date="2025-01-01",
+        )
+        other = FeeSchedule.objects.create(
+            state_code="NY", schedule_type="Physician", effective_date="2025-01-01",
+        )
+        for fee_schedule_id, modifier, region_id in [
+            (schedule.id, None, None), (schedule.id, None, 2), (schedule.id, "26", None),
+            (schedule.id, "TC", 1), (other.id, None, None),
+        ]:
+            FeeScheduleRate.objects.create(
+                fee_schedule_id=fee_schedule_id, procedure_code="99213", modifier=modifier,
+                region_id=region_id, rate=100, effective_date="2025-01-01",
+            )
+
+    def test_pages_follow_link_header(self):
+        url = reverse('rate_lookup_api') + '?procedure_code=99213&page_size=2'
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data), 2)
+            ids.extend(row['id'] for row in response.data)
+            link = response.get('Link')
+            url = link[1:link.index('>')] if link else None
+        self.assertEqual(ids, list(
+            FeeScheduleRate.objects.order_by(*RATE_KEYSET).values_list('id', flat=True)
+        ))
+        self.assertEqual(len(ids), 5)
+
+    def test_malformed_cursor(self):
+        url = reverse('rate_lookup_api')
+        for values in ([1, '99213', None, None], [1, '99213', None, None, {'id': 1}],
+                       [1, 99213, None, None, 1], ['1', '99213', None, None, 1],
+                       [1, '99213', None, 2.5, 1], [True, '99213', None, None, 1]):
+            response = self.client.get(url, {'cursor': encode_cursor(values)})
+            self.assertEqual(response.status_code, 400, values)
+        self.assertEqual(self.client.get(url, {'cursor': 'not base64!'}).status_code, 400)
+        response = self.client.get(url, {'cursor': encode_cursor([0, '99213', None, None, 0])})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 5)
+
+    def test_state_filter_and_fields(self):
+        response = self.client.get(reverse('rate_lookup_api'), {'state': 'NY'})
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['state'], 'NY')
+        self.assertEqual(response.data[0]['description'], 'Office visit')
+
+    def test_ndjson_stream(self):
+        response = self.client.get(reverse('rate_lookup_api'), {'stream': '1'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0]['schedule_type'], 'Physician')
+
+    def test_fast_rows_match_serializer(self):
+        rates = _rates_queryset()
+        self.assertEqual(
+            serialize_rates(rates),
+            [dict(row) for row in FeeScheduleRateSerializer(rates, many=True).data],
+        )
+
+
+class AsyncLookupTest(MedicareDataMixin, TransactionTestCase):
+    async def test_medicare_lookup_async(self):
+        response = await self.async_client.get(
+            reverse('medicare_lookup_async'), {'zip_code': '90210', 'procedure_code': '99213'}
+        )
+        self.assertEqual(response.status_code, 200)
+        expected = await sync_to_async(lookup_rate_sql)('90210', '99213')
+        self.assertEqual(response.json()['allowed_amount'], expected['allowed_amount'])
+
+        response = await self.async_client.get(
+            reverse('medicare_lookup_async'), {'zip_code': '00000', 'procedure_code': '99213'}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    async def test_rate_lookup_api_async_pages(self):
+        await sync_to_async(RatesApiPaginationTest.setUp)(self)
+        url = reverse('rate_lookup_api_async') + '?page_size=3'
+        ids = []
+        while url:
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(row['id'] for row in response.json())
+            link = response.get('Link')
+            url = link[1:link.index('>')] if link else None
+        self.assertEqual(len(ids), 5)
+
+        first = await self.async_client.get(reverse('rate_lookup_api_async'))
+        response = await self.async_client.get(
+            reverse('rate_lookup_api_async'), headers={'If-None-Match': first['ETag']}
+        )
+        self.assertEqual(response.status_code, 304)
+
+
+class SqlitePragmaTest(TestCase):
+    def test_pragmas_applied_on_connect(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['cache_size'])
+            cursor.execute('PRAGMA temp_store')
+            self.assertEqual(cursor.fetchone()[0], 2)  # MEMORY
+
+    def test_read_only_uri_detected(self):
+        read_only = SimpleNamespace(settings_dict={'NAME': 'file:/tmp/x.db?mode=ro&immutable=1'})
+        writable = SimpleNamespace(settings_dict={'NAME': '/tmp/x.db'})
+        self.assertTrue(is_read_only(read_only))
+        self.assertFalse(is_read_only(writable))
+
+
+class GenerateDatasetTest(TestCase):
+    def test_generates_consistent_dataset(self):
+        call_command('generate_dataset', procedures=40, zip_codes=300, regional_states=2,
+                     regions=3, commercial_rates=50, stdout=io.StringIO())
+        self.assertEqual(MedicareLocalityMap.objects.count(), 300)
+        self.assertEqual(FeeSchedule.objects.count(), 51)
+        self.assertEqual(Region.objects.count(), 6)
+        self.assertTrue(workers_comp_rates('99213', 'CA'))
+
+        engine = get_pricing_engine()
+        for zip_code in MedicareLocalityMap.objects.values_list('zip_code', flat=True)[:20]:
+            self.assertAlmostEqual(
+                engine.price(zip_code, '99213')['allowed_amount'],
+                lookup_rate_sql(zip_code, '99213')['allowed_amount'],
+            )
+
+        with self.assertRaises(CommandError):
+            call_command('generate_dataset', procedures=40, zip_codes=300, stdout=io.StringIO())
+        call_command('generate_dataset', procedures=40, zip_codes=200, commercial_rates=0,
+                     replace=True, stdout=io.StringIO())
+        self.assertEqual(MedicareLocalityMap.objects.count(), 200)
+
+
+class LoadTestCommandTest(MedicareDataMixin, LiveServerTestCase):
+    def test_reports_latency_per_endpoint(self):
+        cache.set(state_catalog_key(), ['CA'])
+        out = io.StringIO()
+        call_command('load_test', base_url=self.live_server_url, endpoints=['medicare', 'rates'],
+                     requests=6, warmup=2, concurrency=2, max_p95_ms=10000, stdout=out)
+        lines = {line.split()[0]: line.split() for line in out.getvalue().splitlines()[2:]}
+        self.assertEqual(set(lines), {'medicare', 'rates'})
+        self.assertEqual(lines['medicare'][-1], '0')
+        self.assertEqual(lines['rates'][-1], '0')
+
+
+class QueryTimingMiddlewareTest(MedicareDataMixin, TestCase):
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing_and_slow_query_log(self):
+        with self.settings(QUERY_TIMING_ENABLED=True, SLOW_QUERY_MS=0):
+            with self.assertLogs('core.queries', 'WARNING') as logs:
+                response = self.client.post(
+                    reverse('rate_lookup'), {'zip_code': '90210', 'procedure_code': '99213'}
+                )
+        metrics = [metric.split(';')[0] for metric in response['Server-Timing'].split(', ')]
+        self.assertEqual(metrics, ['db', 'view', 'render', 'total'])
+        self.assertTrue(any('plan: [' in line and 'SCAN' in line for line in logs.output))
+
+
+class LoadCmsCommandTest(MedicareDataMixin, TestCase):
+    PPRRVU = (
+        '"2026 National Physician Fee Schedule Relative Value File January Release",,,,,,,,,,,,\n'
+        ',,,STATUS,NOT USED FOR,WORK,NON-FAC,NON-FAC,FACILITY,FACILITY,MP,NON-FACILITY,FACILITY\n'
+        'HCPCS,MOD,DESCRIPTION,CODE,PAYMENT,RVU,PE RVU,INDICATOR,PE RVU,INDICATOR,RVU,TOTAL,TOTAL\n'
+        '99213,,Office o/p est low 20 min,A,,1.30,1.25,,0.55,,0.09,2.64,1.94\n'
+        '99214,,Office o/p est mod 30 min,A,,1.92,1.60,,0.80,,0.13,3.65,2.85\n'
+    )
+    GPCI = (
+        '"ADDENDUM E. FINAL CY 2026 GPCIs by State and Medicare Locality",,,,,,\n'
+        'Medicare Administrative Contractor (MAC),State,Locality Number,Locality Name,'
+        '2026 PW GPCI (with 1.0 Floor),2026 PE GPCI,2026 MP GPCI\n'
+        '01182,CA,18,LOS ANGELES*,1.037,1.191,0.762\n'
+        ',,,* Payment locality is serviced by two MACs,,,\n'
+    )
+
+    def test_loads_release_and_reports_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            release = os.path.join(tmp, 'RVU26A.zip')
+            with zipfile.ZipFile(release, 'w') as archive:
+                archive.writestr('PPRRVU26_JAN.csv', self.PPRRVU)
+                archive.writestr('GPCI2026.csv', self.GPCI)
+            report = os.path.join(tmp, 'diff.csv')
+            for _ in range(2):
+                out = io.StringIO()
+                call_command('load_cms', year=2026, release=release, conversion_factor=33.40,
+                             diff_report=report, stdout=out)
+            with open(report) as f:
+                changes = {(row['table'], row['change'], row['key'], row['key2']) for row in csv.DictReader(f)}
+
+        self.assertEqual(CmsRvu.objects.filter(year=2026).count(), 2)
+        self.assertEqual(CmsGpci.objects.get(year=2026).locality_name, 'LOS ANGELES')
+        self.assertIn('cms_rvu: 1 added, 1 changed, 1 removed', out.getvalue())
+        self.assertIn('cms_gpci: 0 added, 0 changed, 0 removed', out.getvalue())
+        self.assertEqual(changes, {
+            ('cms_rvu', 'added', '99214', ''),
+            ('cms_rvu', 'changed', '99213', ''),
+            ('cms_rvu', 'removed', '99213', '26'),
+        })
+        self.assertEqual(CmsRvu.objects.filter(year=2025).count(), 2)
+        self.assertAlmostEqual(float(price_for_date('90210', '99214', '2026-03-01')['conversion_factor']), 33.40)
+
+    def test_diff_with_null_values(self):
+        CmsRvu.objects.create(
+            procedure_code="99213", modifier="", year=2026,
+            work_rvu="1.30", practice_expense_rvu="1.21", malpractice_rvu="0.09",
+        )
+        # The loaded database allows NULL RVUs; the test schema does not, so
+        # the query blanks the 2025 work RVUs instead.
+        sql = RVU_VALUES_SQL.replace('work_rvu,', 'CASE WHEN year = 2025 THEN NULL ELSE work_rvu END,')
+        with connection.cursor() as cursor:
+            added, changed, removed = diff_years(cursor, sql, 2025, 2026)
+            self.assertEqual(diff_years(cursor, sql, 2025, 2025), ([], [], []))
+        self.assertEqual(added, [])
+        self.assertEqual([(key, old[0]) for key, old, _ in changed], [(('99213', ''), None)])
+        self.assertEqual([key for key, _, _ in removed], [('99213', '26')])
+
+    def test_rejects_file_without_rows(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write('nothing,here\n')
+            f.flush()
+            with self.assertRaises(CommandError):
+                call_command('load_cms', year=2026, rvu=f.name, stdout=io.StringIO())
+        self.assertFalse(CmsRvu.objects.filter(year=2026).exists())
+
+
+class CommercialPercentilesTest(TestCase):
+    def setUp(self):
+        with connection.cursor() as cursor:
+            for sql in CREATE_EXTRA_TABLES_SQL:
+                cursor.execute(sql)
+            cursor.executemany(
+                "INSERT INTO zip_code_enriched (zip_code, county, state) VALUES (%s, %s, %s)",
+                [('90210', 'Los Angeles', 'CA'), ('90211', 'Los Angeles', 'CA'), ('90301', 'Orange', 'CA')],
+            )
+            self.rates = {'90210': [100, 140, 90, 300], '90211': [120], '90301': [80, 95]}
+            cursor.executemany(
+                "INSERT INTO commercial_rate (procedure_code, modifier, zip_code, provider, payer, rate, "
+                "effective_date, data_source, last_updated) "
+                "VALUES ('99213', NULL, %s, 'P', 'Payer', %s, '2025-01-01', 'test', CURRENT_TIMESTAMP)",
+                [(zip_code, rate) for zip_code, rates in self.rates.items() for rate in rates],
+            )
+
+    def test_percentiles_match_numpy(self):
+        call_command('build_commercial_percentiles', stdout=io.StringIO())
+        rows = rate_percentiles('99213', zip_code='90210')
+        self.assertEqual([(r['geography_type'], r['geography'], r['rate_count']) for r in rows],
+                         [('zip3', '902', 5), ('county', 'Los Angeles', 5)])
+        expected = np.percentile(self.rates['90210'] + self.rates['90211'], PERCENTILES)
+        for column, value in zip(('p10', 'p25', 'p50', 'p75', 'p90'), expected):
+            self.assertAlmostEqual(rows[0][column], value, places=2)
+
+        counts, table = group_percentiles(np.array([1, 0, 1, 1]), np.array([5.0, 7.0, 1.0, 3.0]))
+        self.assertEqual(counts.tolist(), [1, 3])
+        self.assertEqual(table[1].tolist(), np.percentile([5.0, 1.0, 3.0], PERCENTILES).tolist())
+
+    def test_api(self):
+        url = reverse('commercial_percentiles_api')
+        # Before the first build the table is there but empty.
+        response = self.client.get(url, {'procedure_code': '99213'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [])
+
+        call_command('build_commercial_percentiles', stdout=io.StringIO())
+        response = self.client.get(url, {'procedure_code': '99213', 'county': 'Orange', 'state': 'CA'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['p50'], 87.5)
+        self.assertEqual(len(self.client.get(url, {'procedure_code': '99213'}).json()), 4)
+        self.assertEqual(self.client.get(url, {'zip_code': '90210'}).status_code, 400)
+
+
+class NearbySearchTest(MedicareDataMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        with connection.cursor() as cursor:
+            for sql in CREATE_EXTRA_TABLES_SQL:
+                cursor.execute(sql)
+            cursor.executemany(
+                "INSERT INTO zip_code_enriched (zip_code, state, latitude, longitude) VALUES (%s, 'CA', %s, %s)",
+                [('90210', 34.0901, -118.4065), ('90401', 34.0160, -118.4970),
+                 ('92101', 32.7190, -117.1630), ('94102', 37.7793, -122.4193)],
+            )
+            cursor.executemany(
+                "INSERT INTO commercial_rate (procedure_code, modifier, zip_code, provider, payer, rate, "
+                "effective_date, data_source, last_updated) "
+                "VALUES ('99213', NULL, %s, 'P', 'Payer', %s, '2025-01-01', 'test', CURRENT_TIMESTAMP)",
+                [('90401-1234', 130), ('92101', 110), ('90210', 150)],
+            )
+        reset_zip_grid()
+
+    def tearDown(self):
+        reset_zip_grid()
+        super().tearDown()
+
+    def test_grid_matches_brute_force(self):
+        grid = get_zip_grid()
+        for miles in (1, 10, 120, 400):
+            zip_codes, distances = grid.around_zip('90210', miles)
+            everything = haversine_miles(34.0901, -118.4065, grid._lats, grid._lons)
+            self.assertEqual(set(zip_codes.tolist()), set(grid.zip_codes[everything <= miles].tolist()))
+            self.assertEqual(distances.tolist(), sorted(distances.tolist()))
+        self.assertIsNone(grid.around_zip('00000', 10))
+
+    def test_nearby_api(self):
+        response = self.client.get(reverse('nearby_api'),
+                                   {'zip_code': '90210', 'procedure_code': '99213', 'miles': 20})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([row['zip_code'] for row in data['commercial_rates']], ['90210', '90401-1234'])
+        self.assertEqual(data['medicare_localities'][0]['locality_code'], '18')
+        self.assertAlmostEqual(data['medicare_localities'][0]['allowed_amount'],
+                               get_pricing_engine().price('90210', '99213')['allowed_amount'])
+        self.assertEqual(self.client.get(reverse('nearby_api'),
+                                         {'zip_code': '90210', 'procedure_code': '99213', 'miles': 500}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('nearby_api'),
+                                         {'zip_code': '00000', 'procedure_code': '99213'}).status_code, 404)
+
+
+class ProcedureSearchTest(TestCase):
+    def setUp(self):
+        for code, description in [
+            ('99213', 'Office or other outpatient visit, established patient, low complexity'),
+            ('99214', 'Office or other outpatient visit, established patient, moderate complexity'),
+            ('29881', 'Arthroscopy, knee, surgical; with meniscectomy'),
+            ('27447', 'Arthroplasty, knee, condyle and plateau'),
+            ('11042', 'Debridement, subcutaneous tissue; first 20 sq cm or less'),
+        ]:
+            ProcedureCode.objects.create(procedure_code=code, description=description, code_type='CPT')
+        reset_procedure_index()
+
+    def tearDown(self):
+        reset_procedure_index()
+
+    def test_prefix_and_ranked_matches(self):
+        codes = lambda query: [row['procedure_code'] for row in search_procedures(query)]  # noqa: E731
+        self.assertEqual(codes('99213'), ['99213'])
+        self.assertEqual(codes('992'), ['99213', '99214'])
+        self.assertEqual(codes('knee arthro'), ['27447', '29881'])
+        self.assertEqual(codes('arthroscopy knee'), ['29881'])
+        self.assertEqual(codes('office mod'), ['99214'])
+        self.assertEqual(codes('zzz'), [])
+
+    def test_index_grows_incrementally(self):
+        with self.settings(PROCEDURE_SEARCH_REFRESH_SECONDS=0):
+            index = get_procedure_index()
+            ProcedureCode.objects.create(procedure_code='29882', description='Arthroscopy, knee, repair',
+                                         code_type='CPT')
+            self.assertIs(get_procedure_index(), index)
+            self.assertEqual(search_procedures('arthroscopy repair')[0]['procedure_code'], '29882')
+
+            ProcedureCode.objects.filter(procedure_code='29881').delete()
+            self.assertIsNot(get_procedure_index(), index)
+            self.assertEqual([row['procedure_code'] for row in search_procedures('meniscectomy')], [])
+
+            # An edit keeps the row count and rowids; the edit counter moves.
+            index = get_procedure_index()
+            with connection.cursor() as cursor:
+                cursor.execute("UPDATE procedure_code SET description = 'Arthroscopy, knee, synovectomy' "
+                               "WHERE procedure_code = '29882'")
+            self.assertIsNot(get_procedure_index(), index)
+            self.assertEqual(search_procedures('synovectomy')[0]['procedure_code'], '29882')
+            self.assertEqual(search_procedures('arthroscopy repair'), [])
+
+    def test_search_api(self):
+        response = self.client.get(reverse('procedure_search_api'), {'q': 'debrid', 'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{
+            'procedure_code': '11042', 'code_type': 'CPT',
+            'description': 'Debridement, subcutaneous tissue; first 20 sq cm or less',
+        }])
+
+
+class WorkersCompComparisonTest(TestCase):
+    def setUp(self):
+        call_command('generate_dataset', procedures=40, zip_codes=300, regional_states=2,
+                     regions=3, commercial_rates=0, stdout=io.StringIO())
+        cache.clear()
+
+    def test_matrix_covers_every_state(self):
+        with self.assertNumQueries(2):  # data version + one pass over the index
+            comparison = compare_states('99213')
+        self.assertEqual(len(comparison['states']), FeeSchedule.objects.count())
+        for entry in comparison['states'][:5]:
+            expected = sorted(float(row['rate']) for row in workers_comp_rates('99213', entry['state']))
+            found = sorted(rate for row in entry['rows'] for rate in row['rates'].values())
+            self.assertEqual(found, expected)
+            self.assertEqual(entry['min_rate'], expected[0])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(compare_states('99213'), comparison)
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {COMPARISON_SQL}', ['99213'])
+            self.assertEqual(full_table_scans(cursor.fetchall()), [])
+
+    def test_api_and_page(self):
+        response = self.client.get(reverse('workers_comp_comparison_api'), {'procedure_code': '99213'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['procedure_code'], '99213')
+        self.assertEqual(self.client.get(reverse('workers_comp_comparison_api'),
+                                         {'procedure_code': 'abc'}).status_code, 400)
+        page = self.client.get(reverse('workers_comp_comparison'), {'procedure_code': '99213'})
+        self.assertContains(page, 'Compare States')
+        self.assertEqual(len(page.context['table']), FeeSchedule.objects.count())
+
+
+class PercentOfMedicareTest(TestCase):
+    def setUp(self):
+        call_command('generate_dataset', procedures=40, zip_codes=300, regional_states=2,
+                     regions=3, commercial_rates=0, stdout=io.StringIO())
+        cache.clear()
+
+    def test_statewide_amount_is_mean_over_zips(self):
+        engine = get_pricing_engine()
+        resolver = engine.resolver
+        keys = list(engine._rvu_ids)[:5] + [('00000', '')]
+        amounts = engine.state_allowed_amounts(keys)
+        self.assertTrue(np.isnan(amounts[-1]).all())
+        for state_id, state in enumerate(resolver.states[:3]):
+            zips = [f'{z:05d}' for z in np.flatnonzero(resolver._state_ids == state_id)]
+            for key_id, (procedure_code, modifier) in enumerate(keys[:-1]):
+                priced = [engine.price(zip_code, procedure_code, modifier) for zip_code in zips]
+                expected = np.mean([result['allowed_amount'] for result in priced if result])
+                self.assertAlmostEqual(amounts[key_id, state_id], expected)
+
+    def test_distributions(self):
+        engine = get_pricing_engine()
+        arrays = RateArrays(['CA'], details=True)
+        medicare, percents = percent_of_medicare(arrays, engine)
+        line = arrays.lines[0]
+        rate = FeeScheduleRate.objects.filter(
+            procedure_code=arrays.keys[arrays.key_ids[0]][0], region_id=line[0],
+            place_of_service=line[1], rate=arrays.rates[0],
+        )
+        self.assertTrue(rate.exists())
+        self.assertAlmostEqual(percents[0], arrays.rates[0] / medicare[0] * 100)
+
+        summary = benchmark_states(['CA'])['states']
+        self.assertEqual([entry['state'] for entry in summary], ['CA'])
+        values = percents[~np.isnan(percents)]
+        self.assertEqual(summary[0]['benchmarked_count'], len(values))
+        self.assertAlmostEqual(summary[0]['p50'], round(float(np.percentile(values, 50)), 2))
+        self.assertLessEqual(summary[0]['min'], summary[0]['p10'])
+        with self.assertNumQueries(0):
+            self.assertEqual(benchmark_states(['CA'])['states'], summary)
+
+        everywhere = benchmark_states()['states']
+        self.assertEqual(len(everywhere), FeeSchedule.objects.count())
+        self.assertIn(summary[0], everywhere)
+
+    def test_api(self):
+        url = reverse('percent_of_medicare_api')
+        response = self.client.get(url, {'state': ['ca', 'NY']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry['state'] for entry in response.json()['states']], ['CA', 'NY'])
+        self.assertIn('ETag', response)
+        for params, status in (({'state': 'California'}, 400), ({'year': '1999'}, 404)):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status)
+            self.assertNotIn('ETag', response)
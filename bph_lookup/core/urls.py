@@ -1,9 +1,22 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('medicare/', views.rate_lookup, name='rate_lookup'),
     path('workcomp/', views.workers_comp_lookup, name='workers_comp_lookup'),
+    path('workcomp/compare/', views.workers_comp_comparison, name='workers_comp_comparison'),
     path('api/rates/', views.rate_lookup_api, name='rate_lookup_api'),
+    path('api/states/', views.states_api, name='states_api'),
+    path('api/workcomp/compare/', views.workers_comp_comparison_api, name='workers_comp_comparison_api'),
+    path('api/workcomp/percent-of-medicare/', views.percent_of_medicare_api, name='percent_of_medicare_api'),
+    path('api/commercial/percentiles/', views.commercial_percentiles_api, name='commercial_percentiles_api'),
+    path('api/procedures/search/', views.procedure_search_api, name='procedure_search_api'),
+    path('api/nearby/', views.nearby_api, name='nearby_api'),
+    path('api/medicare/batch/', views.medicare_batch_api, name='medicare_batch_api'),
+
+    # Async JSON lookups for ASGI deployments (bph_lookup/asgi.py).
+    path('async/medicare/', async_views.medicare_lookup_async, name='medicare_lookup_async'),
+    path('async/workcomp/', async_views.workers_comp_lookup_async, name='workers_comp_lookup_async'),
+    path('async/api/rates/', async_views.rate_lookup_api_async, name='rate_lookup_api_async'),
 ]
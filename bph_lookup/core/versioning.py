@@ -0,0 +1,199 @@
+"""
+Data-release version stamp.
+
+Fee schedule and CMS data only change when a new release is loaded. The
+stamp summarises the release from ``data_release``, one counter per tracked
+table, plus a few aggregates that SQLite answers from the small tables or the
+end of a primary-key index. Loaders bump the counters of the tables they
+wrote through ``record_data_version()``, once per load. On the small
+reference tables, triggers also bump them on any UPDATE or DELETE, so hand
+edits there move the stamp too; the large rate tables have no triggers,
+which would cost an upsert per row in every bulk delete. New rows raise the
+highest row id, which the aggregates catch when a write bypasses both.
+Caches, ETags and in-memory tables key on the stamp so a change invalidates
+them without any per-request query against the rate tables.
+"""
+import functools
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils.cache import get_conditional_response
+
+# Tables whose contents make up a data release.
+TRACKED_TABLES = (
+    'state', 'region', 'fee_schedule', 'fee_schedule_rate', 'procedure_code',
+    'cms_rvu', 'cms_gpci', 'cms_conversion_factor',
+    'medicare_locality_map', 'medicare_locality_meta',
+)
+
+# Tracked tables small enough, or edited by hand often enough, for a
+# per-row UPDATE/DELETE trigger. fee_schedule_rate, cms_rvu and
+# medicare_locality_map are bulk-loaded and rely on record_data_version().
+TRIGGER_TABLES = (
+    'state', 'region', 'fee_schedule', 'procedure_code',
+    'cms_gpci', 'cms_conversion_factor', 'medicare_locality_meta',
+)
+
+# Fallback for a database without data_release (not yet migrated).
+AGGREGATES_SQL = """
+    SELECT
+        (SELECT COUNT(*) || ':' || COALESCE(MAX(effective_date), '') FROM fee_schedule),
+        (SELECT COUNT(*) || ':' || COALESCE(MAX(last_updated), '') FROM cms_conversion_factor),
+        (SELECT MAX(id) FROM fee_schedule_rate),
+        (SELECT MAX(rowid) FROM cms_rvu),
+        (SELECT MAX(rowid) FROM cms_gpci),
+        (SELECT MAX(rowid) FROM medicare_locality_map)
+"""
+
+DATA_VERSION_SQL = f"""
+    SELECT
+        (SELECT GROUP_CONCAT(table_name || '=' || version)
+         FROM (SELECT table_name, version FROM data_release
+               WHERE table_name IN ({', '.join(f"'{table}'" for table in TRACKED_TABLES)})
+               ORDER BY table_name)),
+        aggregates.*
+    FROM ({AGGREGATES_SQL}) aggregates
+"""
+
+BUMP_RELEASE_SQL = """
+    INSERT INTO data_release (table_name, version, updated_at)
+    VALUES (%s, 1, CURRENT_TIMESTAMP)
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = data_release.version + 1, updated_at = excluded.updated_at
+"""
+
+
+# data_release row stamped by record_analyze(). Not a tracked table: ANALYZE
+# changes no data, so the data version ignores it.
+ANALYZE_RELEASE = 'sqlite_stat1'
+
+
+def release_trigger_sql(table, event):
+    """``CREATE TRIGGER`` that bumps ``table``'s counter after each UPDATE or DELETE row."""
+    return (
+        f'CREATE TRIGGER IF NOT EXISTS "data_release_{table}_{event.lower()}" '
+        f'AFTER {event} ON "{table}" BEGIN '
+        f"INSERT INTO data_release (table_name, version, updated_at) "
+        f"VALUES ('{table}', 1, CURRENT_TIMESTAMP) "
+        f"ON CONFLICT (table_name) DO UPDATE "
+        f"SET version = data_release.version + 1, updated_at = excluded.updated_at; "
+        f'END'
+    )
+
+
+def install_release_triggers(connection, tables=TRIGGER_TABLES):
+    """Create the UPDATE and DELETE triggers on each of ``tables`` that exists."""
+    with connection.cursor() as cursor:
+        existing = set(connection.introspection.table_names(cursor))
+        for table in tables:
+            if table in existing:
+                for event in ('UPDATE', 'DELETE'):
+                    cursor.execute(release_trigger_sql(table, event))
+
+
+def drop_release_triggers(connection, tables=TRACKED_TABLES):
+    with connection.cursor() as cursor:
+        for table in tables:
+            for event in ('update', 'delete'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS "data_release_{table}_{event}"')
+
+
+def compute_data_version():
+    """Read the release counters and aggregates and hash them into a short stamp."""
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute(DATA_VERSION_SQL)
+        except DatabaseError:
+            cursor.execute(AGGREGATES_SQL)
+        parts = cursor.fetchone()
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:16]
+
+
+_version = None
+_checked_at = 0.0
+_version_lock = threading.Lock()
+
+
+def get_data_version():
+    """
+    Return the current data version.
+
+    The stamp is kept in memory and recomputed at most every
+    ``DATA_VERSION_CHECK_SECONDS``, or immediately after
+    ``record_data_version()``.
+    """
+    global _version, _checked_at
+    interval = getattr(settings, 'DATA_VERSION_CHECK_SECONDS', 60)
+    if _version is not None and time.monotonic() - _checked_at < interval:
+        return _version
+    with _version_lock:
+        if _version is None or time.monotonic() - _checked_at >= interval:
+            _version = compute_data_version()
+            _checked_at = time.monotonic()
+        return _version
+
+
+def record_data_version(tables=TRACKED_TABLES):
+    """
+    Bump the release counters of ``tables`` and recompute the stamp now;
+    call after loading new fee schedule or CMS data into them.
+    """
+    global _version, _checked_at
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(BUMP_RELEASE_SQL, [table])
+    with _version_lock:
+        _version = compute_data_version()
+        _checked_at = time.monotonic()
+        return _version
+
+
+def record_analyze():
+    """
+    Run ANALYZE and stamp the time in ``data_release`` so ``check_db`` can
+    tell which tables changed since.
+    """
+    with connection.cursor() as cursor:
+        # Stamp first so data_release itself has a row when it is analyzed.
+        cursor.execute(BUMP_RELEASE_SQL, [ANALYZE_RELEASE])
+        cursor.execute('ANALYZE')
+
+
+def invalidate_data_version():
+    """Forget the stamp so the next call recomputes it."""
+    global _version, _checked_at
+    with _version_lock:
+        _version = None
+        _checked_at = 0.0
+
+
+def data_etag(request, *args, **kwargs):
+    """
+    Strong ETag for a GET response: the data version plus a hash of the
+    query string, since each query selects different rows.
+    """
+    query = hashlib.sha1(request.META.get('QUERY_STRING', '').encode()).hexdigest()[:8]
+    return f'"{get_data_version()}-{query}"'
+
+
+def data_conditional(view):
+    """
+    ``condition(etag_func=data_etag)`` for successful responses only: a
+    matching ``If-None-Match`` still gets 304, but errors such as 400 and
+    404 are sent without the ETag, so clients never revalidate an error as
+    the current data.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        etag = data_etag(request, *args, **kwargs)
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+    return wrapper
@@ -1,12 +1,42 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
+from django.http import StreamingHttpResponse
+from django.template.response import TemplateResponse
 from django.db import connection
 from django.contrib import messages
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
-from .forms import MedicareRateLookupForm, WorkersCompRateLookupForm
+from .benchmarking import benchmark_states
+from .catalog import get_fee_schedule_states
+from .comparison import compare_states
+from .forms import MedicareRateLookupForm, WorkersCompComparisonForm, WorkersCompRateLookupForm
+
+from .models import State, ProcedureCode, FeeSchedule, FeeScheduleRate, Region
+from .pagination import RATE_KEYSET, decode_cursor, encode_cursor, keyset_after
+from .percentiles import rate_percentiles
+from .pricing import PRICING_YEAR, line_result, price_claims, price_for_date, pricing_year, pricing_years
+from .procedure_search import search_procedures
+from . import renderers
+from .serializers import rate_rows
+from .spatial import nearby_commercial_rates, nearby_medicare_localities
+from .versioning import data_conditional
+
+WORKERS_COMP_RATES_SQL = """
+    SELECT procedure_code, modifier, region_id, place_of_service,
+           service_type, rate_unit, rate
+    FROM fee_schedule_rate
+    WHERE procedure_code = %s AND state = %s
+"""
+
+
+def workers_comp_rates(procedure_code, state):
+    """Fee schedule rows for one CPT code in one state, as dicts."""
+    with connection.cursor() as cursor:
+        cursor.execute(WORKERS_COMP_RATES_SQL, [procedure_code, state])
+        columns = [col[0] for col in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
 
-from .models import State, ProcedureCode, FeeScheduleRate, Region
-from .serializers import FeeScheduleRateSerializer
 
 def rate_lookup(request, template_name="core/medicare_rate_lookup.html"):
     """
@@ -21,42 +51,22 @@ def rate_lookup(request, template_name="core/medicare_rate_lookup.html"):
         if form.is_valid():
             zip_code = form.cleaned_data['zip_code']
             procedure_code = form.cleaned_data['procedure_code']
+            date_of_service = form.cleaned_data.get('date_of_service')
 
             try:
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT
-                            mloc.zip_code, mloc.state_code, meta.state_name, meta.fee_schedule_area,
-                            gpci.locality_name, gpci.work_gpci, gpci.pe_gpci, gpci.mp_gpci,
-                            rvu.procedure_code, rvu.work_rvu, rvu.practice_expense_rvu, rvu.malpractice_rvu,
-                            cf.conversion_factor,
-                            ((COALESCE(rvu.work_rvu, 0) * COALESCE(gpci.work_gpci, 0) +
-                              COALESCE(rvu.practice_expense_rvu, 0) * COALESCE(gpci.pe_gpci, 0) +
-                              COALESCE(rvu.malpractice_rvu, 0) * COALESCE(gpci.mp_gpci, 0))
-                             * COALESCE(cf.conversion_factor, 0)) AS allowed_amount
-                        FROM medicare_locality_map mloc
-                        JOIN medicare_locality_meta meta ON mloc.carrier_code = meta.mac_code AND mloc.locality_code = meta.locality_code
-                        JOIN cms_gpci gpci ON TRIM(meta.fee_schedule_area) = TRIM(gpci.locality_name) AND mloc.locality_code = gpci.locality_code
-                        JOIN cms_rvu rvu ON 1=1
-                        JOIN cms_conversion_factor cf ON gpci.year = cf.year
-                        WHERE mloc.zip_code = %s AND gpci.year = 2025 AND rvu.year = 2025 
-                        AND rvu.procedure_code = %s AND (rvu.modifier IS NULL OR rvu.modifier = '')
-                    """, [zip_code, procedure_code])
-                    
-                    columns = [col[0] for col in cursor.description]
-                    result = cursor.fetchone()
-                    
-                    if result:
-                        context['result'] = dict(zip(columns, result))
-                        messages.success(request, 'Rate calculation completed successfully.')
-                    else:
-                        messages.warning(request, 'No results found for the given ZIP code and procedure code.')
+                result = price_for_date(zip_code, procedure_code, date_of_service)
+                if result:
+                    context['result'] = result
+                    context['year'] = pricing_year(date_of_service)
+                    messages.success(request, 'Rate calculation completed successfully.')
+                else:
+                    messages.warning(request, 'No results found for the given ZIP code and procedure code.')
             except Exception as e:
                 messages.error(request, f'Error calculating rate: {str(e)}')
         else:
             messages.error(request, 'Please correct the errors below.')
 
-    return render(request, template_name, context)
+    return TemplateResponse(request, template_name, context)
 
 
 def home(request):
@@ -76,51 +86,295 @@ def workers_comp_lookup(request, template_name="core/workers_comp_rate_lookup.ht
             procedure_code = form.cleaned_data["procedure_code"]
 
             try:
-                with connection.cursor() as cursor:
-                    cursor.execute("""
-                        SELECT procedure_code, modifier, region_id, place_of_service, 
-                               service_type, rate_unit, rate 
-                        FROM fee_schedule_rate 
-                        WHERE procedure_code = %s AND state = %s
-                    """, [procedure_code, state])
-                    
-                    columns = [col[0] for col in cursor.description]
-                    results = cursor.fetchall()
-                    
-                    if results:
-                        rates = [dict(zip(columns, row)) for row in results]
-                        context["rates"] = rates
-                        messages.success(request, "Rate lookup completed successfully.")
-                    else:
-                        messages.warning(request, "No results found for the given state and procedure code.")
+                rates = workers_comp_rates(procedure_code, state)
+                if rates:
+                    context["rates"] = rates
+                    messages.success(request, "Rate lookup completed successfully.")
+                else:
+                    messages.warning(request, "No results found for the given state and procedure code.")
             except Exception as e:
                 messages.error(request, f"Error retrieving rate: {str(e)}")
         else:
             messages.error(request, "Please correct the errors below.")
 
-    return render(request, template_name, context)
+    return TemplateResponse(request, template_name, context)
+
+
+def workers_comp_comparison(request):
+    """One CPT code's workers' comp rates in every state, side by side."""
+    form = WorkersCompComparisonForm(request.GET or None)
+    context = {"form": form}
+    if form.is_valid():
+        comparison = compare_states(form.cleaned_data["procedure_code"])
+        context["comparison"] = comparison
+        # Rates in modifier column order for the table (the cached matrix is shared).
+        context["table"] = [
+            (entry, [(row, [row["rates"].get(m) for m in comparison["modifiers"]]) for row in entry["rows"]])
+            for entry in comparison["states"]
+        ]
+        if not comparison["states"]:
+            messages.warning(request, "No fee schedule rates found for that procedure code.")
+    return TemplateResponse(request, "core/workers_comp_comparison.html", context)
 
 
+def _rates_queryset(state_code=None, procedure_code=None):
+    """Fee schedule rates matching the API filters, with display columns annotated."""
+    schedules = FeeSchedule.objects.filter(id=OuterRef("fee_schedule_id"))
+    rates = FeeScheduleRate.objects.annotate(
+        state_code=Subquery(schedules.values("state_code")[:1]),
+        schedule_type=Subquery(schedules.values("schedule_type")[:1]),
+        description=Subquery(
+            ProcedureCode.objects.filter(procedure_code=OuterRef("procedure_code")).values("description")[:1]
+        ),
+        region_name=Subquery(
+            Region.objects.filter(region_id=OuterRef("region_id")).values("region_name")[:1]
+        ),
+    )
+    if state_code:
+        rates = rates.filter(
+            fee_schedule_id__in=FeeSchedule.objects.filter(state_code=state_code).values("id")
+        )
+        region = Region.objects.filter(state_code=state_code).first()
+        if region:
+            rates = rates.filter(region_id=region.region_id)
+    if procedure_code:
+        rates = rates.filter(procedure_code=procedure_code)
+    return rates.order_by(*RATE_KEYSET)
+
+
+def _stream_rates(rates):
+    for row, _ in rate_rows(rates):
+        yield renderers.dumps(row) + b"\n"
+
+
+def _page_size(query_params):
+    """Requested page size, clamped to RATES_API_MAX_PAGE_SIZE. Raises ValueError."""
+    max_page_size = getattr(settings, "RATES_API_MAX_PAGE_SIZE", 10000)
+    try:
+        page_size = int(query_params.get("page_size", getattr(settings, "RATES_API_PAGE_SIZE", 1000)))
+    except (TypeError, ValueError):
+        raise ValueError("page_size must be an integer.")
+    return max(1, min(page_size, max_page_size))
+
+
+def _rates_after(state_code, procedure_code, cursor=None):
+    """Rates queryset for the API filters, starting after ``cursor``. Raises InvalidCursor."""
+    rates = _rates_queryset(state_code, procedure_code)
+    if cursor:
+        rates = rates.filter(keyset_after(decode_cursor(cursor)))
+    return rates
+
+
+def rates_page(state_code=None, procedure_code=None, cursor=None, page_size=1000):
+    """
+    One keyset page of /api/rates/ rows.
+
+    Returns ``(rows, next_cursor)``, with ``next_cursor`` None on the last
+    page. Raises InvalidCursor for a malformed cursor.
+    """
+    rates = _rates_after(state_code, procedure_code, cursor)
+    # One extra row tells whether there is a next page.
+    page = list(rate_rows(rates[:page_size + 1], extra_columns=RATE_KEYSET))
+    next_cursor = encode_cursor(page[page_size - 1][1]) if len(page) > page_size else None
+    return [row for row, _ in page[:page_size]], next_cursor
+
+
+def next_page_link(request, query_params, next_cursor):
+    params = query_params.copy()
+    params["cursor"] = next_cursor
+    next_url = request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+    return f'<{next_url}>; rel="next"'
+
+
+@data_conditional
 @api_view(["GET"])
+@renderer_classes([renderers.FastJSONRenderer, BrowsableAPIRenderer])
 def rate_lookup_api(request):
-    """Return fee schedule rates matching query parameters."""
+    """
+    Return fee schedule rates matching query parameters.
+
+    Results are keyset-paginated: ``page_size`` rows per response, with the
+    next page's URL in a ``Link: <...>; rel="next"`` header. ``stream=1``
+    instead streams every matching row as NDJSON straight from the database
+    cursor.
+    """
     state_code = request.query_params.get("state")
     procedure_code = request.query_params.get("procedure_code")
+    cursor = request.query_params.get("cursor")
+
+    try:
+        if request.query_params.get("stream"):
+            rates = _rates_after(state_code, procedure_code, cursor)
+            return StreamingHttpResponse(_stream_rates(rates), content_type="application/x-ndjson")
+        rows, next_cursor = rates_page(state_code, procedure_code, cursor, _page_size(request.query_params))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    response = Response(rows)
+    if next_cursor:
+        response["Link"] = next_page_link(request, request.query_params, next_cursor)
+    return response
+
+
+@data_conditional
+@api_view(["GET"])
+def states_api(request):
+    """Return the state codes that have workers' comp fee schedule rates."""
+    return Response(get_fee_schedule_states())
+
+
+@api_view(["GET"])
+def commercial_percentiles_api(request):
+    """
+    Commercial rate percentiles for a procedure code.
+
+    Requires ``procedure_code``; ``modifier`` defaults to none. ``zip_code``
+    narrows the result to that ZIP's 3-digit area and county, and ``county``
+    with ``state`` to one county. Answers from the prebuilt
+    ``commercial_rate_percentile`` table (``build_commercial_percentiles``).
+    """
+    procedure_code = request.query_params.get("procedure_code")
     zip_code = request.query_params.get("zip_code")
+    county = request.query_params.get("county")
+    state = request.query_params.get("state")
+    if not procedure_code:
+        return Response({"error": "procedure_code is required."}, status=400)
+    if zip_code and not (len(zip_code) == 5 and zip_code.isdigit()):
+        return Response({"error": "ZIP code must be exactly 5 digits"}, status=400)
+    if county and not state:
+        return Response({"error": "county requires state."}, status=400)
+    return Response(rate_percentiles(
+        procedure_code, request.query_params.get("modifier", ""), zip_code, county, state,
+    ))
 
-    region = None
-    if state_code:
-        region = Region.objects.filter(state__state_code=state_code).first()
 
-    rates = FeeScheduleRate.objects.all()
-    if state_code:
-        rates = rates.filter(fee_schedule__state__state_code=state_code)
-    if procedure_code:
-        rates = rates.filter(procedure_code__procedure_code=procedure_code)
-    if region:
-        rates = rates.filter(region=region)
+@data_conditional
+@api_view(["GET"])
+@renderer_classes([renderers.FastJSONRenderer, BrowsableAPIRenderer])
+def workers_comp_comparison_api(request):
+    """
+    One CPT code's workers' comp rates in every state.
 
-    serializer = FeeScheduleRateSerializer(
-        rates.select_related("procedure_code", "fee_schedule", "region"), many=True
-    )
-    return Response(serializer.data)
+    Returns the modifiers found and, per state, one row per region and
+    place of service with its rate for each modifier, plus the state's
+    lowest and highest rate.
+    """
+    form = WorkersCompComparisonForm(request.query_params)
+    if not form.is_valid():
+        return Response({"error": form.errors["procedure_code"][0]}, status=400)
+    return Response(compare_states(form.cleaned_data["procedure_code"]))
+
+
+@data_conditional
+@api_view(["GET"])
+def percent_of_medicare_api(request):
+    """
+    Workers' comp rates as a percent of the statewide Medicare allowed
+    amount: per state, the rate count, how many could be benchmarked, and
+    the mean, min, p10-p90 and max percent. ``state`` (repeatable) narrows
+    it to those states; ``year`` picks the Medicare year.
+    """
+    states = [state.upper() for state in request.query_params.getlist("state")]
+    if any(not (len(state) == 2 and state.isalpha()) for state in states):
+        return Response({"error": "state must be a 2-letter state code."}, status=400)
+    try:
+        year = int(request.query_params.get("year", PRICING_YEAR))
+    except ValueError:
+        return Response({"error": "year must be an integer."}, status=400)
+    if year not in pricing_years():
+        return Response({"error": f"No Medicare fee schedule loaded for {year}."}, status=404)
+    return Response(benchmark_states(states, year))
+
+
+@api_view(["GET"])
+def procedure_search_api(request):
+    """
+    Procedure code typeahead: the best ``limit`` (default 10) codes whose
+    code or description words start with the terms in ``q``.
+    """
+    query = request.query_params.get("q", "")
+    try:
+        limit = int(request.query_params.get("limit", 10))
+    except ValueError:
+        return Response({"error": "limit must be an integer."}, status=400)
+    limit = max(1, min(limit, getattr(settings, "PROCEDURE_SEARCH_MAX_RESULTS", 50)))
+    return Response(search_procedures(query, limit))
+
+
+@api_view(["GET"])
+def nearby_api(request):
+    """
+    Rates within ``miles`` of ``zip_code`` for ``procedure_code``.
+
+    Returns the commercial rates in ZIPs inside the radius and each Medicare
+    locality with a ZIP inside it, priced at its nearest ZIP, nearest first.
+    ``modifier`` narrows both (default: unmodified).
+    """
+    zip_code = request.query_params.get("zip_code", "")
+    procedure_code = request.query_params.get("procedure_code")
+    modifier = request.query_params.get("modifier", "")
+    max_miles = getattr(settings, "NEARBY_MAX_MILES", 100)
+    if not (len(zip_code) == 5 and zip_code.isdigit()):
+        return Response({"error": "ZIP code must be exactly 5 digits"}, status=400)
+    if not procedure_code:
+        return Response({"error": "procedure_code is required."}, status=400)
+    try:
+        miles = float(request.query_params.get("miles", 25))
+    except ValueError:
+        miles = -1
+    if not 0 < miles <= max_miles:
+        return Response({"error": f"miles must be a number above 0 and at most {max_miles}."}, status=400)
+
+    commercial_rates = nearby_commercial_rates(zip_code, miles, procedure_code, modifier)
+    if commercial_rates is None:
+        return Response({"error": f"No coordinates for ZIP code {zip_code}."}, status=404)
+    return Response({
+        "zip_code": zip_code,
+        "miles": miles,
+        "commercial_rates": commercial_rates,
+        "medicare_localities": nearby_medicare_localities(zip_code, miles, procedure_code, modifier),
+    })
+
+
+@api_view(["POST"])
+def medicare_batch_api(request):
+    """
+    Price many Medicare lines in one call.
+
+    Accepts ``{"lines": [{"zip_code", "procedure_code", "modifier",
+    "date_of_service"}, ...]}`` and returns one result per line, in order.
+    Each line is priced with the fee schedule of its date of service's year
+    (the current one when omitted). Lines that cannot be priced carry an
+    ``error`` instead of failing the whole batch.
+    """
+    lines = request.data.get("lines") if isinstance(request.data, dict) else None
+    if not isinstance(lines, list):
+        return Response({"error": "Expected a JSON object with a 'lines' list."}, status=400)
+
+    max_lines = getattr(settings, "MEDICARE_BATCH_MAX_LINES", 10000)
+    if len(lines) > max_lines:
+        return Response({"error": f"At most {max_lines} lines per request."}, status=400)
+
+    results = [None] * len(lines)
+    valid = []
+    for i, line in enumerate(lines):
+        error = None
+        if not isinstance(line, dict):
+            error = "Line must be an object."
+            line = {}
+        zip_code = str(line.get("zip_code") or "")
+        procedure_code = str(line.get("procedure_code") or "")
+        modifier = str(line.get("modifier") or "")
+        if error is None and not (len(zip_code) == 5 and zip_code.isdigit()):
+            error = "ZIP code must be exactly 5 digits"
+        elif error is None and not (len(procedure_code) == 5 and procedure_code.isdigit()):
+            error = "CPT code must be exactly 5 digits"
+        if error is None:
+            valid.append((i, (zip_code, procedure_code, modifier, line.get("date_of_service"))))
+        else:
+            results[i] = line_result(zip_code, procedure_code, modifier, error=error)
+
+    # Only well-formed lines reach the pricing engines.
+    for (i, _), result in zip(valid, price_claims([parsed for _, parsed in valid])):
+        results[i] = result
+    return Response({"results": results})
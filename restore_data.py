@@ -1,5 +1,15 @@
+import argparse
+import os
+import shutil
 import sqlite3
 import json
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from backup_and_restore import BACKUP_DIR, DB_PATH, decode_rows, load_manifest, part_lines
+
+BATCH_ROWS = 20000
 
 def restore_data():
     # Connect to the database
@@ -49,7 +59,131 @@ def restore_data():
     conn.close()
     print("Data restoration completed!")
 
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _stage_part(backup_dir, table_name, columns, part, stage_path):
+    """
+    Load one backup part into its own staging database.
+
+    The staging table has untyped columns and no constraints or indexes, so
+    rows go in as fast as SQLite can append them. Raises ValueError if the
+    part fails its checksum.
+    """
+    conn = sqlite3.connect(stage_path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode = OFF')
+    conn.execute('PRAGMA synchronous = OFF')
+    column_list = ', '.join(_quote(c) for c in columns)
+    conn.execute(f'CREATE TABLE {_quote(table_name)} ({column_list})')
+    insert_sql = f"INSERT INTO {_quote(table_name)} VALUES ({', '.join('?' * len(columns))})"
+    conn.execute('BEGIN')
+    batch = []
+    for line in part_lines(backup_dir, part):
+        batch.append(line)
+        if len(batch) >= BATCH_ROWS:
+            conn.executemany(insert_sql, decode_rows(batch))
+            batch = []
+    if batch:
+        conn.executemany(insert_sql, decode_rows(batch))
+    conn.execute('COMMIT')
+    conn.close()
+    return stage_path
+
+
+def restore_backup(backup_dir=BACKUP_DIR, db_path=DB_PATH, workers=None):
+    """
+    Restore a backup written by backup_and_restore.backup_data().
+
+    Worker processes first decode every part file in parallel into staging
+    databases, each part checked against its row count and checksum. Only
+    when all of them pass does the main process drop and recreate the tables
+    without their indexes and merge the staged parts in order with INSERT ...
+    SELECT, under synchronous=OFF and journal_mode=MEMORY, so a truncated or
+    corrupt backup leaves the database untouched. The indexes are then
+    rebuilt and ANALYZE run.
+
+    The tables in the backup replace any existing tables of the same name.
+    Those settings are not crash safe: if the restore is interrupted while
+    merging, delete the database file and run it again.
+    """
+    started = time.perf_counter()
+    manifest = load_manifest(backup_dir)
+    tables = manifest['tables']
+    stage_dir = tempfile.mkdtemp(prefix='restore-', dir=os.path.dirname(os.path.abspath(db_path)))
+
+    conn = None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                (table_name, entry['columns'], pool.submit(
+                    _stage_part, backup_dir, table_name, entry['columns'], part,
+                    os.path.join(stage_dir, part['file'].replace('.ndjson.gz', '.db')),
+                ))
+                for table_name, entry in tables.items()
+                for part in entry['parts']
+            ]
+            # Raises on the first part that fails its checks, before the
+            # database has been touched.
+            staged = [(table_name, columns, future.result()) for table_name, columns, future in futures]
+        print(f"Staged and verified {len(staged)} parts")
+
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA journal_mode = MEMORY')
+        conn.execute('BEGIN')
+        for table_name, entry in tables.items():
+            conn.execute(f'DROP TABLE IF EXISTS {_quote(table_name)}')
+            conn.execute(entry['schema'])
+        conn.execute('COMMIT')
+
+        # Merge in manifest order so rows keep their original order.
+        for table_name, columns, stage_path in staged:
+            column_list = ', '.join(_quote(c) for c in columns)
+            conn.execute('ATTACH DATABASE ? AS stage', (stage_path,))
+            conn.execute('BEGIN')
+            conn.execute(
+                f'INSERT INTO main.{_quote(table_name)} ({column_list}) '
+                f'SELECT {column_list} FROM stage.{_quote(table_name)}'
+            )
+            conn.execute('COMMIT')
+            conn.execute('DETACH DATABASE stage')
+            os.remove(stage_path)
+
+        conn.execute('BEGIN')
+        for table_name, entry in tables.items():
+            for index_sql in entry['indexes']:
+                conn.execute(index_sql)
+            print(f"Restored {table_name}: {entry['rows']} rows")
+        conn.execute('COMMIT')
+        if 'data_release' in tables:
+            # Lets check_db tell which tables change after this ANALYZE.
+            conn.execute(
+                "INSERT INTO data_release (table_name, version, updated_at) "
+                "VALUES ('sqlite_stat1', 1, CURRENT_TIMESTAMP) "
+                "ON CONFLICT (table_name) DO UPDATE "
+                "SET version = data_release.version + 1, updated_at = excluded.updated_at"
+            )
+        conn.execute('ANALYZE')
+    finally:
+        if conn is not None:
+            conn.close()
+        shutil.rmtree(stage_dir, ignore_errors=True)
+    print(f"Data restoration completed in {time.perf_counter() - started:.1f}s!")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Restore compensation_rates.db from a backup.')
+    parser.add_argument('--db', default=DB_PATH)
+    parser.add_argument('--backup-dir', default=BACKUP_DIR)
+    parser.add_argument('--workers', type=int, help='Staging processes (default: one per CPU)')
+    parser.add_argument('--legacy-json', action='store_true',
+                        help='Restore the old single-file database_backup.json format instead')
+    args = parser.parse_args()
+
     print("Starting data restoration...")
-    restore_data()
-    print("Process completed!") 
\ No newline at end of file
+    if args.legacy_json:
+        restore_data()
+    else:
+        restore_backup(args.backup_dir, args.db, args.workers)
+    print("Process completed!")